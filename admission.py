@@ -0,0 +1,162 @@
+import os
+import math
+import time
+import asyncio
+from collections import OrderedDict, deque
+
+from metrics import Counter, Gauge, Histogram
+
+USER_RATE_PER_SECOND = float(os.environ.get("RAG_USER_RATE", "2"))
+USER_BURST = float(os.environ.get("RAG_USER_BURST", "10"))
+MAX_IN_FLIGHT = int(os.environ.get("RAG_MAX_IN_FLIGHT", "16"))
+MAX_QUEUE = int(os.environ.get("RAG_MAX_QUEUE", "32"))
+QUEUE_TIMEOUT = float(os.environ.get("RAG_QUEUE_TIMEOUT", "10"))
+MAX_TRACKED_USERS = 10000
+
+ADMISSION_IN_FLIGHT = Gauge("rag_admission_in_flight", "Query executions currently admitted.")
+ADMISSION_QUEUE_DEPTH = Gauge("rag_admission_queue_depth", "Queries waiting for an execution slot.")
+ADMISSION_REJECTIONS = Counter(
+    "rag_admission_rejections_total", "Queries rejected by admission control.", ["reason"]
+)
+ADMISSION_WAIT_SECONDS = Histogram("rag_admission_wait_seconds", "Time admitted queries waited for a slot.")
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code, retry_after, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, cost=1.0):
+        """
+        Returns:
+            float: 0 if the cost was taken, otherwise seconds until it would be available.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        cost = min(cost, self.capacity)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+
+class AdmissionController:
+    def __init__(self, rate=USER_RATE_PER_SECOND, burst=USER_BURST, max_in_flight=MAX_IN_FLIGHT,
+                 max_queue=MAX_QUEUE, queue_timeout=QUEUE_TIMEOUT):
+        """
+        Admission control for query execution in one process (one event loop).
+
+        Each user (JWT subject) has a token bucket; requests over it are rejected with 429
+        before they take any capacity. At most max_in_flight executions run at once; further
+        requests wait in a FIFO queue of at most max_queue, and are rejected with 503 when the
+        queue is full or their wait exceeds queue_timeout. Rejections carry a Retry-After hint.
+
+        Args:
+            rate (float, optional): Sustained requests per second allowed per user.
+            burst (float, optional): Requests a user can make at once.
+            max_in_flight (int, optional): Concurrent executions admitted.
+            max_queue (int, optional): Requests allowed to wait for a slot.
+            queue_timeout (float, optional): Longest wait for a slot, in seconds.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters = deque()
+        self._buckets = OrderedDict()
+        # Moving average of how long a slot is held, for Retry-After estimates.
+        self._hold_seconds = 1.0
+
+    def _bucket(self, user):
+        bucket = self._buckets.get(user)
+        if bucket is None:
+            bucket = self._buckets[user] = TokenBucket(self.rate, self.burst)
+            while len(self._buckets) > MAX_TRACKED_USERS:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(user)
+        return bucket
+
+    def _retry_after(self, position):
+        return max(1, math.ceil(self._hold_seconds * (position + 1) / max(1, self.max_in_flight)))
+
+    def _publish(self):
+        ADMISSION_IN_FLIGHT.set(self.in_flight)
+        ADMISSION_QUEUE_DEPTH.set(len(self._waiters))
+
+    async def acquire(self, user, cost=1.0):
+        """
+        Waits for an execution slot; pair with release.
+
+        Returns:
+            float: time.monotonic() when the slot was granted, for release.
+
+        Raises:
+            AdmissionRejected: 429 when the user is over their rate, 503 when the queue is full or the wait timed out.
+        """
+        wait = self._bucket(user).take(cost)
+        if wait:
+            ADMISSION_REJECTIONS.inc(reason="rate_limited")
+            raise AdmissionRejected(429, max(1, math.ceil(wait)), "Rate limit exceeded.")
+
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            self._publish()
+            ADMISSION_WAIT_SECONDS.observe(0.0)
+            return time.monotonic()
+        if len(self._waiters) >= self.max_queue:
+            ADMISSION_REJECTIONS.inc(reason="queue_full")
+            raise AdmissionRejected(503, self._retry_after(len(self._waiters)), "Server is at capacity; try again shortly.")
+
+        started = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._publish()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ended; pass it on.
+                self.release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            self._publish()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            ADMISSION_REJECTIONS.inc(reason="queue_timeout")
+            raise AdmissionRejected(503, self._retry_after(len(self._waiters)), "Timed out waiting for capacity.")
+        granted = time.monotonic()
+        ADMISSION_WAIT_SECONDS.observe(granted - started)
+        return granted
+
+    def release(self, granted=None):
+        """
+        Frees a slot, handing it straight to the oldest waiter if there is one.
+
+        Args:
+            granted (float, optional): The value acquire returned, to track how long slots are held.
+        """
+        if granted is not None:
+            self._hold_seconds = 0.9 * self._hold_seconds + 0.1 * (time.monotonic() - granted)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # in_flight is unchanged: the slot moves to the waiter.
+                waiter.set_result(None)
+                self._publish()
+                return
+        self.in_flight -= 1
+        self._publish()
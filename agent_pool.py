@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from rag_agent import RAGAgent, store_fingerprint, tool_set_key, ingest_store, VECTOR_BACKEND
+from metrics import stage_timer
+
+
+class AgentPool:
+    def __init__(self, pdf_path, persist_directory="./chroma_db", max_size=4, reload_check_interval=5.0,
+                 agent_kwargs=None):
+        """
+        Process-wide pool of warm RAGAgent instances, keyed by tool set.
+
+        Building a RAGAgent is expensive (embeddings client, Chroma handle, retriever tool,
+        LLM and executor), so agents are built once and shared across requests. The pool is
+        bounded and evicts the least recently used tool set when full. Agents are rebuilt
+        when the persisted vector store changes on disk. Dropped agents are closed, releasing
+        their vector store handles, once the last lease on them (see acquire) is returned.
+
+        Args:
+            pdf_path (str): Path to the PDF file passed to each RAGAgent.
+            persist_directory (str, optional): Vector store directory. Defaults to "./chroma_db".
+            max_size (int, optional): Maximum number of distinct tool sets kept warm. Defaults to 4.
+            reload_check_interval (float, optional): Minimum seconds between vector store change checks.
+            agent_kwargs (dict, optional): Extra keyword arguments passed to every RAGAgent.
+        """
+        self.pdf_path = pdf_path
+        self.persist_directory = persist_directory
+        self.max_size = max_size
+        self.reload_check_interval = reload_check_interval
+        self.agent_kwargs = agent_kwargs or {}
+        self._agents = OrderedDict()
+        self._leases = {}
+        # Agents dropped from the pool while leased; closed when their last lease is returned.
+        self._retired = set()
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._last_check = 0.0
+
+    def get(self, tools=None, lease=False):
+        """
+        Returns a warm agent for the given tool set, building it on first use.
+
+        Args:
+            tools (list, optional): LangChain tools the agent should have in addition to the PDF retriever.
+            lease (bool, optional): Lease the agent so it is not closed while in use; prefer acquire().
+
+        Returns:
+            RAGAgent: A shared, initialized agent.
+        """
+        self._maybe_reload()
+        key = tool_set_key(tools)
+        to_close = []
+        with self._lock:
+            agent = self._agents.get(key)
+            if agent is not None:
+                self._agents.move_to_end(key)
+            else:
+                print(f"Building pooled agent for tools {list(key)}...")
+                with stage_timer("agent_build"):
+                    agent = RAGAgent(self.pdf_path, tools=tools, persist_directory=self.persist_directory, **self.agent_kwargs)
+                self._agents[key] = agent
+                if self._fingerprint is None:
+                    # Building the first agent may have created the store; snapshot it afterwards.
+                    self._fingerprint = store_fingerprint(self.persist_directory)
+                while len(self._agents) > self.max_size:
+                    evicted, dropped = self._agents.popitem(last=False)
+                    print(f"Evicting pooled agent for tools {list(evicted)}")
+                    to_close += self._retire_locked([dropped])
+            if lease:
+                self._leases[agent] = self._leases.get(agent, 0) + 1
+        self._close(to_close)
+        return agent
+
+    def acquire(self, tools=None):
+        """
+        Leases a warm agent: it is not closed while leased, even if the pool drops it.
+        Pair with release().
+        """
+        return self.get(tools, lease=True)
+
+    def release(self, agent):
+        with self._lock:
+            remaining = self._leases.get(agent, 0) - 1
+            if remaining > 0:
+                self._leases[agent] = remaining
+                return
+            self._leases.pop(agent, None)
+            if agent not in self._retired:
+                return
+            self._retired.discard(agent)
+        self._close([agent])
+
+    @contextmanager
+    def leased(self, tools=None):
+        agent = self.acquire(tools)
+        try:
+            yield agent
+        finally:
+            self.release(agent)
+
+    def _retire_locked(self, agents):
+        """
+        Marks dropped agents retired. Returns those that are not leased and can be closed now.
+        """
+        idle = []
+        for agent in agents:
+            if self._leases.get(agent):
+                self._retired.add(agent)
+            else:
+                idle.append(agent)
+        return idle
+
+    def _close(self, agents):
+        for agent in agents:
+            agent.close()
+
+    def reload(self):
+        """
+        Drops all pooled agents so the next request rebuilds them against the current store.
+        """
+        with self._lock:
+            agents = list(self._agents.values())
+            self._agents.clear()
+            self._fingerprint = store_fingerprint(self.persist_directory)
+            to_close = self._retire_locked(agents)
+        # Closing the last handle stops the store's Chroma system, so rebuilt agents read it afresh.
+        self._close(to_close)
+        print("Agent pool cleared; agents will be rebuilt on next use.")
+
+    def ingest(self):
+        """
+        Incrementally ingests the pool's documents, then drops agents so they are rebuilt
+        against the updated store.
+
+        Returns:
+            dict: Ingestion statistics from sync_documents.
+        """
+        stats = ingest_store(self.pdf_path, self.persist_directory, self.agent_kwargs.get("embeddings"),
+                             self.agent_kwargs.get("vector_backend", VECTOR_BACKEND))
+        self.reload()
+        return stats
+
+    def close(self):
+        """
+        Drops all pooled agents and releases their vector store handles; leased agents are
+        closed when they are released.
+        """
+        with self._lock:
+            agents = list(self._agents.values())
+            self._agents.clear()
+            to_close = self._retire_locked(agents)
+        self._close(to_close)
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._last_check < self.reload_check_interval:
+            return
+        self._last_check = now
+        current = store_fingerprint(self.persist_directory)
+        if self._fingerprint is not None and current != self._fingerprint:
+            print(f"Vector store at {self.persist_directory} changed; reloading agents...")
+            self.reload()
+
+    def __len__(self):
+        return len(self._agents)
@@ -0,0 +1,169 @@
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from embedding_cache import normalize_text
+
+ANSWER_CACHE_SIZE = int(os.environ.get("RAG_ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL = float(os.environ.get("RAG_ANSWER_CACHE_TTL", "3600"))
+# The semantic tier is opt-in: embeddings of queries differing only in a quarter, year or
+# account number can score above any useful threshold.
+ANSWER_CACHE_SEMANTIC = os.environ.get("RAG_ANSWER_CACHE_SEMANTIC", "0") == "1"
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("RAG_ANSWER_CACHE_THRESHOLD", "0.95"))
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.,\-_/][a-z0-9]+)*")
+
+
+def normalize_query(query):
+    return normalize_text(query).lower()
+
+
+def query_identifiers(key):
+    """
+    Returns the numbers and identifier tokens of a normalized query, which must match
+    exactly for a semantic hit.
+    """
+    # Tokens containing a digit: figures, quarters ("q1"), years and identifiers ("acct-4410").
+    return frozenset(t for t in _TOKEN_PATTERN.findall(key) if any(c.isdigit() for c in t))
+
+
+class AnswerCache:
+    def __init__(self, embeddings, max_entries=ANSWER_CACHE_SIZE, ttl_seconds=ANSWER_CACHE_TTL,
+                 similarity_threshold=ANSWER_CACHE_THRESHOLD, semantic=ANSWER_CACHE_SEMANTIC):
+        """
+        Two-tier cache of final agent answers.
+
+        Lookups first try an exact match on the normalized query, then, if the semantic tier
+        is enabled, a nearest-neighbour match on the query embedding above a cosine similarity
+        threshold whose numbers and identifiers are exactly those of the query. Entries expire
+        after ttl_seconds and the least recently used entry is evicted when full. All
+        entries belong to a scope (vector store fingerprint and tool set); a lookup or
+        store with a different scope clears the cache.
+
+        Args:
+            embeddings: Embeddings used for the semantic tier.
+            max_entries (int, optional): Maximum number of cached answers.
+            ttl_seconds (float, optional): Lifetime of a cached answer.
+            similarity_threshold (float, optional): Minimum cosine similarity for a semantic hit.
+            semantic (bool, optional): Enable the semantic tier. Defaults to RAG_ANSWER_CACHE_SEMANTIC.
+        """
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.semantic = semantic
+        self._entries = OrderedDict()
+        self._scope = None
+        self._matrix = None
+        self._matrix_keys = None
+        self._lock = threading.Lock()
+
+    def _set_scope(self, scope):
+        if scope != self._scope:
+            if self._entries:
+                print("Answer cache scope changed (vector store or tools); clearing.")
+            self._entries.clear()
+            self._matrix = None
+            self._scope = scope
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        expired = [k for k, e in self._entries.items() if now - e["created"] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    @staticmethod
+    def _normalize_vector(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _exact(self, key, scope):
+        with self._lock:
+            self._set_scope(scope)
+            self._purge_expired()
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return {"answer": entry["answer"], "cache": "exact", "similarity": 1.0}
+            return None
+
+    def _semantic(self, vector, identifiers):
+        with self._lock:
+            if self._matrix is None:
+                self._matrix_keys = [k for k, e in self._entries.items() if e["vector"] is not None]
+                if not self._matrix_keys:
+                    return None
+                self._matrix = np.stack([self._entries[k]["vector"] for k in self._matrix_keys])
+            similarities = self._matrix @ vector
+            for best in np.argsort(-similarities):
+                similarity = float(similarities[best])
+                if similarity < self.similarity_threshold:
+                    return None
+                key = self._matrix_keys[best]
+                entry = self._entries.get(key)
+                # "Q1 revenue" must never be answered from "Q2 revenue", however close the embeddings.
+                if entry is None or query_identifiers(key) != identifiers:
+                    continue
+                self._entries.move_to_end(key)
+                return {"answer": entry["answer"], "cache": "semantic", "similarity": round(similarity, 4)}
+            return None
+
+    def lookup(self, query, scope):
+        """
+        Looks up a cached answer.
+
+        Returns:
+            dict: {"answer", "cache", "similarity", "vector"}; "cache" is "exact", "semantic" or "miss".
+                Pass the returned vector to store() to avoid embedding the query twice.
+        """
+        key = normalize_query(query)
+        hit = self._exact(key, scope)
+        if hit:
+            return dict(hit, vector=None)
+        if not self.semantic:
+            return {"answer": None, "cache": "miss", "similarity": None, "vector": None}
+        vector = self._normalize_vector(self.embeddings.embed_query(key))
+        hit = self._semantic(vector, query_identifiers(key))
+        if hit:
+            return dict(hit, vector=vector)
+        return {"answer": None, "cache": "miss", "similarity": None, "vector": vector}
+
+    async def alookup(self, query, scope):
+        key = normalize_query(query)
+        hit = self._exact(key, scope)
+        if hit:
+            return dict(hit, vector=None)
+        if not self.semantic:
+            return {"answer": None, "cache": "miss", "similarity": None, "vector": None}
+        vector = self._normalize_vector(await self.embeddings.aembed_query(key))
+        hit = self._semantic(vector, query_identifiers(key))
+        if hit:
+            return dict(hit, vector=vector)
+        return {"answer": None, "cache": "miss", "similarity": None, "vector": vector}
+
+    def store(self, query, answer, scope, vector=None):
+        key = normalize_query(query)
+        if vector is None and self.semantic:
+            vector = self._normalize_vector(self.embeddings.embed_query(key))
+        with self._lock:
+            self._set_scope(scope)
+            self._entries[key] = {"answer": answer, "vector": vector, "created": time.monotonic()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def __len__(self):
+        return len(self._entries)
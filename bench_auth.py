@@ -0,0 +1,120 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import timedelta
+
+import rag_api_service
+from rag_api_service import (
+    UserLogin, clear_token_cache, create_access_token, get_current_user, login, verify_password,
+    fake_users_db, ACCESS_TOKEN_EXPIRE_MINUTES,
+)
+
+# Load test for the auth hot path. Runs in-process against the endpoint coroutines,
+# so it needs no server and no API keys.
+
+
+def _summary(samples_us):
+    samples_us = sorted(samples_us)
+    return {
+        "p50_us": round(statistics.median(samples_us), 1),
+        "p99_us": round(samples_us[int(len(samples_us) * 0.99) - 1], 1),
+        "mean_us": round(statistics.fmean(samples_us), 1),
+    }
+
+
+async def bench_token_verification(requests):
+    """
+    Per-request cost of get_current_user without the cache (before) and with it (after).
+    """
+    token = create_access_token({"sub": "admin"}, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+
+    uncached = []
+    for _ in range(requests):
+        clear_token_cache()
+        started = time.perf_counter()
+        await get_current_user(token)
+        uncached.append((time.perf_counter() - started) * 1e6)
+
+    clear_token_cache()
+    await get_current_user(token)
+    cached = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        await get_current_user(token)
+        cached.append((time.perf_counter() - started) * 1e6)
+
+    return {"before": _summary(uncached), "after": _summary(cached)}
+
+
+async def _inline_login(user):
+    # The pre-change /token behaviour: bcrypt on the event loop thread.
+    if not verify_password(user.password, fake_users_db[user.username]["hashed_password"]):
+        raise RuntimeError("bad password")
+
+
+async def _measure_loop_lag(burst, login_fn, interval=0.005):
+    """
+    Runs a burst of concurrent logins while a heartbeat measures event loop stalls.
+    """
+    lags = []
+    done = asyncio.Event()
+
+    async def heartbeat():
+        while not done.is_set():
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            lags.append(max(0.0, time.perf_counter() - expected) * 1000)
+
+    beat = asyncio.create_task(heartbeat())
+    started = time.perf_counter()
+    await asyncio.gather(*(login_fn(UserLogin(username="admin", password="secret")) for _ in range(burst)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await beat
+    return {
+        "burst_seconds": round(elapsed, 3),
+        "max_loop_stall_ms": round(max(lags) if lags else elapsed * 1000, 1),
+        "heartbeats": len(lags),
+    }
+
+
+async def bench_login_burst(burst):
+    return {
+        "before": await _measure_loop_lag(burst, _inline_login),
+        "after": await _measure_loop_lag(burst, login),
+    }
+
+
+async def run(args):
+    results = {
+        "token_verification": await bench_token_verification(args.requests),
+        "login_burst": await bench_login_burst(args.burst),
+        "auth_hash_workers": rag_api_service.AUTH_HASH_WORKERS,
+    }
+    verification = results["token_verification"]
+    print(f"get_current_user p50: {verification['before']['p50_us']}us uncached -> "
+          f"{verification['after']['p50_us']}us cached")
+    burst = results["login_burst"]
+    print(f"{args.burst} concurrent logins: max event loop stall "
+          f"{burst['before']['max_loop_stall_ms']}ms inline -> {burst['after']['max_loop_stall_ms']}ms offloaded")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure auth overhead per request before and after caching/offloading.")
+    parser.add_argument("--requests", type=int, default=5000, help="Token verifications per mode.")
+    parser.add_argument("--burst", type=int, default=16, help="Concurrent logins in the burst test.")
+    parser.add_argument("--output", help="Write results as JSON to this file.")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
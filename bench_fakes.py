@@ -0,0 +1,100 @@
+import json
+import time
+import asyncio
+import hashlib
+import math
+import re
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, FunctionMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from embedding_pipeline import count_tokens
+from retrieval import tokenize
+
+# Deterministic stand-ins for OpenAI used by the offline benchmark suite.
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Hashed bag-of-words embeddings: deterministic, offline, and similar texts get
+    similar vectors, so retrieval quality is still meaningful.
+    """
+
+    def __init__(self, dimensions=256, latency=0.0):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.model = f"fake-hash-{dimensions}"
+        self.calls = 0
+
+    def _embed(self, text):
+        vector = [0.0] * self.dimensions
+        for token in tokenize(text):
+            digest = hashlib.sha1(token.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class StubChatModel(BaseChatModel):
+    """
+    Scripted chat model for the OpenAI functions agent: it calls pdf_retriever with the
+    question, then answers from the retrieved context. `latency` simulates LLM time.
+
+    With max_searches > 1 it behaves like an agent that checks its evidence: when the
+    retrieved context lacks the question's identifying terms (those containing digits) it
+    searches again with just those terms. Token usage is reported so traces count prompt size.
+    """
+
+    latency: float = 0.0
+    max_searches: int = 1
+
+    @property
+    def _llm_type(self):
+        return "stub-chat"
+
+    def _respond(self, messages):
+        question = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+        observations = [m for m in messages if isinstance(m, (FunctionMessage, ToolMessage))]
+        identifiers = [t for t in tokenize(question) if any(c.isdigit() for c in t)]
+        if not observations:
+            search = question
+        elif len(observations) < self.max_searches and not all(t in observations[-1].content.lower() for t in identifiers):
+            search = " ".join(identifiers)
+        else:
+            search = None
+        usage = {"input_tokens": sum(count_tokens(str(m.content)) for m in messages), "output_tokens": 0}
+        if search is not None:
+            arguments = json.dumps({"query": search})
+            message = AIMessage(content="", additional_kwargs={"function_call": {"name": "pdf_retriever", "arguments": arguments}})
+        else:
+            context = observations[-1].content
+            # Quote the sentence that mentions what was asked about, if any.
+            evidence = next((line for line in re.split(r"(?<=[.!?])\s+|\n+", context)
+                             if identifiers and all(t in line.lower() for t in identifiers)), context[:200])
+            message = AIMessage(content=f"According to the documents: {evidence}")
+        usage["output_tokens"] = count_tokens(message.content) + 1
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        message.usage_metadata = usage
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._respond(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._respond(messages)
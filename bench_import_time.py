@@ -0,0 +1,63 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+# Measures how long a cold `import <module>` takes in a fresh interpreter, which is what
+# a new container pays before uvicorn can accept its first request.
+
+def measure_wall(module, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+def measure_importtime(module, top):
+    """
+    Runs `python -X importtime` and returns the slowest modules by cumulative time.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            check=True, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        rows.append({"module": name.strip(), "self_ms": int(self_us) / 1000, "cumulative_ms": int(cumulative_us) / 1000})
+    rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return rows[:top]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold import time of the API service.")
+    parser.add_argument("modules", nargs="*", default=["rag_api_service", "rag_agent"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--output", help="Write results as JSON to this file.")
+    args = parser.parse_args()
+
+    results = {}
+    for module in args.modules:
+        timings = measure_wall(module, args.runs)
+        slowest = measure_importtime(module, args.top)
+        results[module] = {
+            "median_seconds": round(statistics.median(timings), 4),
+            "min_seconds": round(min(timings), 4),
+            "slowest_imports": slowest,
+        }
+        print(f"\nimport {module}: median {results[module]['median_seconds']:.3f}s "
+              f"(min {results[module]['min_seconds']:.3f}s over {args.runs} runs)")
+        for row in slowest:
+            print(f"  {row['cumulative_ms']:9.1f} ms  {row['module']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
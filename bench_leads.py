@@ -0,0 +1,119 @@
+import os
+import json
+import time
+import random
+import argparse
+import statistics
+import tempfile
+
+from leads_store import LeadsStore, leads_etag, http_date, not_modified
+
+# Benchmark for /admin/leads on a seeded large leads table. Runs against the store and
+# the conditional-request logic in-process, so it needs no server:
+#
+#   python bench_leads.py --rows 200000 --output leads_results.json
+
+STATUSES = ("new", "contacted", "qualified", "won", "lost")
+SOURCES = ("web", "referral", "event", "ads", "partner")
+
+
+def seed(store, rows, batch=20000, seed=0):
+    rng = random.Random(seed)
+    companies = [f"Company {i}" for i in range(max(1, rows // 50))]
+    now = time.time()
+    for start in range(0, rows, batch):
+        store.add(
+            {
+                "name": f"Lead {i}", "email": f"lead{i}@example.com", "company": rng.choice(companies),
+                "status": rng.choice(STATUSES), "source": rng.choice(SOURCES),
+                "created_at": now - rng.uniform(0, 365 * 86400),
+            }
+            for i in range(start, min(rows, start + batch))
+        )
+
+
+def _timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {"p50_ms": round(statistics.median(samples), 3), "p99_ms": round(samples[int(len(samples) * 0.99) - 1], 3)}
+
+
+def bench(store, page_size, repeat):
+    conn = store._conn()
+    rows = store.count()
+    deep_cursor = conn.execute("SELECT id FROM leads ORDER BY id LIMIT 1 OFFSET ?", (rows - page_size - 1,)).fetchone()[0]
+    results = {"rows": rows, "page_size": page_size}
+
+    def full_dump():
+        # What the endpoint would cost if it kept returning every lead in one response.
+        return json.dumps([dict(r) for r in conn.execute("SELECT * FROM leads")])
+
+    started = time.perf_counter()
+    body = full_dump()
+    results["full_dump"] = {"ms": round((time.perf_counter() - started) * 1000, 1), "bytes": len(body)}
+
+    def offset_page():
+        return [dict(r) for r in conn.execute(
+            "SELECT * FROM leads ORDER BY id LIMIT ? OFFSET ?", (page_size, rows - page_size - 1))]
+
+    uncached = LeadsStore(store.path, cache_size=0)
+    results["deep_page_offset"] = _timed(offset_page, repeat)
+    results["deep_page_keyset"] = _timed(lambda: uncached.page(cursor=deep_cursor, limit=page_size), repeat)
+    results["filtered_page_keyset"] = _timed(
+        lambda: uncached.page(cursor=deep_cursor // 2, limit=page_size, filters={"status": "qualified", "source": "ads"}),
+        repeat,
+    )
+    results["cached_page"] = _timed(lambda: store.page(cursor=deep_cursor, limit=page_size), repeat)
+
+    full = json.dumps(uncached.page(limit=page_size)["leads"])
+    projected = json.dumps(uncached.page(limit=page_size, fields=["name", "email"])["leads"])
+    results["page_bytes"] = {"all_fields": len(full), "name_email": len(projected)}
+
+    query = {"cursor": None, "limit": page_size}
+    version, modified_at = store.version()
+    etag = leads_etag(version, query)
+
+    def revalidate():
+        version, modified_at = store.version()
+        assert not_modified(etag, None, leads_etag(version, query), modified_at)
+
+    results["revalidation_304"] = _timed(revalidate, repeat)
+    results["last_modified"] = http_date(modified_at)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark /admin/leads pagination and revalidation on a seeded table.")
+    parser.add_argument("--rows", type=int, default=200000, help="Leads to seed.")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200, help="Timed repetitions per measurement.")
+    parser.add_argument("--db", help="Leads database to use (seeded if empty); defaults to a temporary file.")
+    parser.add_argument("--output", help="Write results as JSON to this file.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LeadsStore(args.db or os.path.join(tmp, "leads.sqlite3"))
+        if store.count() < args.rows:
+            started = time.perf_counter()
+            seed(store, args.rows - store.count())
+            print(f"Seeded {store.count()} leads in {time.perf_counter() - started:.1f}s")
+        results = bench(store, args.page_size, args.repeat)
+
+    print(f"Full dump of {results['rows']} leads: {results['full_dump']['ms']}ms, {results['full_dump']['bytes']} bytes")
+    print(f"Deepest page: OFFSET p50 {results['deep_page_offset']['p50_ms']}ms -> "
+          f"keyset p50 {results['deep_page_keyset']['p50_ms']}ms (cached {results['cached_page']['p50_ms']}ms)")
+    print(f"Filtered keyset page p50: {results['filtered_page_keyset']['p50_ms']}ms")
+    print(f"Page bytes: all fields {results['page_bytes']['all_fields']} -> name,email {results['page_bytes']['name_email']}")
+    print(f"304 revalidation p50: {results['revalidation_304']['p50_ms']}ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import multiprocessing
+import resource
+import statistics
+import subprocess
+import tempfile
+import tracemalloc
+from contextlib import chdir
+from datetime import datetime, timezone
+
+# Offline retrieval and latency regression suite.
+# Uses deterministic fake embeddings and a stub LLM (bench_fakes.py), so it needs no API
+# keys or network, and writes machine-readable results that can be diffed across commits
+# (install requirements-dev.txt first; the end-to-end section needs httpx):
+#
+#   python bench_suite.py --output bench_results.json
+#   python bench_suite.py --output new.json --compare bench_results.json
+
+
+def percentiles(samples_ms):
+    samples_ms = sorted(samples_ms)
+    if not samples_ms:
+        return {}
+
+    def pick(q):
+        return round(samples_ms[min(len(samples_ms) - 1, int(q * len(samples_ms)))], 3)
+
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99),
+            "mean_ms": round(statistics.fmean(samples_ms), 3)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def bench_ingestion(corpus_dir, persist_directory, embeddings, workers):
+    from embedding_pipeline import BatchEmbedder
+    from ingestion import sync_documents
+    from rag_agent import open_vectorstore
+
+    vectorstore = open_vectorstore(persist_directory, embeddings)
+    embedder = BatchEmbedder(embeddings, requests_per_minute=10 ** 9, tokens_per_minute=10 ** 12)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    stats = sync_documents(vectorstore, corpus_dir, persist_directory, embedder=embedder, workers=workers)
+    seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = time.perf_counter()
+    sync_documents(vectorstore, corpus_dir, persist_directory, embedder=embedder, workers=workers)
+    noop_seconds = time.perf_counter() - started
+
+    return vectorstore, {
+        "chunks": stats["chunks_added"],
+        "seconds": round(seconds, 3),
+        "chunks_per_second": round(stats["chunks_added"] / seconds, 1) if seconds else None,
+        "incremental_noop_seconds": round(noop_seconds, 3),
+        "peak_python_heap_mb": round(peak / 2 ** 20, 1),
+    }
+
+
+def bench_retrieval(vectorstore, persist_directory, ground_truth, k):
+    from context_compression import compress_retriever
+    from embedding_pipeline import count_tokens
+    from quantized_store import open_quantized_store
+    from retrieval import build_retriever
+
+    quantized = open_quantized_store(vectorstore, persist_directory, vectorstore.embeddings)
+    backends = {
+        "dense": (vectorstore, "dense"),
+        "hybrid": (vectorstore, "hybrid"),
+        "quantized_dense": (quantized, "dense"),
+        "quantized_hybrid": (quantized, "hybrid"),
+    }
+    results = {}
+    configurations = [(name, store, mode, False, False) for name, (store, mode) in backends.items()]
+    configurations.append(("hybrid_compressed", vectorstore, "hybrid", True, False))
+    # Re-ranked: k adapts per query up to `k`, so recall is at most k chunks.
+    configurations.append(("hybrid_reranked", vectorstore, "hybrid", False, True))
+    for name, store, mode, compressed, rerank in configurations:
+        retriever = build_retriever(store, persist_directory, mode=mode, k=k, rerank=rerank)
+        if compressed:
+            retriever = compress_retriever(retriever)
+        latencies = []
+        hits = 0
+        context_tokens = []
+        chunks = []
+        for item in ground_truth:
+            started = time.perf_counter()
+            docs = retriever.invoke(item["query"])
+            latencies.append((time.perf_counter() - started) * 1000)
+            context_tokens.append(sum(count_tokens(d.page_content) for d in docs))
+            chunks.append(len(docs))
+            if any(item["key"] in d.page_content and item["answer"] in d.page_content for d in docs):
+                hits += 1
+        results[name] = dict(percentiles(latencies), **{
+            f"recall_at_{k}": round(hits / len(ground_truth), 4),
+            "mean_context_tokens": round(statistics.fmean(context_tokens), 1),
+            "mean_chunks": round(statistics.fmean(chunks), 2),
+        })
+    return results
+
+
+def bench_agent_retrieval(corpus_dir, persist_directory, embeddings, ground_truth):
+    """
+    Offline agent eval of fixed top-k against re-ranked adaptive k. The stub LLM searches
+    again (up to 3 times) when the context lacks what was asked about, so misses cost turns.
+    """
+    from bench_fakes import StubChatModel
+    from rag_agent import RAGAgent
+
+    results = {}
+    for name, rerank in (("fixed_k", False), ("adaptive_k", True)):
+        agent = RAGAgent(corpus_dir, persist_directory=persist_directory, embeddings=embeddings,
+                         llm=StubChatModel(max_searches=3), coalesce=False, read_only=True, rerank=rerank)
+        turns, prompt_tokens, context_tokens, chunks = [], [], [], []
+        correct = 0
+        for item in ground_truth:
+            answer, metadata = agent.run_query_with_metadata(item["query"])
+            timings = metadata["timings"]
+            turns.append(timings["llm_calls"])
+            prompt_tokens.append(timings["prompt_tokens"])
+            context_tokens.append(timings["context_tokens"]["sent"])
+            chunks.append(timings["retrieved_chunks"])
+            correct += item["answer"] in answer
+        results[name] = {
+            "mean_llm_calls": round(statistics.fmean(turns), 3),
+            "mean_prompt_tokens": round(statistics.fmean(prompt_tokens), 1),
+            "mean_context_tokens": round(statistics.fmean(context_tokens), 1),
+            "mean_chunks": round(statistics.fmean(chunks), 2),
+            "accuracy": round(correct / len(ground_truth), 4),
+        }
+    return results
+
+
+async def bench_end_to_end(corpus_dir, persist_directory, embeddings, queries, concurrency, llm_latency):
+    import httpx
+    import rag_api_service
+    from admission import AdmissionController
+    from agent_pool import AgentPool
+    from bench_fakes import StubChatModel
+
+    pool = AgentPool(corpus_dir, persist_directory=persist_directory, agent_kwargs={
+        "embeddings": embeddings, "llm": StubChatModel(latency=llm_latency), "answer_cache": False,
+    })
+    pool.get(rag_api_service.default_tools())
+    app = rag_api_service.app
+    app.state.agent_pool = pool
+    app.state.ready = True
+    # Every request is the same user; admission limits sized to the run keep it from
+    # measuring 429s instead of the query path.
+    app.state.admission = AdmissionController(
+        rate=len(queries), burst=len(queries), max_in_flight=max(1, concurrency), max_queue=len(queries),
+    )
+    token = rag_api_service.create_access_token({"sub": "admin"})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = []
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60) as client:
+        async def one(query):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post("/rag-query", json={"query": query}, headers=headers)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    errors.append(f"{response.status_code} {response.text[:200]}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(q) for q in queries))
+        wall = time.perf_counter() - started
+
+    if errors:
+        raise RuntimeError(f"{len(errors)} of {len(queries)} end-to-end requests failed; first: {errors[0]}")
+    return dict(percentiles(latencies), requests=len(queries), concurrency=concurrency, errors=0,
+                throughput_rps=round(len(queries) / wall, 2), llm_latency_ms=llm_latency * 1000)
+
+
+def _scaling_worker(corpus_dir, persist_directory, queries, barrier, spans):
+    import rag_api_service
+    from agent_pool import AgentPool
+    from bench_fakes import FakeEmbeddings, StubChatModel
+
+    pool = AgentPool(corpus_dir, persist_directory=persist_directory, agent_kwargs={
+        "embeddings": FakeEmbeddings(), "llm": StubChatModel(), "answer_cache": False, "read_only": True,
+    })
+    agent = pool.get(rag_api_service.default_tools())
+    barrier.wait()
+    started = time.time()
+    for query in queries:
+        agent.run_query_with_metadata(query)
+    spans.put((started, time.time()))
+
+
+def bench_worker_scaling(corpus_dir, persist_directory, queries, max_workers):
+    """
+    Query throughput with 1..max_workers read-only worker processes sharing one vector store,
+    as in the multi-worker deployment. The stub LLM has no latency, so the agent path is
+    CPU-bound and throughput should grow with processes up to the number of cores.
+    """
+    context = multiprocessing.get_context("spawn")
+    counts = sorted({1, max_workers} | {2 ** i for i in range(1, max_workers.bit_length()) if 2 ** i < max_workers})
+    results = {}
+    for n in counts:
+        barrier = context.Barrier(n)
+        spans = context.Queue()
+        processes = [context.Process(target=_scaling_worker, args=(corpus_dir, persist_directory, queries[i::n], barrier, spans))
+                     for i in range(n)]
+        for process in processes:
+            process.start()
+        finished = [spans.get() for _ in processes]
+        for process in processes:
+            process.join()
+        wall = max(end for _, end in finished) - min(start for start, _ in finished)
+        results[f"workers_{n}"] = {"throughput_qps": round(len(queries) / wall, 2)}
+    single = results["workers_1"]["throughput_qps"]
+    for n in counts:
+        results[f"workers_{n}"]["speedup"] = round(results[f"workers_{n}"]["throughput_qps"] / single, 2)
+    results["cpu_count"] = os.cpu_count()
+    return results
+
+
+def _flatten(prefix, value, out):
+    if isinstance(value, dict):
+        for key, sub in value.items():
+            _flatten(f"{prefix}.{key}" if prefix else key, sub, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+
+
+def compare(current, baseline_path):
+    """
+    Prints the relative change of every numeric metric against a previous results file.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    now, before = {}, {}
+    _flatten("", {k: v for k, v in current.items() if k != "meta"}, now)
+    _flatten("", {k: v for k, v in baseline.items() if k != "meta"}, before)
+    print(f"\nComparison against {baseline_path} (commit {baseline.get('meta', {}).get('git_commit')}):")
+    for key in sorted(now):
+        if key in before and before[key]:
+            change = (now[key] - before[key]) / abs(before[key]) * 100
+            print(f"  {key:55s} {before[key]:>12} -> {now[key]:>12} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingestion, retrieval and end-to-end latency benchmarks.")
+    parser.add_argument("--docs", type=int, default=10, help="Synthetic PDFs to generate.")
+    parser.add_argument("--pages", type=int, default=5, help="Pages per PDF.")
+    parser.add_argument("--facts-per-page", type=int, default=30)
+    parser.add_argument("--queries", type=int, default=200, help="Ground-truth queries to evaluate.")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=2, help="PDF parser processes.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent /rag-query requests.")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Simulated seconds per LLM call.")
+    parser.add_argument("--scaling-workers", type=int, default=min(4, os.cpu_count() or 1),
+                        help="Most worker processes in the multi-worker throughput test.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="Previous results file to diff against.")
+    args = parser.parse_args()
+
+    # Chroma adds each batch to its HNSW graph in set order, so approximate dense results
+    # (and everything ranked after them) vary with the hash seed. Pin it unless one is set.
+    if "PYTHONHASHSEED" not in os.environ:
+        os.environ["PYTHONHASHSEED"] = str(args.seed)
+        os.execv(sys.executable, [sys.executable] + sys.orig_argv[1:])
+
+    from bench_fakes import FakeEmbeddings
+    from setup_data import create_synthetic_corpus
+
+    # Chunk IDs hash the document path and Chroma's graph depends on the IDs, so the corpus is
+    # addressed relative to the work directory to get the same store on every run.
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as workdir, chdir(workdir):
+        corpus_dir = "corpus"
+        persist_directory = "chroma_db"
+        ground_truth = create_synthetic_corpus(corpus_dir, args.docs, args.pages, args.facts_per_page, args.seed)
+        sample = random.Random(args.seed).sample(ground_truth, min(args.queries, len(ground_truth)))
+        embeddings = FakeEmbeddings()
+
+        print("\n== Ingestion")
+        vectorstore, ingestion = bench_ingestion(corpus_dir, persist_directory, embeddings, args.workers)
+        print(json.dumps(ingestion, indent=2))
+
+        print("\n== Retrieval")
+        retrieval = bench_retrieval(vectorstore, persist_directory, sample, args.k)
+        print(json.dumps(retrieval, indent=2))
+
+        print("\n== Agent retrieval: fixed vs adaptive k")
+        agent_retrieval = bench_agent_retrieval(corpus_dir, persist_directory, embeddings, sample)
+        print(json.dumps(agent_retrieval, indent=2))
+
+        print("\n== End-to-end /rag-query")
+        end_to_end = asyncio.run(bench_end_to_end(
+            corpus_dir, persist_directory, embeddings, [item["query"] for item in sample],
+            args.concurrency, args.llm_latency,
+        ))
+        print(json.dumps(end_to_end, indent=2))
+
+        print("\n== Multi-worker query throughput")
+        # Workers open the store from disk; release this process's handle so Chroma flushes it first.
+        from rag_agent import close_vectorstore
+        close_vectorstore(vectorstore)
+        worker_scaling = bench_worker_scaling(
+            corpus_dir, persist_directory, [item["query"] for item in sample], args.scaling_workers,
+        )
+        print(json.dumps(worker_scaling, indent=2))
+
+    results = {
+        "meta": {
+            "git_commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "hash_seed": os.environ["PYTHONHASHSEED"],
+            "params": vars(args),
+        },
+        "ingestion": ingestion,
+        "retrieval": retrieval,
+        "agent_retrieval": agent_retrieval,
+        "end_to_end": end_to_end,
+        "worker_scaling": worker_scaling,
+        # ru_maxrss is reported in KiB on Linux and bytes on macOS.
+        "memory": {"max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                                       / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)},
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
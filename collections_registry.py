@@ -0,0 +1,310 @@
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+
+from metrics import Gauge, Counter
+
+COLLECTIONS_ROOT = os.environ.get("RAG_COLLECTIONS_DIR", "./collections")
+DEFAULT_COLLECTION = "default"
+MAX_OPEN_COLLECTIONS = int(os.environ.get("RAG_MAX_OPEN_COLLECTIONS", "8"))
+COLLECTION_MEMORY_BUDGET_MB = int(os.environ.get("RAG_COLLECTION_MEMORY_BUDGET_MB", "2048"))
+
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+OPEN_COLLECTIONS = Gauge("rag_open_collections", "Collections with a warm agent pool, excluding the default.")
+OPEN_COLLECTION_BYTES = Gauge("rag_open_collection_bytes", "Estimated resident index bytes of open collections.")
+COLLECTION_EVICTIONS = Counter("rag_collection_evictions_total", "Collections closed to respect the open handle or memory cap.")
+
+# Layout of a collection other than the default:
+#   <root>/<name>/documents/   uploaded PDFs, ingested incrementally as a directory source
+#   <root>/<name>/chroma_db/   its vector store, BM25 index, caches and ingest manifest
+# The default collection keeps the service's original PDF and ./chroma_db.
+
+
+class UnknownCollectionError(KeyError):
+    pass
+
+
+def validate_collection_name(name):
+    if not _NAME_PATTERN.match(name or ""):
+        raise ValueError("Collection names are 1-64 characters of letters, digits, '-' and '_'.")
+    return name
+
+
+def index_footprint(persist_directory):
+    """
+    Estimates the memory a collection's vector index occupies once loaded: the size of the
+    Chroma segment directories (HNSW data, links and metadata), which Chroma reads fully.
+    """
+    total = 0
+    if not os.path.isdir(persist_directory):
+        return 0
+    for entry in os.scandir(persist_directory):
+        if entry.is_dir():
+            for root, _, files in os.walk(entry.path):
+                for name in files:
+                    try:
+                        total += os.path.getsize(os.path.join(root, name))
+                    except OSError:
+                        pass
+    return total
+
+
+class _Entry:
+    def __init__(self, name, pool, footprint):
+        self.name = name
+        self.pool = pool
+        self.footprint = footprint
+        self.leases = 0
+        self.retired = False
+
+
+class CollectionRegistry:
+    def __init__(self, default_pool, root=COLLECTIONS_ROOT, max_open=MAX_OPEN_COLLECTIONS,
+                 memory_budget_mb=COLLECTION_MEMORY_BUDGET_MB, pool_size=2, agent_kwargs=None):
+        """
+        Routes queries to per-collection agent pools, keeping recently used collections warm.
+
+        Each open collection holds one AgentPool (and so one Chroma handle, BM25 index and
+        retriever per tool set). Collections beyond max_open, or beyond the estimated memory
+        budget, are closed least recently used first. A collection in use by a request is
+        leased and only closed once its last lease is returned; likewise a deleted collection
+        stops accepting leases at once, but its directory is removed with the last lease. The
+        default collection is pinned and not counted against either cap.
+
+        Args:
+            default_pool (AgentPool): Pool for the service's original document set.
+            root (str, optional): Directory holding one subdirectory per collection.
+            max_open (int, optional): Maximum open collections besides the default.
+            memory_budget_mb (int, optional): Estimated index memory allowed across open collections.
+            pool_size (int, optional): Tool sets kept warm per collection.
+            agent_kwargs (dict, optional): Extra keyword arguments passed to every RAGAgent.
+        """
+        self.default_pool = default_pool
+        self.root = root
+        self.max_open = max_open
+        self.memory_budget = memory_budget_mb * 2 ** 20
+        self.pool_size = pool_size
+        self.agent_kwargs = agent_kwargs or {}
+        self._entries = OrderedDict()
+        # Closed entries still waiting for leases to be returned.
+        self._retired = set()
+        # Collections deleted while leased, removed from disk with their last lease.
+        self._deleting = set()
+        self._lock = threading.Lock()
+        self._ingest_locks = {}
+
+    def collection_directory(self, name):
+        return os.path.join(self.root, validate_collection_name(name))
+
+    def documents_directory(self, name):
+        return os.path.join(self.collection_directory(name), "documents")
+
+    def source_path(self, name):
+        if name == DEFAULT_COLLECTION:
+            return self.default_pool.pdf_path
+        return self.documents_directory(name)
+
+    def persist_directory(self, name):
+        if name == DEFAULT_COLLECTION:
+            return self.default_pool.persist_directory
+        return os.path.join(self.collection_directory(name), "chroma_db")
+
+    def exists(self, name):
+        if name == DEFAULT_COLLECTION:
+            return True
+        return name not in self._deleting and os.path.isdir(self.collection_directory(name))
+
+    def is_deleting(self, name):
+        return name in self._deleting
+
+    def names(self):
+        names = [DEFAULT_COLLECTION]
+        if os.path.isdir(self.root):
+            names += sorted(n for n in os.listdir(self.root)
+                            if _NAME_PATTERN.match(n) and n != DEFAULT_COLLECTION and n not in self._deleting
+                            and os.path.isdir(os.path.join(self.root, n)))
+        return names
+
+    def acquire(self, name):
+        """
+        Leases the agent pool of a collection, opening it if needed. Pair with release().
+
+        Raises:
+            UnknownCollectionError: If the collection has never been created.
+        """
+        if name == DEFAULT_COLLECTION:
+            return DEFAULT_COLLECTION, self.default_pool
+        if not self.exists(name):
+            raise UnknownCollectionError(name)
+        from agent_pool import AgentPool
+
+        to_close = []
+        with self._lock:
+            if name in self._deleting:
+                raise UnknownCollectionError(name)
+            entry = self._entries.get(name)
+            if entry is None:
+                pool = AgentPool(self.documents_directory(name), persist_directory=self.persist_directory(name),
+                                 max_size=self.pool_size, agent_kwargs=self.agent_kwargs)
+                entry = self._entries[name] = _Entry(name, pool, index_footprint(pool.persist_directory))
+                print(f"Opened collection '{name}'")
+                to_close = self._evict_locked(keep=name)
+            self._entries.move_to_end(name)
+            entry.leases += 1
+        self._close(to_close)
+        return name, entry.pool
+
+    def release(self, lease):
+        name, pool = lease
+        if name == DEFAULT_COLLECTION:
+            return
+        to_close = []
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry.pool is not pool:
+                entry = getattr(pool, "_registry_entry", None)
+            if entry is not None:
+                entry.leases -= 1
+                if entry.retired and entry.leases == 0:
+                    self._retired.discard(entry)
+                    to_close.append(entry)
+        self._close(to_close)
+
+    def _evict_locked(self, keep=None):
+        closing = []
+        total = sum(e.footprint for e in self._entries.values())
+        while len(self._entries) > 1 and (len(self._entries) > self.max_open or total > self.memory_budget):
+            name = next(n for n in self._entries if n != keep)
+            entry = self._entries.pop(name)
+            total -= entry.footprint
+            COLLECTION_EVICTIONS.inc()
+            print(f"Evicting collection '{name}' (open: {len(self._entries)}, ~{total / 2 ** 20:.0f} MB)")
+            if self._retire_locked(entry):
+                closing.append(entry)
+        self._update_gauges_locked()
+        return closing
+
+    def _retire_locked(self, entry):
+        """
+        Marks a popped entry as retired. Returns True if it is idle and can be closed now.
+        """
+        entry.retired = True
+        # Kept reachable from the pool so outstanding leases can still be returned.
+        entry.pool._registry_entry = entry
+        if entry.leases:
+            self._retired.add(entry)
+            return False
+        return True
+
+    def _update_gauges_locked(self):
+        OPEN_COLLECTIONS.set(len(self._entries))
+        OPEN_COLLECTION_BYTES.set(sum(e.footprint for e in self._entries.values()))
+
+    def _close(self, entries):
+        for entry in entries:
+            entry.pool.close()
+            with self._lock:
+                remove = entry.name in self._deleting and not any(e.name == entry.name for e in self._retired)
+            if remove:
+                self._remove(entry.name)
+
+    def _remove(self, name):
+        try:
+            shutil.rmtree(self.collection_directory(name), ignore_errors=True)
+            print(f"Deleted collection '{name}'")
+        finally:
+            with self._lock:
+                self._deleting.discard(name)
+
+    def close(self, name):
+        """
+        Closes an open collection now (e.g. before deleting it); in-flight leases finish first.
+        """
+        with self._lock:
+            entry = self._entries.pop(name, None)
+            if entry is None:
+                return
+            idle = self._retire_locked(entry)
+            self._update_gauges_locked()
+        if idle:
+            self._close([entry])
+
+    def reload(self):
+        """
+        Drops the agents of every open collection so they are rebuilt against their stores.
+        """
+        self.default_pool.reload()
+        with self._lock:
+            pools = [e.pool for e in self._entries.values()]
+        for pool in pools:
+            pool.reload()
+
+    def _ingest_lock(self, name):
+        with self._lock:
+            return self._ingest_locks.setdefault(name, threading.Lock())
+
+    def ingest(self, name):
+        """
+        Incrementally ingests a collection's documents directory and refreshes its agents.
+        Runs one ingest per collection at a time.
+
+        Returns:
+            dict: Ingestion statistics from sync_documents.
+        """
+        lease = self.acquire(name)
+        try:
+            with self._ingest_lock(name):
+                stats = lease[1].ingest()
+            with self._lock:
+                entry = self._entries.get(name)
+                if entry is not None:
+                    entry.footprint = index_footprint(entry.pool.persist_directory)
+                    to_close = self._evict_locked(keep=name)
+                else:
+                    to_close = []
+            self._close(to_close)
+            return stats
+        finally:
+            self.release(lease)
+
+    def delete(self, name):
+        """
+        Closes a collection and removes its documents and vector store from disk. New leases
+        are refused at once; if requests still hold leases, the directory is removed when the
+        last one is returned.
+        """
+        if name == DEFAULT_COLLECTION:
+            raise ValueError("The default collection cannot be deleted.")
+        with self._ingest_lock(name):
+            with self._lock:
+                if not self.exists(name):
+                    raise UnknownCollectionError(name)
+                self._deleting.add(name)
+                entry = self._entries.pop(name, None)
+                idle = entry is None or self._retire_locked(entry)
+                self._update_gauges_locked()
+                leased = any(e.name == name for e in self._retired)
+            if idle:
+                if entry is not None:
+                    entry.pool.close()
+                if not leased:
+                    self._remove(name)
+            if leased:
+                print(f"Collection '{name}' will be deleted once its in-flight requests finish")
+
+    def describe(self, name):
+        with self._lock:
+            entry = self._entries.get(name)
+        persist_directory = self.persist_directory(name)
+        documents = []
+        if name != DEFAULT_COLLECTION and os.path.isdir(self.documents_directory(name)):
+            documents = sorted(n for n in os.listdir(self.documents_directory(name)) if n.lower().endswith(".pdf"))
+        return {
+            "name": name,
+            "open": name == DEFAULT_COLLECTION or entry is not None,
+            "index_bytes": entry.footprint if entry is not None else index_footprint(persist_directory),
+            "documents": documents,
+        }
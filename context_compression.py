@@ -0,0 +1,208 @@
+import os
+import re
+import math
+from typing import Any
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from embedding_pipeline import count_tokens
+from ingestion import CHUNK_OVERLAP
+from metrics import Counter, Histogram, stage_timer
+from retrieval import tokenize
+
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("RAG_CONTEXT_TOKEN_BUDGET", "800"))
+# Chunk overlaps shorter than this are treated as coincidence rather than splitter overlap.
+MIN_MERGE_OVERLAP = 20
+
+CONTEXT_TOKENS = Counter("rag_context_tokens_total", "Retrieved context tokens before and after compression.", ["kind"])
+CONTEXT_COMPRESSION_RATIO = Histogram(
+    "rag_context_compression_ratio", "Compressed / retrieved context tokens per retrieval.",
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0),
+)
+
+# Sentence boundaries: terminal punctuation followed by whitespace, or a line break.
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\s*\n+\s*")
+
+
+def split_sentences(text):
+    return [s.strip() for s in _SENTENCE_BOUNDARY.split(text) if s and s.strip()]
+
+
+def _overlap(left, right, max_overlap):
+    # Longest suffix of `left` that is a prefix of `right`.
+    for size in range(min(len(left), len(right), max_overlap), MIN_MERGE_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def merge_overlapping(documents, max_overlap=2 * CHUNK_OVERLAP):
+    """
+    Drops duplicate and contained chunks and joins chunks of the same source and page that
+    the splitter cut with an overlap, keeping the position of the best-ranked piece.
+
+    Returns:
+        tuple: (merged documents in rank order, indices of the input documents in each).
+    """
+    merged = []
+    members = []
+    for index, doc in enumerate(documents):
+        text = doc.page_content.strip()
+        group = (doc.metadata.get("source"), doc.metadata.get("page"))
+        for i, kept in enumerate(merged):
+            if (kept.metadata.get("source"), kept.metadata.get("page")) != group:
+                continue
+            existing = kept.page_content
+            if text in existing:
+                members[i].append(index)
+                break
+            if existing in text:
+                merged[i] = Document(page_content=text, metadata=kept.metadata, id=kept.id)
+                members[i].append(index)
+                break
+            after = _overlap(existing, text, max_overlap)
+            if after:
+                merged[i] = Document(page_content=existing + text[after:], metadata=kept.metadata, id=kept.id)
+                members[i].append(index)
+                break
+            before = _overlap(text, existing, max_overlap)
+            if before:
+                merged[i] = Document(page_content=text + existing[before:], metadata=kept.metadata, id=kept.id)
+                members[i].append(index)
+                break
+        else:
+            merged.append(Document(page_content=text, metadata=dict(doc.metadata), id=doc.id))
+            members.append([index])
+    return merged, members
+
+
+class ContextCompressor:
+    def __init__(self, token_budget=CONTEXT_TOKEN_BUDGET, min_score_ratio=0.5, neighbours=0):
+        """
+        Shrinks retrieved chunks to the text relevant to the query within a token budget.
+
+        Overlapping chunks are merged first. Sentences are then scored by the IDF-weighted
+        query terms they contain (IDF over all retrieved sentences, so terms shared by every
+        chunk count for little), and each document keeps the sentences scoring at least
+        min_score_ratio of the best sentence retrieved, or else its own best sentence, in their
+        original order. Documents with no lexical match (found by dense similarity alone) are
+        kept whole. Documents are then added in rank order until the token budget is spent;
+        the last one is cut at a sentence boundary.
+
+        Args:
+            token_budget (int, optional): Maximum cl100k tokens of context returned.
+            min_score_ratio (float, optional): Fraction of the best sentence score a sentence needs.
+            neighbours (int, optional): Sentences kept on each side of a selected sentence.
+        """
+        self.token_budget = token_budget
+        self.min_score_ratio = min_score_ratio
+        self.neighbours = neighbours
+
+    def _select(self, sentences, scores, threshold):
+        if not any(scores):
+            return sentences
+        selected = [i for i, score in enumerate(scores) if score > 0 and score >= threshold]
+        if not selected:
+            selected = [max(range(len(scores)), key=scores.__getitem__)]
+        keep = set()
+        for i in selected:
+            keep.update(range(max(0, i - self.neighbours), min(len(sentences), i + self.neighbours + 1)))
+        pieces = []
+        for i in sorted(keep):
+            if pieces and i - 1 not in keep:
+                pieces.append("...")
+            pieces.append(sentences[i])
+        return pieces
+
+    def compress(self, query, documents):
+        """
+        Returns:
+            list: Compressed documents. Metadata "tokens" is the document's size now and
+            "source_tokens" the retrieved tokens it stands in for (including documents dropped
+            by the budget), so the sums give context size before and after compression.
+        """
+        chunk_tokens = [count_tokens(d.page_content) for d in documents]
+        merged, members = merge_overlapping(documents)
+        split = [split_sentences(d.page_content) for d in merged]
+
+        query_terms = set(tokenize(query))
+        document_frequency = {}
+        total = sum(len(sentences) for sentences in split) or 1
+        for sentences in split:
+            for sentence in sentences:
+                for term in set(tokenize(sentence)) & query_terms:
+                    document_frequency[term] = document_frequency.get(term, 0) + 1
+        weights = {t: math.log(1 + total / df) for t, df in document_frequency.items()}
+        # Terms are summed in sorted order so scores do not depend on set order (PYTHONHASHSEED).
+        scores = [[sum(weights[t] for t in sorted(set(tokenize(s)) & query_terms)) for s in sentences]
+                  for sentences in split]
+        threshold = self.min_score_ratio * max((max(doc_scores, default=0) for doc_scores in scores), default=0)
+
+        compressed = []
+        remaining = self.token_budget
+        dropped = 0
+        for doc, sentences, sentence_scores, indices in zip(merged, split, scores, members):
+            source_tokens = sum(chunk_tokens[i] for i in indices)
+            if remaining <= 0:
+                dropped += source_tokens
+                continue
+            kept = []
+            used = 0
+            for piece in self._select(sentences, sentence_scores, threshold):
+                cost = count_tokens(piece) + 1
+                if used + cost > remaining:
+                    break
+                kept.append(piece)
+                used += cost
+            while kept and kept[-1] == "...":
+                kept.pop()
+            if not kept:
+                dropped += source_tokens
+                continue
+            remaining -= used
+            compressed.append(Document(
+                page_content=" ".join(kept), id=doc.id,
+                metadata=dict(doc.metadata, tokens=used, source_tokens=source_tokens),
+            ))
+        if compressed and dropped:
+            compressed[-1].metadata["source_tokens"] += dropped
+
+        before, after = sum(chunk_tokens), sum(d.metadata["tokens"] for d in compressed)
+        CONTEXT_TOKENS.inc(before, kind="retrieved")
+        CONTEXT_TOKENS.inc(after, kind="compressed")
+        if before:
+            CONTEXT_COMPRESSION_RATIO.observe(after / before)
+        return compressed
+
+
+class CompressingRetriever(BaseRetriever):
+    """
+    Wraps a retriever with ContextCompressor so the pdf_retriever tool hands the agent
+    deduplicated, query-relevant text within a token budget.
+    """
+
+    base_retriever: Any
+    compressor: Any
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        # Run as a child of this retriever, so callbacks can tell the inner search from the outer.
+        config = {"callbacks": run_manager.get_child()} if run_manager else None
+        documents = self.base_retriever.invoke(query, config=config)
+        with stage_timer("context_compression"):
+            return self.compressor.compress(query, documents)
+
+    async def _aget_relevant_documents(self, query, *, run_manager=None):
+        config = {"callbacks": run_manager.get_child()} if run_manager else None
+        documents = await self.base_retriever.ainvoke(query, config=config)
+        with stage_timer("context_compression"):
+            return self.compressor.compress(query, documents)
+
+
+def compress_retriever(retriever, token_budget=CONTEXT_TOKEN_BUDGET):
+    """
+    Returns the retriever wrapped with context compression, or unchanged if the budget is 0.
+    """
+    if not token_budget:
+        return retriever
+    return CompressingRetriever(base_retriever=retriever, compressor=ContextCompressor(token_budget))
@@ -0,0 +1,202 @@
+import os
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from array import array
+
+from langchain_core.embeddings import Embeddings
+
+from metrics import record_cache, stage_timer
+
+EMBED_CACHE_FILENAME = "embedding_cache.sqlite3"
+EMBED_CACHE_MAX_ENTRIES = int(os.environ.get("RAG_EMBED_CACHE_MAX_ENTRIES", "50000"))
+
+# SQLite limits the number of bound parameters per statement.
+_LOOKUP_CHUNK = 500
+# Cache hits refresh last_used (for LRU eviction) in batches rather than with a write per hit.
+_TOUCH_BATCH = 256
+_TOUCH_INTERVAL = 30.0
+
+
+def normalize_text(text):
+    """
+    Normalizes text before hashing so trivially different inputs (Unicode form,
+    surrounding or repeated whitespace) share a cache entry.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def text_key(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def model_name(embeddings):
+    return getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None) or type(embeddings).__name__
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, underlying, cache_path, max_entries=EMBED_CACHE_MAX_ENTRIES):
+        """
+        Disk-backed embedding cache in front of another Embeddings object.
+
+        Vectors are stored in SQLite keyed by (model name, normalized text hash), so
+        identical chunks and repeated queries skip the network call entirely. The cache
+        is bounded to max_entries with least-recently-used eviction. The async methods do
+        their SQLite work on a worker thread, so they never block the event loop.
+
+        Args:
+            underlying: The Embeddings object used on cache misses.
+            cache_path (str): Path of the SQLite cache file.
+            max_entries (int, optional): Maximum number of cached vectors.
+        """
+        self.underlying = underlying
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.model = model_name(underlying)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._count = None
+        self._touched = {}
+        self._touched_at = time.monotonic()
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.cache_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.cache_path, timeout=30, check_same_thread=False)
+            # WAL lets several worker processes read while one writes.
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, key TEXT NOT NULL, vector BLOB NOT NULL, last_used REAL NOT NULL, "
+                "PRIMARY KEY (model, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+            conn.commit()
+            self._conn = conn
+            self._count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return self._conn
+
+    def _lookup(self, keys):
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            conn = self._connection()
+            for i in range(0, len(unique), _LOOKUP_CHUNK):
+                chunk = unique[i:i + _LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({placeholders})",
+                    [self.model] + chunk,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._touched.update(dict.fromkeys(found, now))
+                if len(self._touched) >= _TOUCH_BATCH or time.monotonic() - self._touched_at > _TOUCH_INTERVAL:
+                    self._flush_touched(conn)
+                    conn.commit()
+        return found
+
+    def _flush_touched(self, conn):
+        if self._touched:
+            conn.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND key = ?",
+                [(used, self.model, key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+        self._touched_at = time.monotonic()
+
+    def _store(self, items):
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, key, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(self.model, key, array("f", vector).tobytes(), now) for key, vector in items.items()],
+            )
+            self._count += conn.total_changes - before
+            # Pending hits first, so eviction sees recent use.
+            self._flush_touched(conn)
+            if self._count > self.max_entries:
+                # Evict down to 90% of capacity so eviction is amortized over many inserts.
+                excess = self._count - int(self.max_entries * 0.9)
+                conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (excess,),
+                )
+                self._count = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            conn.commit()
+
+    def _split(self, texts):
+        keys = [text_key(t) for t in texts]
+        found = self._lookup(keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        hits = sum(1 for k in keys if k in found)
+        self.hits += hits
+        self.misses += len(missing)
+        record_cache("embedding", True, hits)
+        record_cache("embedding", False, len(missing))
+        return keys, found, missing
+
+    def embed_documents(self, texts):
+        keys, found, missing = self._split(texts)
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store(computed)
+            found.update(computed)
+        return [found[k] for k in keys]
+
+    def embed_query(self, text):
+        with stage_timer("embed_query"):
+            key = text_key(text)
+            found = self._lookup([key])
+            record_cache("embedding", key in found)
+            if key in found:
+                self.hits += 1
+                return found[key]
+            self.misses += 1
+            vector = self.underlying.embed_query(text)
+            self._store({key: vector})
+            return vector
+
+    async def aembed_documents(self, texts):
+        keys, found, missing = await asyncio.to_thread(self._split, texts)
+        if missing:
+            vectors = await self.underlying.aembed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            await asyncio.to_thread(self._store, computed)
+            found.update(computed)
+        return [found[k] for k in keys]
+
+    async def aembed_query(self, text):
+        with stage_timer("embed_query"):
+            key = text_key(text)
+            found = await asyncio.to_thread(self._lookup, [key])
+            record_cache("embedding", key in found)
+            if key in found:
+                self.hits += 1
+                return found[key]
+            self.misses += 1
+            vector = await self.underlying.aembed_query(text)
+            await asyncio.to_thread(self._store, {key: vector})
+            return vector
+
+    def stats(self):
+        return {"model": self.model, "entries": self._count, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,219 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Defaults sized for OpenAI embedding endpoints; override per deployment tier via env.
+EMBED_BATCH_TOKENS = int(os.environ.get("RAG_EMBED_BATCH_TOKENS", "8000"))
+EMBED_BATCH_SIZE = int(os.environ.get("RAG_EMBED_BATCH_SIZE", "256"))
+EMBED_CONCURRENCY = int(os.environ.get("RAG_EMBED_CONCURRENCY", "4"))
+EMBED_REQUESTS_PER_MINUTE = int(os.environ.get("RAG_EMBED_RPM", "3000"))
+EMBED_TOKENS_PER_MINUTE = int(os.environ.get("RAG_EMBED_TPM", "1000000"))
+EMBED_MAX_RETRIES = int(os.environ.get("RAG_EMBED_MAX_RETRIES", "6"))
+
+_encoding = None
+
+
+def count_tokens(text):
+    """
+    Counts tokens with tiktoken's cl100k_base encoding (used by OpenAI embedding models),
+    falling back to a 4-characters-per-token estimate if tiktoken is unavailable.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding is False:
+        return max(1, len(text) // 4)
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def is_rate_limit_error(error):
+    if getattr(error, "status_code", None) == 429 or getattr(error, "http_status", None) == 429:
+        return True
+    message = str(error).lower()
+    return "429" in message or "rate limit" in message or "ratelimit" in message
+
+
+def is_transient_error(error):
+    """
+    Whether an embedding request is worth retrying: rate limits, 5xx responses, timeouts
+    and connection failures. Anything else (a bad key, bad input) fails at once.
+    """
+    status = getattr(error, "status_code", None) or getattr(error, "http_status", None)
+    if status is not None:
+        return int(status) == 429 or int(status) >= 500
+    if is_rate_limit_error(error) or isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    # Client library errors (openai, httpx, requests) are matched by name so none is imported here.
+    return any("Timeout" in cls.__name__ or "Connect" in cls.__name__ for cls in type(error).__mro__)
+
+
+def _retry_after_seconds(error):
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute, tokens_per_minute, window=60.0):
+        """
+        Sliding-window limiter for a requests-per-minute and tokens-per-minute budget.
+        acquire() blocks until a request of the given size fits in both budgets.
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.window = window
+        self._events = deque()
+        self._tokens_in_window = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._events and now - self._events[0][0] >= self.window:
+                    _, old_tokens = self._events.popleft()
+                    self._tokens_in_window -= old_tokens
+                fits_requests = len(self._events) < self.requests_per_minute
+                # A single oversized request is allowed through an empty window rather than blocking forever.
+                fits_tokens = self._tokens_in_window + tokens <= self.tokens_per_minute or not self._events
+                if fits_requests and fits_tokens:
+                    self._events.append((now, tokens))
+                    self._tokens_in_window += tokens
+                    return
+                delay = self._events[0][0] + self.window - now
+            time.sleep(max(delay, 0.01))
+
+
+class BatchEmbedder:
+    def __init__(self, embeddings, max_batch_tokens=EMBED_BATCH_TOKENS, max_batch_size=EMBED_BATCH_SIZE,
+                 concurrency=EMBED_CONCURRENCY, requests_per_minute=EMBED_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=EMBED_TOKENS_PER_MINUTE, max_retries=EMBED_MAX_RETRIES,
+                 base_delay=1.0, max_delay=60.0):
+        """
+        Embeds chunks in token-budgeted batches with bounded concurrency, a shared
+        RPM/TPM budget, and exponential backoff with jitter on rate limit errors.
+
+        Args:
+            embeddings: A LangChain Embeddings object.
+            max_batch_tokens (int, optional): Token budget per embedding request.
+            max_batch_size (int, optional): Maximum number of texts per embedding request.
+            concurrency (int, optional): Number of embedding requests in flight at once.
+            requests_per_minute (int, optional): Request budget shared by all workers.
+            tokens_per_minute (int, optional): Token budget shared by all workers.
+            max_retries (int, optional): Retries per batch on transient errors before the ingest fails.
+        """
+        self.embeddings = embeddings
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+
+    def iter_batches(self, items):
+        """
+        Groups (id, Document) items into batches that respect the token and size budgets.
+
+        Yields:
+            tuple: (items, token_count) for each batch.
+        """
+        batch, batch_tokens = [], 0
+        for item in items:
+            tokens = count_tokens(item[1].page_content)
+            if batch and (batch_tokens + tokens > self.max_batch_tokens or len(batch) >= self.max_batch_size):
+                yield batch, batch_tokens
+                batch, batch_tokens = [], 0
+            batch.append(item)
+            batch_tokens += tokens
+        if batch:
+            yield batch, batch_tokens
+
+    def _embed_with_retry(self, texts, tokens):
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(tokens)
+            try:
+                return self.embeddings.embed_documents(texts)
+            except Exception as e:
+                attempt += 1
+                if attempt > self.max_retries or not is_transient_error(e):
+                    raise
+                delay = _retry_after_seconds(e)
+                if delay is None:
+                    delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+                    delay = random.uniform(delay / 2, delay)
+                kind = "Rate limited" if is_rate_limit_error(e) else "Embedding request failed"
+                print(f"{kind} (attempt {attempt}/{self.max_retries}): {e}; retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def embed_and_store(self, items, write_fn):
+        """
+        Embeds a stream of (id, Document) items and hands each finished batch to write_fn.
+
+        Batches are written in input order as they complete, so every written batch is a
+        checkpoint: an interrupted ingest resumes by skipping IDs already in the store.
+        Keeping the input order makes the store, and so how search ties are ranked, the
+        same on every run. At most `concurrency` batches are in flight, so memory stays
+        bounded for arbitrarily long input streams.
+
+        Args:
+            items (iterable): (id, Document) tuples to embed.
+            write_fn (callable): Called as write_fn(batch, vectors) on the calling thread.
+
+        Returns:
+            dict: Number of chunks and batches embedded, elapsed seconds and chunks/sec.
+        """
+        started = time.perf_counter()
+        progress = {"chunks": 0, "batches": 0}
+
+        def _complete(future, batch):
+            vectors = future.result()
+            write_fn(batch, vectors)
+            progress["chunks"] += len(batch)
+            progress["batches"] += 1
+            elapsed = time.perf_counter() - started
+            rate = progress["chunks"] / elapsed if elapsed > 0 else 0.0
+            print(f"Embedded {progress['chunks']} chunks in {progress['batches']} batches ({rate:.1f} chunks/sec)")
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="rag-embed") as executor:
+            pending = deque()
+            for batch, tokens in self.iter_batches(items):
+                if len(pending) >= self.concurrency:
+                    _complete(*pending.popleft())
+                texts = [doc.page_content for _, doc in batch]
+                pending.append((executor.submit(self._embed_with_retry, texts, tokens), batch))
+            while pending:
+                _complete(*pending.popleft())
+
+        elapsed = time.perf_counter() - started
+        rate = progress["chunks"] / elapsed if elapsed > 0 else 0.0
+        return {"chunks_embedded": progress["chunks"], "batches": progress["batches"],
+                "seconds": round(time.perf_counter() - started, 3), "chunks_per_second": round(rate, 1)}
+
+
+def chroma_writer(vectorstore):
+    """
+    Returns a write_fn that upserts precomputed embeddings into a LangChain Chroma store.
+    """
+    collection = vectorstore._collection
+
+    def _write(batch, vectors):
+        collection.upsert(
+            ids=[cid for cid, _ in batch],
+            embeddings=vectors,
+            metadatas=[doc.metadata or None for _, doc in batch],
+            documents=[doc.page_content for _, doc in batch],
+        )
+
+    return _write
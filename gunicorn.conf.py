@@ -0,0 +1,28 @@
+import os
+
+from rag_api_service import API_WORKERS, prepare_workers
+
+# Multi-worker deployment, one process per core:
+#
+#   RAG_WORKERS=4 gunicorn -c gunicorn.conf.py rag_api_service:app
+#
+# The documents are ingested once before the workers fork and the workers open the vector
+# store read-only. Each worker still warms its own agents and keeps its own /metrics,
+# admission limits and caches. Chroma clients do not see other processes' writes, so
+# uploads, document deletes and ingest jobs are rejected (409) while several workers run.
+# With a single worker nothing is prepared up front: the worker starts serving at once
+# and ingests in its background warm-up, as under uvicorn.
+
+bind = os.environ.get("RAG_BIND", "0.0.0.0:8001")
+workers = API_WORKERS
+worker_class = "uvicorn.workers.UvicornWorker"
+# Import the app in the master so workers inherit it (and what prepare_workers loads) copy-on-write.
+preload_app = True
+timeout = int(os.environ.get("RAG_WORKER_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+
+
+def on_starting(server):
+    if server.cfg.workers > 1:
+        prepare_workers()
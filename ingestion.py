@@ -0,0 +1,350 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+import multiprocessing
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+from embedding_pipeline import BatchEmbedder, chroma_writer
+from retrieval import open_bm25_index, reconcile_bm25
+
+# Splitter settings shared by every ingest so chunk hashes stay stable across runs.
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+MANIFEST_FILENAME = "ingest_manifest.json"
+INGEST_LOCK_FILENAME = ".ingest.lock"
+MANIFEST_VERSION = 1
+
+# Parsing and splitting run in a process pool, a few pages per task. At most
+# workers * 2 tasks are outstanding, so memory stays flat however large the PDFs are.
+INGEST_WORKERS = int(os.environ.get("RAG_INGEST_WORKERS", str(os.cpu_count() or 1)))
+INGEST_PAGES_PER_TASK = int(os.environ.get("RAG_INGEST_PAGES_PER_TASK", "16"))
+
+
+def discover_pdfs(source):
+    """
+    Lists the PDF files to ingest.
+
+    Args:
+        source (str): A single PDF file or a directory containing PDFs.
+
+    Returns:
+        list: Normalized PDF paths, sorted for deterministic ingestion order.
+    """
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if name.lower().endswith(".pdf"):
+                    paths.append(os.path.normpath(os.path.join(root, name)))
+        return sorted(paths)
+    if os.path.isfile(source):
+        return [os.path.normpath(source)]
+    return []
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(source, chunk_hash, occurrence):
+    """
+    Stable Chroma ID for a chunk: the same text at the same position in the same file
+    always maps to the same ID, so unchanged chunks are never re-embedded.
+    """
+    return text_sha256(f"{source}\x00{chunk_hash}\x00{occurrence}")
+
+
+def load_manifest(persist_directory):
+    path = os.path.join(persist_directory, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return {"version": MANIFEST_VERSION, "files": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    manifest.setdefault("files", {})
+    return manifest
+
+
+def save_manifest(persist_directory, manifest):
+    # Write atomically so an interrupted ingest never leaves a truncated manifest behind.
+    os.makedirs(persist_directory, exist_ok=True)
+    path = os.path.join(persist_directory, MANIFEST_FILENAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def count_pages(path):
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+
+def split_page_range(path, start, end):
+    """
+    Extracts and splits pages [start, end) of a PDF. Runs in a worker process, so it
+    returns plain (text, metadata) tuples rather than LangChain objects.
+    """
+    from pypdf import PdfReader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    reader = PdfReader(path)
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = []
+    for page in range(start, end):
+        text = reader.pages[page].extract_text() or ""
+        for chunk in text_splitter.split_text(text):
+            chunks.append((chunk, {"source": path, "page": page}))
+    return chunks
+
+
+def iter_page_chunks(paths, workers=INGEST_WORKERS, pages_per_task=INGEST_PAGES_PER_TASK):
+    """
+    Streams the chunks of several PDFs in document order, parsing page ranges in parallel.
+
+    Yields:
+        tuple: (path, text, metadata) for each chunk, and (path, None, None) once a file is done.
+    """
+    def tasks():
+        for path in paths:
+            pages = count_pages(path)
+            for start in range(0, pages, pages_per_task):
+                yield path, start, min(start + pages_per_task, pages), False
+            yield path, 0, 0, True
+
+    if workers <= 1:
+        for path, start, end, last in tasks():
+            if last:
+                yield path, None, None
+                continue
+            for text, metadata in split_page_range(path, start, end):
+                yield path, text, metadata
+        return
+
+    # spawn avoids forking a process that may already run embedding and Chroma threads.
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        pending = deque()
+        task_iter = tasks()
+
+        def _fill():
+            while len(pending) < workers * 2:
+                task = next(task_iter, None)
+                if task is None:
+                    return
+                path, start, end, last = task
+                future = None if last else executor.submit(split_page_range, path, start, end)
+                pending.append((path, future))
+
+        _fill()
+        while pending:
+            path, future = pending.popleft()
+            _fill()
+            if future is None:
+                yield path, None, None
+                continue
+            for text, metadata in future.result():
+                yield path, text, metadata
+
+
+def _is_within(path, directory):
+    directory = os.path.abspath(directory)
+    return os.path.commonpath([os.path.abspath(path), directory]) == directory
+
+
+def _stored_ids_for_source(vectorstore, source):
+    result = vectorstore.get(where={"source": source}, include=[])
+    return set(result.get("ids", []))
+
+
+@contextmanager
+def ingest_lock(persist_directory):
+    """
+    Exclusive cross-process lock on a vector store directory, held while it is written.
+
+    Chroma, the BM25 index and the manifest are not safe to write from several processes
+    at once, and multi-worker deployments open every store from each worker.
+    """
+    os.makedirs(persist_directory, exist_ok=True)
+    with open(os.path.join(persist_directory, INGEST_LOCK_FILENAME), "a") as lock_file:
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def sync_documents(vectorstore, source, persist_directory, embedder=None, workers=INGEST_WORKERS):
+    """
+    Incrementally brings the vector store in line with the PDFs under `source`.
+
+    Files whose content hash matches the manifest are skipped without being parsed.
+    Changed files are parsed page-range by page-range in a process pool and their chunks
+    stream straight into the embedding stage; only chunks that are not already stored are
+    embedded, and chunks that no longer exist are deleted. Files that disappeared from
+    `source` have all their chunks removed.
+
+    Args:
+        vectorstore: An open LangChain Chroma vector store.
+        source (str): A PDF file or a directory of PDFs.
+        persist_directory (str): Directory holding the vector store and the manifest.
+        embedder (BatchEmbedder, optional): Embedding stage; defaults to one built around
+            the store's embedding function with settings from the environment.
+        workers (int, optional): Parser processes; 1 parses in-process.
+
+    Returns:
+        dict: Counts of scanned, skipped and changed files, added and deleted chunks,
+            and embedding throughput.
+    """
+    # Serialized across processes; a second caller waits and then finds nothing to do.
+    with ingest_lock(persist_directory):
+        return _sync_documents(vectorstore, source, persist_directory, embedder, workers)
+
+
+def _sync_documents(vectorstore, source, persist_directory, embedder, workers):
+    embedder = embedder or BatchEmbedder(vectorstore.embeddings)
+    bm25_index = open_bm25_index(persist_directory)
+    write_chroma = chroma_writer(vectorstore)
+
+    def write(batch, vectors):
+        # Chroma first: on resume, reconcile_bm25 repairs a batch that missed the lexical index.
+        write_chroma(batch, vectors)
+        bm25_index.add([(cid, doc.page_content, doc.metadata) for cid, doc in batch])
+
+    def delete(ids):
+        vectorstore.delete(ids=ids)
+        bm25_index.delete(ids)
+    manifest = load_manifest(persist_directory)
+    files = manifest["files"]
+    stats = {"files_scanned": 0, "files_skipped": 0, "files_changed": 0,
+             "files_removed": 0, "chunks_added": 0, "chunks_deleted": 0, "pipeline_seconds": 0.0}
+    started = time.perf_counter()
+
+    paths = discover_pdfs(source)
+    changed = []
+    for path in paths:
+        stats["files_scanned"] += 1
+        digest = file_sha256(path)
+        entry = files.get(path)
+        if entry and entry.get("sha256") == digest:
+            stats["files_skipped"] += 1
+            continue
+        changed.append((path, digest, entry))
+
+    # One ordered chunk stream for all changed files, so later files are already being
+    # parsed while earlier ones are embedded.
+    chunk_stream = iter_page_chunks([path for path, _, _ in changed], workers=workers)
+    for path, digest, entry in changed:
+        print(f"Indexing changed file {path}...")
+        # The store itself is the source of truth for what is already embedded, which
+        # also covers stores created before the manifest existed.
+        stored = _stored_ids_for_source(vectorstore, path)
+        new_chunks = {}
+        occurrences = {}
+
+        def _file_items():
+            from langchain_core.documents import Document
+
+            for _, text, metadata in chunk_stream:
+                if text is None:
+                    return
+                chunk_hash = text_sha256(text)
+                occurrence = occurrences.get(chunk_hash, 0)
+                occurrences[chunk_hash] = occurrence + 1
+                cid = chunk_id(path, chunk_hash, occurrence)
+                new_chunks[cid] = chunk_hash
+                # Chunks already in the store (including batches written before an interrupted
+                # run) are skipped, so re-running resumes where the last ingest stopped.
+                if cid not in stored:
+                    yield cid, Document(page_content=text, metadata=metadata)
+
+        result = embedder.embed_and_store(_file_items(), write)
+        stats["chunks_added"] += result["chunks_embedded"]
+        stats["pipeline_seconds"] += result["seconds"]
+
+        known = stored | set((entry or {}).get("chunks", {}))
+        stale = list(known - set(new_chunks))
+        if stale:
+            delete(stale)
+            stats["chunks_deleted"] += len(stale)
+
+        files[path] = {"sha256": digest, "chunks": new_chunks}
+        save_manifest(persist_directory, manifest)
+        stats["files_changed"] += 1
+
+    # Only prune files that vanished from a directory we were asked to track.
+    if os.path.isdir(source):
+        current = set(paths)
+        for path in list(files):
+            if path in current or not _is_within(path, source):
+                continue
+            print(f"Removing chunks for deleted file {path}...")
+            ids = list(set(files[path].get("chunks", {})) | _stored_ids_for_source(vectorstore, path))
+            if ids:
+                delete(ids)
+                stats["chunks_deleted"] += len(ids)
+            del files[path]
+            save_manifest(persist_directory, manifest)
+            stats["files_removed"] += 1
+
+    if vectorstore._collection.count() != bm25_index.count():
+        reconcile_bm25(vectorstore, bm25_index)
+
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    stats["pipeline_seconds"] = round(stats["pipeline_seconds"], 3)
+    if stats["pipeline_seconds"] > 0:
+        stats["chunks_per_second"] = round(stats["chunks_added"] / stats["pipeline_seconds"], 1)
+    print(f"Ingestion finished: {stats}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally ingest PDFs into the Chroma vector store.")
+    parser.add_argument("source", nargs="?", default="sample.pdf", help="PDF file or directory of PDFs.")
+    parser.add_argument("--persist-directory", default="./chroma_db")
+    parser.add_argument("--concurrency", type=int, default=None, help="Embedding requests in flight.")
+    parser.add_argument("--batch-tokens", type=int, default=None, help="Token budget per embedding request.")
+    parser.add_argument("--rpm", type=int, default=None, help="Embedding requests per minute budget.")
+    parser.add_argument("--tpm", type=int, default=None, help="Embedding tokens per minute budget.")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS, help="PDF parser processes.")
+    parser.add_argument("--quantized", action="store_true",
+                        help="Also rebuild the memory-mapped int8 index used by RAG_VECTOR_BACKEND=quantized.")
+    args = parser.parse_args()
+
+    from rag_agent import open_vectorstore, create_embeddings
+
+    embeddings = create_embeddings(args.persist_directory)
+    options = {
+        "concurrency": args.concurrency,
+        "max_batch_tokens": args.batch_tokens,
+        "requests_per_minute": args.rpm,
+        "tokens_per_minute": args.tpm,
+    }
+    embedder = BatchEmbedder(embeddings, **{k: v for k, v in options.items() if v is not None})
+    vectorstore = open_vectorstore(args.persist_directory, embeddings)
+    sync_documents(vectorstore, args.source, args.persist_directory, embedder=embedder, workers=args.workers)
+    if args.quantized:
+        from quantized_store import build_quantized_index
+        with ingest_lock(args.persist_directory):
+            build_quantized_index(vectorstore, args.persist_directory)
+
+
+if __name__ == "__main__":
+    main()
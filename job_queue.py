@@ -0,0 +1,412 @@
+import os
+import json
+import time
+import uuid
+import atexit
+import signal
+import sqlite3
+import threading
+import multiprocessing
+
+from metrics import Counter, Gauge
+
+JOBS_DB_PATH = os.environ.get("RAG_JOBS_DB", "./jobs.sqlite3")
+JOB_WORKERS = int(os.environ.get("RAG_JOB_WORKERS", "1"))
+JOB_DEFAULT_TIMEOUT = float(os.environ.get("RAG_JOB_TIMEOUT", "1800"))
+# Upper bound on a submitted timeout; a stuck job holds its worker until the timeout passes.
+JOB_MAX_TIMEOUT = float(os.environ.get("RAG_JOB_MAX_TIMEOUT", "21600"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("RAG_JOB_MAX_ATTEMPTS", "2"))
+JOB_RETENTION_DAYS = float(os.environ.get("RAG_JOB_RETENTION_DAYS", "7"))
+# Workers run at a lower CPU priority so interactive /rag-query traffic wins contention.
+JOB_WORKER_NICE = int(os.environ.get("RAG_JOB_WORKER_NICE", "10"))
+JOB_POLL_INTERVAL = 0.5
+# Submitted priorities are clamped to [-JOB_MAX_PRIORITY, JOB_MAX_PRIORITY], so one caller
+# cannot push their jobs arbitrarily far ahead of everyone else's.
+JOB_MAX_PRIORITY = int(os.environ.get("RAG_JOB_MAX_PRIORITY", "10"))
+
+JOB_KINDS = ("query", "batch", "audit", "ingest")
+FINISHED_STATUSES = ("succeeded", "failed", "timed_out")
+
+JOBS = Gauge("rag_jobs", "Jobs in the queue by status.", ["status"])
+JOB_WORKER_RESTARTS = Counter("rag_job_worker_restarts_total", "Job worker processes restarted after a timeout or crash.")
+
+
+class JobStore:
+    def __init__(self, path=JOBS_DB_PATH):
+        """
+        Durable job queue in SQLite, shared by the API processes (submit and read) and the
+        job workers (claim and complete). Claims are atomic, so any number of workers can
+        poll the same file.
+
+        Args:
+            path (str): Path of the SQLite database.
+        """
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "  id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL, priority INTEGER NOT NULL,"
+                "  status TEXT NOT NULL, timeout REAL NOT NULL, owner TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+                "  worker_pid INTEGER, created_at REAL NOT NULL, started_at REAL, finished_at REAL,"
+                "  result TEXT, error TEXT);"
+                "CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority DESC, created_at);"
+            )
+            self._local.conn = conn
+        return conn
+
+    def submit(self, kind, params, priority=0, timeout=None, owner=None):
+        """
+        Queues a job. Higher priorities run first, then oldest first; priority is clamped
+        to [-JOB_MAX_PRIORITY, JOB_MAX_PRIORITY].
+
+        Returns:
+            str: The job ID.
+
+        Raises:
+            ValueError: On an unknown kind or a timeout outside (0, JOB_MAX_TIMEOUT].
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind '{kind}'; expected one of {', '.join(JOB_KINDS)}.")
+        if timeout is None:
+            timeout = JOB_DEFAULT_TIMEOUT
+        elif not 0 < timeout <= JOB_MAX_TIMEOUT:
+            raise ValueError(f"Job timeout must be greater than 0 and at most {JOB_MAX_TIMEOUT:g} seconds.")
+        job_id = uuid.uuid4().hex
+        priority = max(-JOB_MAX_PRIORITY, min(int(priority), JOB_MAX_PRIORITY))
+        self._conn().execute(
+            "INSERT INTO jobs (id, kind, params, priority, status, timeout, owner, created_at)"
+            " VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)",
+            (job_id, kind, json.dumps(params or {}), priority, float(timeout),
+             owner, time.time()),
+        )
+        return job_id
+
+    def get(self, job_id):
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def claim(self, worker_pid):
+        """
+        Atomically moves the next queued job to running for this worker.
+
+        Returns:
+            dict: The claimed job, or None if the queue is empty.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY priority DESC, created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker_pid = ?, started_at = ?, attempts = attempts + 1"
+                " WHERE id = ?",
+                (worker_pid, time.time(), row["id"]),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["id"])
+
+    def finish(self, job_id, status, result=None, error=None, only_if_running=True):
+        """
+        Records a job's outcome. Returns False if the job had already been finished elsewhere
+        (e.g. timed out by the manager just before the worker completed it).
+        """
+        query = "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?"
+        if only_if_running:
+            query += " AND status = 'running'"
+        cursor = self._conn().execute(
+            query, (status, json.dumps(result, default=str) if result is not None else None, error, time.time(), job_id)
+        )
+        return cursor.rowcount == 1
+
+    def requeue(self, job_id):
+        cursor = self._conn().execute(
+            "UPDATE jobs SET status = 'queued', worker_pid = NULL, started_at = NULL"
+            " WHERE id = ? AND status = 'running'",
+            (job_id,),
+        )
+        return cursor.rowcount == 1
+
+    def running(self):
+        return [dict(row) for row in self._conn().execute(
+            "SELECT id, kind, worker_pid, started_at, timeout, attempts FROM jobs WHERE status = 'running'"
+        )]
+
+    def counts(self):
+        return dict(self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def purge(self, older_than_seconds):
+        cutoff = time.time() - older_than_seconds
+        placeholders = ",".join("?" * len(FINISHED_STATUSES))
+        self._conn().execute(
+            f"DELETE FROM jobs WHERE status IN ({placeholders}) AND finished_at < ?", (*FINISHED_STATUSES, cutoff)
+        )
+
+
+# --- Worker process -------------------------------------------------------------------
+
+_worker_pools = {}
+
+
+def _pool(params):
+    # Workers keep their agents warm across jobs, like the API's AgentPool.
+    from agent_pool import AgentPool
+
+    key = (params["pdf_path"], params["persist_directory"])
+    pool = _worker_pools.get(key)
+    if pool is None:
+        pool = _worker_pools[key] = AgentPool(params["pdf_path"], persist_directory=params["persist_directory"])
+    return pool
+
+
+def _run_query(params):
+    from service_tools import default_tools
+
+    with _pool(params).leased(default_tools()) as agent:
+        answer, metadata = agent.run_query_with_metadata(params["query"])
+    return {"answer": answer, "metadata": metadata}
+
+
+def _run_batch(params):
+    from service_tools import default_tools
+
+    with _pool(params).leased(default_tools()) as agent:
+        return {"results": agent.run_batch(params["queries"], max_concurrency=params.get("max_concurrency", 4))}
+
+
+def _run_audit(params):
+    from audit_script import AUDIT_QUERY, audit_tools
+
+    with _pool(params).leased(audit_tools()) as agent:
+        answer, metadata = agent.run_query_with_metadata(params.get("query") or AUDIT_QUERY)
+    return {"answer": answer, "metadata": metadata}
+
+
+def _run_ingest(params):
+    from rag_agent import READ_ONLY_STORE
+
+    # Workers of a multi-worker deployment inherit RAG_READ_ONLY; the API processes would
+    # not see what this process writes.
+    if READ_ONLY_STORE:
+        raise RuntimeError("Ingest jobs are disabled while the vector store is read-only (RAG_WORKERS > 1).")
+    return {"ingestion": _pool(params).ingest()}
+
+
+JOB_HANDLERS = {"query": _run_query, "batch": _run_batch, "audit": _run_audit, "ingest": _run_ingest}
+
+
+def worker_main(db_path, parent_pid):
+    """
+    Job worker process: claims jobs one at a time and stores their results until the
+    parent process goes away.
+    """
+    if JOB_WORKER_NICE and hasattr(os, "nice"):
+        os.nice(JOB_WORKER_NICE)
+    if hasattr(os, "setpgrp"):
+        # Its own process group, so terminating the worker also stops the PDF parser
+        # processes an ingest job starts.
+        os.setpgrp()
+    store = JobStore(db_path)
+    pid = os.getpid()
+    print(f"Job worker {pid} started.")
+    while os.getppid() == parent_pid:
+        job = store.claim(pid)
+        if job is None:
+            time.sleep(JOB_POLL_INTERVAL)
+            continue
+        print(f"Job worker {pid} running {job['kind']} job {job['id']} (attempt {job['attempts']})")
+        try:
+            result = JOB_HANDLERS[job["kind"]](job["params"])
+            store.finish(job["id"], "succeeded", result=result)
+        except Exception as e:
+            store.finish(job["id"], "failed", error=f"{type(e).__name__}: {e}")
+
+
+# --- Manager --------------------------------------------------------------------------
+
+
+def _terminate(process):
+    # Signals the worker's whole process group, falling back to the worker alone if it has
+    # not created its group yet.
+    if hasattr(os, "killpg") and process.pid is not None:
+        try:
+            if os.getpgid(process.pid) == process.pid:
+                os.killpg(process.pid, signal.SIGTERM)
+                return
+        except ProcessLookupError:
+            return
+    process.terminate()
+
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    if os.name == "nt":
+        # Signal 0 would terminate the process on Windows; rely on the job timeout instead.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobManager:
+    def __init__(self, db_path=JOBS_DB_PATH, workers=JOB_WORKERS, check_interval=1.0):
+        """
+        Supervises the job worker processes for one deployment.
+
+        Only one process per jobs database runs workers: the first to take the manager lock
+        file. Others can still submit and read jobs. The supervisor thread restarts crashed
+        workers (requeueing their job until JOB_MAX_ATTEMPTS), kills workers whose job
+        exceeded its timeout, publishes queue gauges and purges old finished jobs.
+
+        Args:
+            db_path (str, optional): Path of the jobs database.
+            workers (int, optional): Worker processes to run; 0 disables execution.
+            check_interval (float, optional): Seconds between supervision passes.
+        """
+        self.db_path = db_path
+        self.workers = workers
+        self.check_interval = check_interval
+        self.store = JobStore(db_path)
+        self._processes = []
+        self._lock_file = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._context = multiprocessing.get_context("spawn")
+
+    def _acquire_lock(self):
+        lock_path = f"{self.db_path}.manager.lock"
+        self._lock_file = open(lock_path, "a")
+        try:
+            import fcntl
+        except ImportError:
+            return True
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            self._lock_file.close()
+            self._lock_file = None
+            return False
+
+    def start(self):
+        """
+        Starts the workers and supervisor if this process wins the manager lock.
+
+        Returns:
+            bool: True if this process manages the workers.
+        """
+        if self.workers <= 0 or not self._acquire_lock():
+            return False
+        now = time.time()
+        for job in self.store.running():
+            self._check_orphan(job, now)
+        for _ in range(self.workers):
+            self._spawn()
+        self._thread = threading.Thread(target=self._supervise, name="rag-job-manager", daemon=True)
+        self._thread.start()
+        # Workers are not daemonic, so multiprocessing joins them at exit; stop them first.
+        atexit.register(self.stop)
+        print(f"Job manager started with {self.workers} worker process(es).")
+        return True
+
+    def _spawn(self):
+        # Not daemonic: ingest jobs start their own PDF parser processes, which daemonic
+        # processes may not have. Workers exit when stopped or when their parent is gone.
+        process = self._context.Process(target=worker_main, args=(self.db_path, os.getpid()))
+        process.start()
+        self._processes.append(process)
+        return process
+
+    def _check_orphan(self, job, now):
+        # A job claimed by a worker of an earlier manager. That worker finishes its current
+        # job before noticing its parent is gone, so the job is only recovered once the
+        # process is dead, and only failed as timed out once its timeout has passed.
+        if not _pid_alive(job["worker_pid"]):
+            self._recover(job, "worker lost on restart")
+        elif now - job["started_at"] > job["timeout"]:
+            if self.store.finish(job["id"], "timed_out", error=f"Timed out after {job['timeout']:.0f}s"):
+                print(f"Job {job['id']} of orphaned worker {job['worker_pid']} timed out.")
+
+    def _recover(self, job, reason):
+        if job["attempts"] < JOB_MAX_ATTEMPTS and self.store.requeue(job["id"]):
+            print(f"Requeued job {job['id']} ({reason}).")
+        else:
+            self.store.finish(job["id"], "failed", error=reason)
+
+    def _supervise(self):
+        last_purge = 0.0
+        while not self._stop.wait(self.check_interval):
+            try:
+                self._check()
+                if time.monotonic() - last_purge > 3600:
+                    self.store.purge(JOB_RETENTION_DAYS * 86400)
+                    last_purge = time.monotonic()
+            except Exception as e:
+                print(f"Job manager check failed: {e}")
+
+    def _check(self):
+        now = time.time()
+        by_pid = {p.pid: p for p in self._processes}
+        for job in self.store.running():
+            process = by_pid.get(job["worker_pid"])
+            if process is None:
+                self._check_orphan(job, now)
+            elif not process.is_alive():
+                self._recover(job, "worker exited while running the job")
+            elif now - job["started_at"] > job["timeout"]:
+                # A stuck agent run cannot be interrupted in-process; the worker is replaced.
+                if self.store.finish(job["id"], "timed_out", error=f"Timed out after {job['timeout']:.0f}s"):
+                    print(f"Job {job['id']} timed out; restarting worker {process.pid}.")
+                    _terminate(process)
+                    process.join(5)
+        for process in list(self._processes):
+            if not process.is_alive():
+                self._processes.remove(process)
+                JOB_WORKER_RESTARTS.inc()
+                self._spawn()
+        counts = self.store.counts()
+        for status in ("queued", "running") + FINISHED_STATUSES:
+            JOBS.set(counts.get(status, 0), status=status)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+        for process in self._processes:
+            _terminate(process)
+        for process in self._processes:
+            process.join(5)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        self._processes = []
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        atexit.unregister(self.stop)
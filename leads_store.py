@@ -0,0 +1,249 @@
+import os
+import time
+import json
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+
+from metrics import record_cache
+
+LEADS_DB_PATH = os.environ.get("RAG_LEADS_DB", "./leads.sqlite3")
+LEADS_PAGE_SIZE = int(os.environ.get("RAG_LEADS_PAGE_SIZE", "100"))
+LEADS_MAX_PAGE_SIZE = int(os.environ.get("RAG_LEADS_MAX_PAGE_SIZE", "1000"))
+LEADS_PAGE_CACHE_SIZE = int(os.environ.get("RAG_LEADS_PAGE_CACHE_SIZE", "256"))
+
+LEAD_FIELDS = ("id", "name", "email", "company", "status", "source", "created_at", "updated_at")
+# Filters on these columns are served by an (column, id) index, so a filtered keyset page is one range scan.
+LEAD_FILTERS = ("status", "source", "company")
+
+# The leads the endpoint served before it had a store; a new database starts with them.
+DEFAULT_LEADS = (
+    {"name": "Alice Smith", "email": "alice@example.com"},
+    {"name": "Bob Jones", "email": "bob@example.com"},
+    {"name": "Charlie Brown", "email": "charlie@example.com"},
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leads (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    company TEXT,
+    status TEXT NOT NULL DEFAULT 'new',
+    source TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_leads_status ON leads (status, id);
+CREATE INDEX IF NOT EXISTS idx_leads_source ON leads (source, id);
+CREATE INDEX IF NOT EXISTS idx_leads_company ON leads (company, id);
+CREATE INDEX IF NOT EXISTS idx_leads_created ON leads (created_at, id);
+
+-- One row recording the table's version, bumped by triggers on every write, so readers
+-- can tell whether anything changed with a single primary-key lookup.
+CREATE TABLE IF NOT EXISTS leads_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL,
+    modified_at REAL NOT NULL
+);
+INSERT OR IGNORE INTO leads_version (id, version, modified_at) VALUES (1, 0, (julianday('now') - 2440587.5) * 86400.0);
+CREATE TRIGGER IF NOT EXISTS leads_inserted AFTER INSERT ON leads BEGIN
+    UPDATE leads_version SET version = version + 1, modified_at = (julianday('now') - 2440587.5) * 86400.0 WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS leads_updated AFTER UPDATE ON leads BEGIN
+    UPDATE leads_version SET version = version + 1, modified_at = (julianday('now') - 2440587.5) * 86400.0 WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS leads_deleted AFTER DELETE ON leads BEGIN
+    UPDATE leads_version SET version = version + 1, modified_at = (julianday('now') - 2440587.5) * 86400.0 WHERE id = 1;
+END;
+"""
+
+
+class LeadsStore:
+    def __init__(self, path=LEADS_DB_PATH, cache_size=LEADS_PAGE_CACHE_SIZE):
+        """
+        Leads in SQLite, read a page at a time with keyset pagination.
+
+        Pages are ordered by id and continue after a cursor (the last id seen), so every page
+        costs one index range scan however deep it is. Served pages are cached in-process
+        by (store version, query); any write bumps the version through a trigger, which also
+        invalidates the cache, ETags and Last-Modified for every process sharing the file.
+
+        Args:
+            path (str, optional): Path of the SQLite database.
+            cache_size (int, optional): Pages kept in the in-process cache; 0 disables it.
+        """
+        self.path = path
+        self.cache_size = cache_size
+        self._local = threading.local()
+        self._pages = OrderedDict()
+        self._pages_lock = threading.Lock()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._insert(conn, DEFAULT_LEADS, only_if_empty=True)
+            self._local.conn = conn
+        return conn
+
+    def _insert(self, conn, leads, only_if_empty=False):
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if only_if_empty and conn.execute("SELECT EXISTS (SELECT 1 FROM leads)").fetchone()[0]:
+                conn.execute("COMMIT")
+                return
+            conn.executemany(
+                "INSERT INTO leads (name, email, company, status, source, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((lead["name"], lead["email"], lead.get("company"), lead.get("status", "new"), lead.get("source"),
+                  lead.get("created_at", now), lead.get("updated_at", lead.get("created_at", now)))
+                 for lead in leads),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def add(self, leads):
+        """
+        Inserts leads (dicts with at least name and email) in one transaction.
+        """
+        self._insert(self._conn(), leads)
+
+    def version(self):
+        """
+        Returns:
+            tuple: (version, modified_at) of the leads table.
+        """
+        row = self._conn().execute("SELECT version, modified_at FROM leads_version WHERE id = 1").fetchone()
+        return row["version"], row["modified_at"]
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM leads").fetchone()[0]
+
+    def page(self, cursor=None, limit=LEADS_PAGE_SIZE, fields=None, filters=None,
+             created_after=None, created_before=None):
+        """
+        Reads one page of leads.
+
+        Args:
+            cursor (int, optional): Return leads with an id greater than this.
+            limit (int, optional): Page size, capped at LEADS_MAX_PAGE_SIZE.
+            fields (list, optional): Columns to return; id is always included. Defaults to all.
+            filters (dict, optional): Exact-match filters on LEAD_FILTERS columns.
+            created_after (float, optional): Only leads created at or after this Unix time.
+            created_before (float, optional): Only leads created before this Unix time.
+
+        Returns:
+            dict: "leads", "next_cursor" (None on the last page), and the store "version" and
+            "modified_at" the page was read at. Cached pages are shared; do not modify them.
+
+        Raises:
+            ValueError: On unknown fields or filters.
+        """
+        fields = list(fields or LEAD_FIELDS)
+        unknown = [f for f in fields if f not in LEAD_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown lead fields: {', '.join(unknown)}.")
+        if "id" not in fields:
+            fields.insert(0, "id")
+        filters = {k: v for k, v in (filters or {}).items() if v is not None}
+        unknown = [f for f in filters if f not in LEAD_FILTERS]
+        if unknown:
+            raise ValueError(f"Unknown lead filters: {', '.join(unknown)}.")
+        limit = max(1, min(int(limit), LEADS_MAX_PAGE_SIZE))
+
+        conn = self._conn()
+        # Version and rows are read in one snapshot, so a page is never cached or tagged
+        # under a version it does not match.
+        conn.execute("BEGIN")
+        try:
+            version, modified_at = self.version()
+            key = json.dumps([version, cursor, limit, fields, sorted(filters.items()), created_after, created_before])
+            with self._pages_lock:
+                cached = self._pages.get(key)
+                if cached is not None:
+                    self._pages.move_to_end(key)
+            record_cache("leads", cached is not None)
+            if cached is not None:
+                return cached
+
+            clauses, params = [], []
+            for column, value in sorted(filters.items()):
+                clauses.append(f"{column} = ?")
+                params.append(value)
+            if cursor is not None:
+                clauses.append("id > ?")
+                params.append(int(cursor))
+            if created_after is not None:
+                clauses.append("created_at >= ?")
+                params.append(created_after)
+            if created_before is not None:
+                clauses.append("created_at < ?")
+                params.append(created_before)
+            where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+            # One extra row tells whether another page follows without a COUNT.
+            rows = conn.execute(
+                f"SELECT {', '.join(fields)} FROM leads{where} ORDER BY id LIMIT ?", (*params, limit + 1)
+            ).fetchall()
+        finally:
+            conn.execute("COMMIT")
+        leads = [dict(row) for row in rows[:limit]]
+        result = {
+            "leads": leads, "next_cursor": leads[-1]["id"] if len(rows) > limit else None,
+            "version": version, "modified_at": modified_at,
+        }
+
+        if self.cache_size:
+            with self._pages_lock:
+                self._pages[key] = result
+                while len(self._pages) > self.cache_size:
+                    self._pages.popitem(last=False)
+        return result
+
+
+def leads_etag(version, query):
+    """
+    Weak ETag for one representation of the leads at a store version.
+
+    Args:
+        version (int): Store version.
+        query (dict): The normalized page parameters.
+    """
+    digest = hashlib.sha1(json.dumps(query, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    return f'W/"{version}-{digest}"'
+
+
+def http_date(timestamp):
+    return formatdate(timestamp, usegmt=True)
+
+
+def not_modified(if_none_match, if_modified_since, etag, modified_at):
+    """
+    Evaluates conditional request headers (RFC 7232): If-None-Match wins when present,
+    otherwise If-Modified-Since is compared at one-second resolution.
+
+    Returns:
+        bool: True if a 304 Not Modified should be sent.
+    """
+    if if_none_match:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        # Weak comparison: the W/ prefix is ignored.
+        return "*" in tags or etag.removeprefix("W/") in [t.removeprefix("W/") for t in tags]
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(modified_at) <= since
+    return False
@@ -0,0 +1,292 @@
+import os
+import json
+import shutil
+import sqlite3
+import threading
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from ingestion import MANIFEST_FILENAME, file_sha256, ingest_lock
+
+QUANTIZED_DIRNAME = "quantized"
+VECTOR_BACKEND = os.environ.get("RAG_VECTOR_BACKEND", "chroma")
+QUANTIZED_RERANK = os.environ.get("RAG_QUANTIZED_RERANK", "1") == "1"
+QUANTIZED_RERANK_K = int(os.environ.get("RAG_QUANTIZED_RERANK_K", "64"))
+QUANTIZED_BLOCK_ROWS = int(os.environ.get("RAG_QUANTIZED_BLOCK_ROWS", "4096"))
+
+# On-disk layout of <persist_directory>/quantized/:
+#   codes.npy      n x d int8 codes, memory-mapped read-only
+#   scales.npy     n float32 per-vector dequantization scales
+#   vectors.npy    n x d float32 normalized vectors, only read for re-ranking the top candidates
+#   docs.sqlite3   chunk ids, text and metadata by row
+#   meta.json      shape, model and the version of the Chroma store it was built from
+# The files are only ever replaced as a whole directory, so the OS page cache holds a single
+# copy that every worker process maps instead of each loading its own HNSW index.
+
+
+def quantize(vectors):
+    """
+    Symmetric per-vector int8 quantization of L2-normalized vectors.
+
+    Returns:
+        tuple: (codes, scales, normalized) with normalized ~= codes * scales[:, None].
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1.0, norms)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32), vectors
+
+
+def index_version(vectorstore, persist_directory):
+    """
+    Identifies the Chroma store contents an index was built from: the chunk count and the
+    ingestion manifest hash, which changes whenever ingestion adds or removes chunks.
+    """
+    manifest = os.path.join(persist_directory, MANIFEST_FILENAME)
+    return {
+        "count": vectorstore._collection.count(),
+        "manifest": file_sha256(manifest) if os.path.exists(manifest) else None,
+    }
+
+
+def _model_name(embeddings):
+    return getattr(embeddings, "model", None) or type(embeddings).__name__
+
+
+def build_quantized_index(vectorstore, persist_directory, page_size=2000):
+    """
+    Exports the Chroma collection into a quantized, memory-mappable index directory.
+
+    Vectors are streamed out of Chroma page by page and the new directory is swapped in
+    atomically, so workers with the old files mapped keep serving until they reload.
+
+    Args:
+        vectorstore: The Chroma store holding chunk embeddings.
+        persist_directory (str): Directory of the Chroma store; the index goes in its "quantized" subdirectory.
+        page_size (int, optional): Chunks read from Chroma at a time.
+
+    Returns:
+        dict: The index metadata.
+    """
+    target = os.path.join(persist_directory, QUANTIZED_DIRNAME)
+    staging = f"{target}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    version = index_version(vectorstore, persist_directory)
+    ids = vectorstore.get(include=[]).get("ids", [])
+    count = len(ids)
+    dimensions = None
+    codes = scales = floats = None
+    conn = sqlite3.connect(os.path.join(staging, "docs.sqlite3"))
+    conn.execute("CREATE TABLE docs (row INTEGER PRIMARY KEY, id TEXT NOT NULL, content TEXT NOT NULL, metadata TEXT NOT NULL)")
+    try:
+        row = 0
+        for start in range(0, count, page_size):
+            page = vectorstore.get(ids=ids[start:start + page_size], include=["embeddings", "documents", "metadatas"])
+            if not len(page["ids"]):
+                continue
+            page_codes, page_scales, page_floats = quantize(page["embeddings"])
+            if dimensions is None:
+                dimensions = page_codes.shape[1]
+                codes = np.lib.format.open_memmap(os.path.join(staging, "codes.npy"), mode="w+", dtype=np.int8, shape=(count, dimensions))
+                scales = np.lib.format.open_memmap(os.path.join(staging, "scales.npy"), mode="w+", dtype=np.float32, shape=(count,))
+                floats = np.lib.format.open_memmap(os.path.join(staging, "vectors.npy"), mode="w+", dtype=np.float32, shape=(count, dimensions))
+            end = row + len(page_codes)
+            codes[row:end] = page_codes
+            scales[row:end] = page_scales
+            floats[row:end] = page_floats
+            conn.executemany(
+                "INSERT INTO docs (row, id, content, metadata) VALUES (?, ?, ?, ?)",
+                [(row + i, doc_id, text or "", json.dumps(metadata or {}))
+                 for i, (doc_id, text, metadata) in enumerate(zip(page["ids"], page["documents"], page["metadatas"]))],
+            )
+            row = end
+        conn.commit()
+    finally:
+        conn.close()
+    for array in (codes, scales, floats):
+        if array is not None:
+            array.flush()
+
+    meta = {
+        "rows": row,
+        "dimensions": dimensions,
+        "model": _model_name(vectorstore.embeddings),
+        "source": version,
+    }
+    with open(os.path.join(staging, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    retired = f"{target}.old-{os.getpid()}"
+    if os.path.exists(target):
+        os.replace(target, retired)
+    os.replace(staging, target)
+    shutil.rmtree(retired, ignore_errors=True)
+    print(f"Quantized index built: {row} vectors x {dimensions} dims at {target}")
+    return meta
+
+
+def load_index_meta(persist_directory):
+    path = os.path.join(persist_directory, QUANTIZED_DIRNAME, "meta.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class QuantizedVectorStore(VectorStore):
+    def __init__(self, index_directory, embeddings, rerank=QUANTIZED_RERANK, rerank_k=QUANTIZED_RERANK_K,
+                 block_rows=QUANTIZED_BLOCK_ROWS):
+        """
+        Read-only vector store over an int8 index built by build_quantized_index.
+
+        Codes are memory-mapped read-only, so every process serving the same index shares
+        one copy in the page cache. Candidates are scored against the int8 codes in blocks
+        and the best rerank_k are optionally re-scored exactly against the float32 vectors,
+        of which only those rows are read.
+
+        Args:
+            index_directory (str): The quantized index directory.
+            embeddings: Embeddings used for queries; must match the model the index was built with.
+            rerank (bool, optional): Re-rank the top candidates with exact float32 similarity.
+            rerank_k (int, optional): Candidates kept for re-ranking.
+            block_rows (int, optional): Rows dequantized at a time while scanning.
+        """
+        self.index_directory = index_directory
+        self._embeddings = embeddings
+        self.rerank = rerank
+        self.rerank_k = rerank_k
+        self.block_rows = block_rows
+        with open(os.path.join(index_directory, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.rows = self.meta["rows"]
+        if self.rows:
+            self._codes = np.load(os.path.join(index_directory, "codes.npy"), mmap_mode="r")
+            self._scales = np.load(os.path.join(index_directory, "scales.npy"), mmap_mode="r")
+            floats_path = os.path.join(index_directory, "vectors.npy")
+            self._floats = np.load(floats_path, mmap_mode="r") if rerank and os.path.exists(floats_path) else None
+        self._local = threading.local()
+
+    @property
+    def embeddings(self):
+        return self._embeddings
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            path = os.path.join(self.index_directory, "docs.sqlite3")
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            self._local.conn = conn
+        return conn
+
+    def _documents(self, rows):
+        """
+        Returns:
+            dict: Document by row, for the rows that exist in the sidecar.
+        """
+        placeholders = ",".join("?" * len(rows))
+        return {
+            row: Document(page_content=content, metadata=json.loads(metadata), id=doc_id)
+            for row, doc_id, content, metadata in self._conn().execute(
+                f"SELECT row, id, content, metadata FROM docs WHERE row IN ({placeholders})", [int(r) for r in rows]
+            )
+        }
+
+    def _search(self, query_vector, k):
+        if not self.rows:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        keep = max(k, self.rerank_k if self._floats is not None else k)
+
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, self.rows, self.block_rows):
+            end = min(start + self.block_rows, self.rows)
+            scores = (self._codes[start:end].astype(np.float32) @ query) * self._scales[start:end]
+            if len(scores) > keep:
+                top = np.argpartition(scores, -keep)[-keep:]
+                scores = scores[top]
+                rows = top + start
+            else:
+                rows = np.arange(start, end)
+            best_rows = np.concatenate([best_rows, rows])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_scores) > keep:
+                top = np.argpartition(best_scores, -keep)[-keep:]
+                best_rows, best_scores = best_rows[top], best_scores[top]
+
+        if self._floats is not None:
+            # Reading rows in file order keeps the page faults on the float file sequential.
+            order = np.sort(best_rows)
+            best_rows = order
+            best_scores = np.asarray(self._floats[order] @ query, dtype=np.float32)
+        ranked = np.argsort(-best_scores)[:k]
+        return [(int(best_rows[i]), float(best_scores[i])) for i in ranked]
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4):
+        """
+        Returns:
+            list: (Document, cosine similarity) tuples, best first.
+        """
+        hits = self._search(embedding, k)
+        if not hits:
+            return []
+        by_row = self._documents([row for row, _ in hits])
+        return [(by_row[row], score) for row, score in hits if row in by_row]
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_by_vector_with_score(self._embeddings.embed_query(query), k)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are already cosine similarities.
+        return lambda score: score
+
+    def add_texts(self, texts, metadatas=None, **kwargs):
+        raise NotImplementedError("QuantizedVectorStore is read-only; ingest into Chroma and rebuild the index.")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Build the index from a Chroma store with build_quantized_index.")
+
+
+def open_quantized_store(vectorstore, persist_directory, embeddings, rebuild=True):
+    """
+    Opens the quantized index for a Chroma store, rebuilding it first when it is missing,
+    was built for another embedding model, or is older than the store's contents.
+
+    Args:
+        rebuild (bool, optional): False for read-only processes, which serve an existing
+            index as-is (falling back to Chroma if there is none) and leave rebuilding to
+            the ingesting process.
+    """
+    def stale():
+        meta = load_index_meta(persist_directory)
+        return (meta is None or meta.get("model") != _model_name(embeddings)
+                or meta.get("source") != index_version(vectorstore, persist_directory))
+
+    if stale():
+        if not rebuild:
+            if load_index_meta(persist_directory) is None:
+                print("No quantized index and the store is read-only; searching Chroma instead.")
+                return vectorstore
+            print("Quantized index is stale and the store is read-only; serving it until it is rebuilt.")
+        else:
+            with ingest_lock(persist_directory):
+                # Another process may have rebuilt it while we waited for the lock.
+                if stale():
+                    print("Quantized index missing or stale; rebuilding from the Chroma store...")
+                    build_quantized_index(vectorstore, persist_directory)
+    return QuantizedVectorStore(os.path.join(persist_directory, QUANTIZED_DIRNAME), embeddings)
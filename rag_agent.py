@@ -1,30 +1,230 @@
 import os
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import asyncio
+import functools
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from langchain_community.vectorstores import Chroma
 from langchain_community.embeddings import OpenAIEmbeddings
 from langchain_community.chat_models import ChatOpenAI
 from langchain.agents import AgentExecutor, create_openai_functions_agent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain.tools.retriever import create_retriever_tool
+from ingestion import sync_documents
+from embedding_cache import CachedEmbeddings, EMBED_CACHE_FILENAME
+from answer_cache import AnswerCache, normalize_query
+from retrieval import build_retriever, RETRIEVAL_MODE, RERANK_ENABLED
+from quantized_store import open_quantized_store, VECTOR_BACKEND
+from context_compression import compress_retriever, CONTEXT_TOKEN_BUDGET
+from singleflight import SingleFlight, AsyncSingleFlight
+from metrics import QUERY_SECONDS, record_cache, stage_timer
+from tracing import QueryTrace
 
 # ... (imports remain the same)
 
+# Files whose modification indicates the persisted vector store contents changed.
+STORE_FINGERPRINT_FILES = ("chroma.sqlite3", "chroma.sqlite3-wal")
+
+
+def store_fingerprint(persist_directory):
+    """
+    Returns a cheap fingerprint of the persisted vector store, used to detect changes on disk.
+
+    Args:
+        persist_directory (str): Directory holding the vector store.
+
+    Returns:
+        tuple: (filename, mtime_ns, size) for each tracked file that exists.
+    """
+    fingerprint = []
+    for name in STORE_FINGERPRINT_FILES:
+        path = os.path.join(persist_directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        fingerprint.append((name, stat.st_mtime_ns, stat.st_size))
+    return tuple(fingerprint)
+
+
+# Open store handles per Chroma system identifier (the persist path). Handles on the same
+# path share one system, which is only stopped when the last of them is closed.
+_open_stores = {}
+_open_stores_lock = threading.Lock()
+
+
+def create_embeddings(persist_directory):
+    """
+    Creates the embeddings client used for both ingestion and retrieval,
+    backed by a persistent cache stored beside the vector store.
+    """
+    cache_path = os.path.join(persist_directory, EMBED_CACHE_FILENAME)
+    return CachedEmbeddings(OpenAIEmbeddings(), cache_path)
+
+
+def open_vectorstore(persist_directory, embeddings):
+    """
+    Opens (or creates) the persisted Chroma vector store. Pair with close_vectorstore.
+    """
+    vectorstore = Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+    identifier = getattr(getattr(vectorstore, "_client", None), "_identifier", None)
+    if identifier is not None:
+        with _open_stores_lock:
+            _open_stores[identifier] = _open_stores.get(identifier, 0) + 1
+    return vectorstore
+
+
+def ingest_store(pdf_path, persist_directory, embeddings=None, vector_backend=VECTOR_BACKEND):
+    """
+    Brings a vector store and the indexes derived from it up to date with the documents.
+    This is the write path used before read-only workers start and for explicit re-ingestion.
+
+    Returns:
+        dict: Ingestion statistics from sync_documents.
+    """
+    embeddings = embeddings or create_embeddings(persist_directory)
+    vectorstore = open_vectorstore(persist_directory, embeddings)
+    try:
+        stats = sync_documents(vectorstore, pdf_path, persist_directory)
+        if vector_backend == "quantized":
+            open_quantized_store(vectorstore, persist_directory, embeddings)
+    finally:
+        close_vectorstore(vectorstore)
+    return stats
+
+
+def close_vectorstore(vectorstore):
+    """
+    Best-effort release of a Chroma store's SQLite connections and loaded HNSW segments.
+
+    Chroma caches one client system per persist directory for the whole process, so dropping
+    the LangChain wrapper alone would keep the index resident. The system is only stopped
+    once no other handle opened with open_vectorstore still uses that directory.
+    """
+    client = getattr(vectorstore, "_client", None)
+    identifier = getattr(client, "_identifier", None)
+    systems = getattr(type(client), "_identifer_to_system", None) or getattr(type(client), "_identifier_to_system", None)
+    if identifier is None or systems is None:
+        return
+    with _open_stores_lock:
+        remaining = _open_stores.get(identifier, 0) - 1
+        if remaining > 0:
+            _open_stores[identifier] = remaining
+            return
+        _open_stores.pop(identifier, None)
+        system = systems.pop(identifier, None)
+    if system is not None:
+        try:
+            system.stop()
+        except Exception as e:
+            print(f"Failed to stop Chroma system for {identifier}: {e}")
+
+
+def tool_set_key(tools):
+    """
+    Builds a hashable key identifying a set of tools by name, independent of order.
+    """
+    return tuple(sorted(getattr(t, "name", repr(t)) for t in (tools or [])))
+
+
+COALESCE_QUERIES = os.environ.get("RAG_COALESCE_QUERIES", "1") == "1"
+# Set for multi-worker deployments: ingestion runs once before the workers start, and the
+# workers only read the vector store.
+READ_ONLY_STORE = os.environ.get("RAG_READ_ONLY", "0") == "1"
+
+# Bounded pool used to run sync-only tools from the async query path,
+# so blocking tool calls never run on the event loop thread.
+SYNC_TOOL_WORKERS = int(os.environ.get("RAG_SYNC_TOOL_WORKERS", "8"))
+_sync_tool_executor = None
+_sync_tool_executor_lock = threading.Lock()
+
+
+def get_sync_tool_executor():
+    global _sync_tool_executor
+    with _sync_tool_executor_lock:
+        if _sync_tool_executor is None:
+            _sync_tool_executor = ThreadPoolExecutor(
+                max_workers=SYNC_TOOL_WORKERS, thread_name_prefix="rag-sync-tool"
+            )
+        return _sync_tool_executor
+
+
+def with_bounded_async(tool):
+    """
+    Returns a copy of a sync-only tool whose async path runs on the bounded sync tool pool.
+    Tools that already provide a coroutine are returned unchanged.
+
+    Args:
+        tool: A LangChain tool.
+
+    Returns:
+        A LangChain tool safe to await from the event loop.
+    """
+    func = getattr(tool, "func", None)
+    if getattr(tool, "coroutine", None) is not None or func is None:
+        return tool
+
+    async def _coroutine(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # Run in a copy of the caller's context so the request's trace sees stages timed in the tool.
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            get_sync_tool_executor(), context.run, functools.partial(func, *args, **kwargs)
+        )
+
+    if hasattr(tool, "model_copy"):
+        return tool.model_copy(update={"coroutine": _coroutine})
+    return tool.copy(update={"coroutine": _coroutine})
+
+
 class RAGAgent:
-    def __init__(self, pdf_path, tools=None, persist_directory="./chroma_db"):
+    def __init__(self, pdf_path, tools=None, persist_directory="./chroma_db", answer_cache=False,
+                 retrieval_mode=RETRIEVAL_MODE, embeddings=None, llm=None, vector_backend=VECTOR_BACKEND,
+                 context_token_budget=CONTEXT_TOKEN_BUDGET, coalesce=COALESCE_QUERIES, read_only=READ_ONLY_STORE,
+                 rerank=RERANK_ENABLED):
         """
         Initializes the RAG Agent by loading the PDF, creating embeddings, and building the vector store.
         It then sets up an agent capable of using the provided tools plus a PDF retriever tool.
         
         Args:
-            pdf_path (str): Path to the PDF file.
+            pdf_path (str): Path to the PDF file, or a directory of PDFs to ingest incrementally.
             tools (list, optional): List of additional tools (LangChain Tool objects) the agent can use.
             persist_directory (str, optional): Directory to save/load the vector store. Defaults to "./chroma_db".
+            answer_cache (bool, optional): Cache final answers (exact match, plus semantic match if
+                RAG_ANSWER_CACHE_SEMANTIC is set). Defaults to False.
+            retrieval_mode (str, optional): "hybrid" (BM25 + dense) or "dense". Defaults to RAG_RETRIEVAL_MODE.
+            embeddings (optional): Embeddings to use instead of cached OpenAI embeddings (e.g. offline benchmarks).
+            llm (optional): Chat model to use instead of gpt-3.5-turbo.
+            vector_backend (str, optional): "chroma", or "quantized" to search a memory-mapped int8 index
+                exported from the Chroma store. Defaults to RAG_VECTOR_BACKEND.
+            context_token_budget (int, optional): Token budget for the compressed context the retriever tool
+                returns; 0 returns full chunks. Defaults to RAG_CONTEXT_TOKEN_BUDGET.
+            coalesce (bool, optional): Concurrent identical queries (after normalization) share one agent
+                execution. Defaults to RAG_COALESCE_QUERIES.
+            read_only (bool, optional): Open the existing vector store without ingesting `pdf_path` or
+                rebuilding derived indexes; the BM25 index is opened read-only. The embedding cache stays
+                writable (SQLite WAL), so query embeddings are still cached. Defaults to RAG_READ_ONLY.
+            rerank (bool, optional): Re-rank over-fetched candidates locally and return an adaptive number
+                of chunks instead of a fixed top-k. Defaults to RAG_RERANK.
         """
         self.pdf_path = pdf_path
         self.tools = tools or []
         self.persist_directory = persist_directory
         self.agent_executor = None
+        self.vectorstore = None
+        self.embeddings = embeddings
+        self.llm = llm
+        self.answer_cache = None
+        self.enable_answer_cache = answer_cache
+        self.retrieval_mode = retrieval_mode
+        self.vector_backend = vector_backend
+        self.context_token_budget = context_token_budget
+        # Agents are per collection and tool set, so in-flight calls are scoped by both.
+        self.coalesce = coalesce
+        self.read_only = read_only
+        self.rerank = rerank
+        self._inflight = SingleFlight()
+        self._ainflight = AsyncSingleFlight()
         
         if not os.path.exists(pdf_path) and (not os.path.exists(persist_directory) or not os.listdir(persist_directory)):
              # Only error if PDF is missing AND DB is missing/empty
@@ -36,48 +236,42 @@ class RAGAgent:
     def _initialize_agent(self):
         # Note: Requires OPENAI_API_KEY environment variable to be set.
         print("Creating embeddings...")
-        embeddings = OpenAIEmbeddings()
-        
-        vectorstore = None
-        
-        # Check if persistent DB exists and is not empty
-        if os.path.exists(self.persist_directory) and os.listdir(self.persist_directory):
-            print(f"Loading existing vectorstore from {self.persist_directory}...")
-            vectorstore = Chroma(persist_directory=self.persist_directory, embedding_function=embeddings)
-        else:
-            print(f"Loading {self.pdf_path}...")
-            if not os.path.exists(self.pdf_path):
-                 raise FileNotFoundError(f"PDF not found at {self.pdf_path} and no DB exists.")
-                 
-            loader = PyPDFLoader(self.pdf_path)
-            documents = loader.load()
-            
-            print("Splitting text...")
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200
-            )
-            texts = text_splitter.split_documents(documents)
-            
-            print(f"Creating and persisting vectorstore to {self.persist_directory}...")
-            vectorstore = Chroma.from_documents(documents=texts, embedding=embeddings, persist_directory=self.persist_directory)
-            # Chroma automatically persists on write usually, but older versions might need .persist()
-            # Modern langchain-chroma / chromadb handles it. 
+        embeddings = self.embeddings or create_embeddings(self.persist_directory)
+        self.embeddings = embeddings
         
-        # Create a retriever tool
+        if not os.path.exists(self.pdf_path) and (not os.path.exists(self.persist_directory) or not os.listdir(self.persist_directory)):
+            raise FileNotFoundError(f"PDF not found at {self.pdf_path} and no DB exists.")
+        if self.read_only and not os.path.exists(os.path.join(self.persist_directory, "chroma.sqlite3")):
+            # Opening Chroma would create an empty store; read-only workers must find one ingested.
+            raise FileNotFoundError(f"No vector store at {self.persist_directory}; run ingestion before starting read-only workers.")
+        
+        print(f"Opening vectorstore at {self.persist_directory}...")
+        vectorstore = open_vectorstore(self.persist_directory, embeddings)
+        self.vectorstore = vectorstore
+        
+        if not self.read_only and os.path.exists(self.pdf_path):
+            # Incremental: only new or changed PDFs are parsed and only new chunks are embedded.
+            sync_documents(vectorstore, self.pdf_path, self.persist_directory)
+        
+        search_store = vectorstore
+        if self.vector_backend == "quantized":
+            # Chroma stays the write path for ingestion; queries never load its HNSW index.
+            search_store = open_quantized_store(vectorstore, self.persist_directory, embeddings, rebuild=not self.read_only)
         
         # Create a retriever tool
+        retriever = build_retriever(search_store, self.persist_directory, mode=self.retrieval_mode, rerank=self.rerank,
+                                    read_only=self.read_only)
         retriever_tool = create_retriever_tool(
-            vectorstore.as_retriever(),
+            compress_retriever(retriever, self.context_token_budget),
             "pdf_retriever",
             "Searches and returns documents regarding the content of the PDF file."
         )
         
-        # Combine tools
-        all_tools = [retriever_tool] + self.tools
+        # Combine tools; sync-only tools get a bounded thread pool fallback for arun_query
+        all_tools = [retriever_tool] + [with_bounded_async(t) for t in self.tools]
         
         print("Initializing Agent...")
-        llm = ChatOpenAI(temperature=0, model_name="gpt-3.5-turbo")
+        llm = self.llm or ChatOpenAI(temperature=0, model_name="gpt-3.5-turbo")
         
         # Create prompt
         prompt = ChatPromptTemplate.from_messages([
@@ -89,6 +283,27 @@ class RAGAgent:
         # Initialize the agent
         agent = create_openai_functions_agent(llm, all_tools, prompt)
         self.agent_executor = AgentExecutor(agent=agent, tools=all_tools, verbose=True)
+        
+        if self.enable_answer_cache:
+            self.answer_cache = AnswerCache(embeddings)
+
+    def close(self):
+        """
+        Releases the agent's vector store. The agent cannot answer queries afterwards.
+        """
+        self.agent_executor = None
+        if self.vectorstore is not None:
+            close_vectorstore(self.vectorstore)
+            self.vectorstore = None
+
+    def _cache_scope(self):
+        # Cached answers are only valid for the store contents and tools they were produced with.
+        return (store_fingerprint(self.persist_directory), tool_set_key(self.tools))
+
+    def _with_timings(self, trace, metadata):
+        metadata["timings"] = trace.summary()
+        QUERY_SECONDS.observe(metadata["timings"]["total_seconds"], cache=metadata["cache"])
+        return metadata
 
     def run_query(self, query):
         """
@@ -100,12 +315,252 @@ class RAGAgent:
         Returns:
             str: The answer from the agent.
         """
+        answer, _ = self.run_query_with_metadata(query)
+        return answer
+
+    def run_query_with_metadata(self, query):
+        """
+        Same as run_query, but also returns metadata about how the answer was produced.
+        
+        Args:
+            query (str): The question to ask.
+            
+        Returns:
+            tuple: (answer, metadata) where metadata["cache"] is "exact", "semantic", "miss" or "disabled",
+            metadata["timings"] is the per-stage breakdown of the execution and metadata["coalesced"]
+            is True when the answer came from an identical query already in flight.
+        """
+        if not self.coalesce:
+            return self._run_query_with_metadata(query)
+        (answer, metadata), coalesced = self._inflight.do(
+            normalize_query(query), lambda: self._run_query_with_metadata(query)
+        )
+        return answer, dict(metadata, coalesced=coalesced)
+
+    def _run_query_with_metadata(self, query):
+        if not self.agent_executor:
+            return "Agent not initialized successfully (check PDF path or API keys).", {"cache": "disabled"}
+        
+        with QueryTrace() as trace:
+            lookup = None
+            if self.answer_cache is not None:
+                scope = self._cache_scope()
+                with stage_timer("answer_cache_lookup"):
+                    lookup = self.answer_cache.lookup(query, scope)
+                record_cache("answer", lookup["answer"] is not None)
+                if lookup["answer"] is not None:
+                    print(f"Answer cache {lookup['cache']} hit: {query}")
+                    return lookup["answer"], self._with_timings(trace, {"cache": lookup["cache"], "similarity": lookup["similarity"]})
+            
+            print(f"Querying: {query}")
+            response = self.agent_executor.invoke({"input": query}, config={"callbacks": [trace]})
+            answer = response["output"]
+            if lookup is not None:
+                self.answer_cache.store(query, answer, scope, vector=lookup["vector"])
+                return answer, self._with_timings(trace, {"cache": "miss"})
+            return answer, self._with_timings(trace, {"cache": "disabled"})
+
+    async def arun_query(self, query):
+        """
+        Async variant of run_query that does not block the event loop.
+        Uses the executor's ainvoke and the retriever's async path; sync-only tools
+        run on a bounded thread pool.
+        
+        Args:
+            query (str): The question to ask.
+            
+        Returns:
+            str: The answer from the agent.
+        """
+        answer, _ = await self.arun_query_with_metadata(query)
+        return answer
+
+    async def arun_query_with_metadata(self, query):
+        """
+        Async variant of run_query_with_metadata. A caller that is cancelled while joined to
+        a shared execution leaves it running for the other callers.
+        """
+        if not self.coalesce:
+            return await self._arun_query_with_metadata(query)
+        (answer, metadata), coalesced = await self._ainflight.do(
+            normalize_query(query), lambda: self._arun_query_with_metadata(query)
+        )
+        return answer, dict(metadata, coalesced=coalesced)
+
+    async def _arun_query_with_metadata(self, query):
+        if not self.agent_executor:
+            return "Agent not initialized successfully (check PDF path or API keys).", {"cache": "disabled"}
+        
+        with QueryTrace() as trace:
+            lookup = None
+            if self.answer_cache is not None:
+                scope = self._cache_scope()
+                with stage_timer("answer_cache_lookup"):
+                    lookup = await self.answer_cache.alookup(query, scope)
+                record_cache("answer", lookup["answer"] is not None)
+                if lookup["answer"] is not None:
+                    print(f"Answer cache {lookup['cache']} hit: {query}")
+                    return lookup["answer"], self._with_timings(trace, {"cache": lookup["cache"], "similarity": lookup["similarity"]})
+            
+            print(f"Querying (async): {query}")
+            response = await self.agent_executor.ainvoke({"input": query}, config={"callbacks": [trace]})
+            answer = response["output"]
+            if lookup is not None:
+                self.answer_cache.store(query, answer, scope, vector=lookup["vector"])
+                return answer, self._with_timings(trace, {"cache": "miss"})
+            return answer, self._with_timings(trace, {"cache": "disabled"})
+
+    def _batch_plan(self, queries):
+        # Identical queries (after normalization) are answered once.
+        unique = {}
+        for query in queries:
+            unique.setdefault(normalize_query(query), query)
+        return unique
+
+    def _prime_texts(self, unique):
+        # Texts the per-query path will embed: the normalized key for the semantic answer cache,
+        # otherwise the raw query the retriever is most likely to search for.
+        if not isinstance(self.embeddings, CachedEmbeddings):
+            return []
+        if self.answer_cache is not None and self.answer_cache.semantic:
+            return list(unique)
+        return list(unique.values())
+
+    def _batch_results(self, queries, outcomes):
+        results = []
+        seen = set()
+        for query in queries:
+            key = normalize_query(query)
+            answer, metadata, error = outcomes[key]
+            item = {"query": query, "answer": answer, "metadata": dict(metadata or {}), "error": error}
+            if key in seen:
+                item["metadata"]["deduplicated"] = True
+            seen.add(key)
+            results.append(item)
+        return results
+
+    def run_batch(self, queries, max_concurrency=4):
+        """
+        Answers many queries concurrently.
+        Identical queries are run once, all query embeddings are computed in a single
+        embedding call up front, and a failing query does not fail the batch.
+        
+        Args:
+            queries (list): The questions to ask.
+            max_concurrency (int, optional): Maximum agent executions in flight. Defaults to 4.
+            
+        Returns:
+            list: One dict per input query with "query", "answer", "metadata" and "error".
+        """
+        unique = self._batch_plan(queries)
+        prime = self._prime_texts(unique)
+        if prime:
+            self.embeddings.embed_documents(prime)
+        
+        outcomes = {}
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="rag-batch") as executor:
+            futures = {key: executor.submit(self.run_query_with_metadata, query) for key, query in unique.items()}
+            for key, future in futures.items():
+                try:
+                    answer, metadata = future.result()
+                    outcomes[key] = (answer, metadata, None)
+                except Exception as e:
+                    outcomes[key] = (None, None, str(e))
+        return self._batch_results(queries, outcomes)
+
+    async def arun_batch(self, queries, max_concurrency=4):
+        """
+        Async variant of run_batch.
+        """
+        unique = self._batch_plan(queries)
+        prime = self._prime_texts(unique)
+        if prime:
+            await self.embeddings.aembed_documents(prime)
+        
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        
+        async def _run(query):
+            async with semaphore:
+                try:
+                    answer, metadata = await self.arun_query_with_metadata(query)
+                    return answer, metadata, None
+                except Exception as e:
+                    return None, None, str(e)
+        
+        answers = await asyncio.gather(*(_run(query) for query in unique.values()))
+        outcomes = dict(zip(unique.keys(), answers))
+        return self._batch_results(queries, outcomes)
+
+    async def astream_query(self, query):
+        """
+        Streams the agent run for a query as it happens.
+        Built on the executor's astream_events; closing the generator early (e.g. when
+        the client disconnects) cancels the underlying run so no further LLM tokens are spent.
+        
+        Args:
+            query (str): The question to ask.
+            
+        Yields:
+            dict: Events with an "event" key: "tool_start", "tool_end", "retrieval",
+            "token" (final-answer text as it is generated) and finally "final".
+        """
         if not self.agent_executor:
-            return "Agent not initialized successfully (check PDF path or API keys)."
+            yield {"event": "final", "answer": "Agent not initialized successfully (check PDF path or API keys).",
+                   "metadata": {"cache": "disabled"}}
+            return
+        
+        # The trace is passed as a callback only: a context variable set inside an async
+        # generator cannot be reliably reset across the consumer's iterations.
+        trace = QueryTrace()
+        lookup = None
+        if self.answer_cache is not None:
+            scope = self._cache_scope()
+            with stage_timer("answer_cache_lookup", trace=trace):
+                lookup = await self.answer_cache.alookup(query, scope)
+            record_cache("answer", lookup["answer"] is not None)
+            if lookup["answer"] is not None:
+                metadata = self._with_timings(trace, {"cache": lookup["cache"], "similarity": lookup["similarity"]})
+                yield {"event": "final", "answer": lookup["answer"], "metadata": metadata}
+                return
+        
+        print(f"Streaming query: {query}")
+        answer = None
+        stream = self.agent_executor.astream_events({"input": query}, config={"callbacks": [trace]}, version="v2")
+        # Retrievers nested inside another retriever (context compression) are not separate searches.
+        retriever_runs = set()
+        try:
+            async for event in stream:
+                kind = event["event"]
+                data = event.get("data", {})
+                nested = bool(retriever_runs.intersection(event.get("parent_ids") or ()))
+                if kind == "on_retriever_start":
+                    retriever_runs.add(event["run_id"])
+                if kind == "on_tool_start":
+                    yield {"event": "tool_start", "tool": event["name"], "input": data.get("input")}
+                elif kind == "on_tool_end":
+                    yield {"event": "tool_end", "tool": event["name"]}
+                elif kind == "on_retriever_end" and not nested:
+                    documents = data.get("output") or []
+                    yield {"event": "retrieval", "documents": [
+                        {"source": d.metadata.get("source"), "page": d.metadata.get("page")} for d in documents
+                    ]}
+                elif kind == "on_chat_model_stream":
+                    # Function-call steps stream empty content; only answer text is forwarded.
+                    content = getattr(data.get("chunk"), "content", "")
+                    if content:
+                        yield {"event": "token", "text": content}
+                elif kind == "on_chain_end" and not event.get("parent_ids"):
+                    output = data.get("output")
+                    if isinstance(output, dict):
+                        answer = output.get("output")
+        finally:
+            await stream.aclose()
         
-        print(f"Querying: {query}")
-        response = self.agent_executor.invoke({"input": query})
-        return response["output"]
+        metadata = {"cache": "disabled"}
+        if lookup is not None and answer is not None:
+            self.answer_cache.store(query, answer, scope, vector=lookup["vector"])
+            metadata = {"cache": "miss"}
+        yield {"event": "final", "answer": answer, "metadata": self._with_timings(trace, metadata)}
 
 if __name__ == "__main__":
     # Example usage
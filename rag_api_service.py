@@ -1,79 +1,54 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, UploadFile, File, status
 from fastapi.security import OAuth2PasswordBearer
+from fastapi.responses import StreamingResponse, JSONResponse, Response
 from contextlib import asynccontextmanager
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from passlib.context import CryptContext
-import uvicorn
+import asyncio
 import os
+import json
+import shutil
+import multiprocessing
+import time
+import threading
 import jwt
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from rag_agent import RAGAgent
-from langchain.tools import tool
-from googleapiclient.discovery import build
-import google.auth
+from resilience import breaker_states
+from metrics import REGISTRY, PROMETHEUS_CONTENT_TYPE, HTTP_REQUEST_SECONDS
+from collections_registry import DEFAULT_COLLECTION, UnknownCollectionError, validate_collection_name
+from job_queue import JobStore, JobManager, JOB_KINDS, JOB_MAX_TIMEOUT, FINISHED_STATUSES
+from admission import AdmissionController, AdmissionRejected
+from leads_store import LeadsStore, LEADS_PAGE_SIZE, leads_etag, http_date, not_modified
 
-# Placeholder for Google Sheets API setup
-# In a real scenario, you would handle auth here (e.g., service account or OAuth)
-
-@tool
-def read_google_sheet_data(spreadsheet_id: str, range_name: str):
-    """
-    Reads data from a Google Sheet.
-    
-    Args:
-        spreadsheet_id (str): The ID of the spreadsheet.
-        range_name (str): The range to read, e.g., 'Sheet1!A1:B10'.
-        
-    Returns:
-        list: A list of lists containing the cell values.
-    """
-    try:
-        # This will attempt to find default credentials. 
-        # Ensure you have set up GOOGLE_APPLICATION_CREDENTIALS or have run `gcloud auth application-default login`
-        creds, _ = google.auth.default()
-        
-        service = build('sheets', 'v4', credentials=creds)
-
-        sheet = service.spreadsheets()
-        result = sheet.values().get(spreadsheetId=spreadsheet_id,
-                                    range=range_name).execute()
-        values = result.get('values', [])
-        return values
-    except Exception as e:
-        return f"Error reading Google Sheet: {str(e)}"
+# Heavy dependencies (LangChain, Chroma, PyPDF, OpenAI, Google API client) are imported
+# lazily: the agent modules load in a background warm-up task after the server starts,
+# so /token and the health endpoints are served immediately on a cold start.
+_LAZY_TOOL_ATTRIBUTES = {
+    "read_google_sheet_data", "read_google_sheet_ranges", "read_financial_data",
+    "fetch_financial_data", "FINANCIAL_DATA_FALLBACK",
+}
 
-@tool
-def read_financial_data(sheet_id: str, range: str):
-    """
-    Retrieves financial data from a specified spreadsheet range. 
-    Use this when asked about revenue, expenses, or financial performance.
-    
-    Args:
-        sheet_id (str): The ID of the spreadsheet.
-        range (str): The range to read.
-        
-    Returns:
-        list: A list of lists containing financial data, or a fallback message if unavailable.
-    """
-    max_retries = 2
-    for attempt in range(1, max_retries + 1):
-        try:
-            # Placeholder data for demonstration
-            # In a real scenario, this would be an API call that might fail
-            return [
-                ['Item', 'Value'],
-                ['Revenue', 100000],
-                ['Expenses', 50000],
-                ['Profit', 50000]
-            ]
-        except Exception as e:
-            print(f"Attempt {attempt} failed: {str(e)}")
-            if attempt == max_retries:
-                print("Max retries reached. Returning fallback response.")
-    
-    return "Financial data service is temporarily offline. I will provide the audit based only on policy documents."
+def __getattr__(name):
+    # Keeps `from rag_api_service import read_financial_data` working without eager imports.
+    if name in _LAZY_TOOL_ATTRIBUTES:
+        import service_tools
+        return getattr(service_tools, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
+PDF_PATH = os.environ.get("RAG_DOCUMENTS_PATH", "sample.pdf")
+PERSIST_DIRECTORY = os.environ.get("RAG_PERSIST_DIRECTORY", "./chroma_db")
+AGENT_POOL_SIZE = int(os.environ.get("RAG_AGENT_POOL_SIZE", "4"))
+ANSWER_CACHE_ENABLED = os.environ.get("RAG_ANSWER_CACHE", "1") == "1"
+BATCH_MAX_QUERIES = int(os.environ.get("RAG_BATCH_MAX_QUERIES", "500"))
+BATCH_MAX_CONCURRENCY = int(os.environ.get("RAG_BATCH_MAX_CONCURRENCY", "8"))
+# Server processes; above 1, see prepare_workers and gunicorn.conf.py.
+API_WORKERS = int(os.environ.get("RAG_WORKERS", "1"))
+# Set by prepare_workers when ingestion before the fork failed; workers inherit it and
+# report it from /readyz while serving the store from the last successful ingest.
+PREPARE_ERROR = None
 
 def initialize_vector_db():
     """
@@ -81,25 +56,209 @@ def initialize_vector_db():
     It checks if the DB exists; if not, it uses RAGAgent to create it from the PDF.
     """
     print("Initializing Vector Database (ChromaDB)...")
-    pdf_path = "sample.pdf"
+    pdf_path = PDF_PATH
     
     # Instantiate RAGAgent to trigger DB creation/loading
     # We don't need tools here, just the DB setup
+    from rag_agent import RAGAgent
     try:
         agent = RAGAgent(pdf_path=pdf_path)
         print("Vector Database initialized successfully.")
     except Exception as e:
         print(f"Failed to initialize Vector Database: {e}")
 
+def _ingest_before_fork():
+    from rag_agent import ingest_store
+    ingest_store(PDF_PATH, PERSIST_DIRECTORY)
+
+def prepare_workers():
+    """
+    Prepares a multi-worker deployment; runs once in the parent process before the workers start.
+
+    The documents are ingested (and derived indexes rebuilt) once, in a spawned child so the
+    parent never opens Chroma or starts its threads before forking. Workers are then marked
+    read-only, so none of them writes the store at start-up, and the agent stack and tokenizer
+    are imported here so forked workers share them copy-on-write instead of each loading them.
+    A failed ingest does not stop the server: it is recorded in PREPARE_ERROR for /readyz.
+    """
+    global PREPARE_ERROR
+    started = time.perf_counter()
+    if os.path.exists(PDF_PATH):
+        process = multiprocessing.get_context("spawn").Process(target=_ingest_before_fork, name="rag-ingest")
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            PREPARE_ERROR = f"Ingestion before starting workers failed (exit code {process.exitcode})."
+            print(PREPARE_ERROR)
+    os.environ["RAG_READ_ONLY"] = "1"
+    import agent_pool, service_tools  # noqa: F401
+    from embedding_pipeline import count_tokens
+    count_tokens("preload")
+    print(f"Workers prepared in {time.perf_counter() - started:.1f}s; vector store is read-only for workers.")
+
+def default_tools():
+    from service_tools import default_tools as _default_tools
+    return _default_tools()
+
+def build_collection_registry(default_pool):
+    from collections_registry import CollectionRegistry
+
+    return CollectionRegistry(default_pool, agent_kwargs={"answer_cache": ANSWER_CACHE_ENABLED})
+
+def build_agent_pool():
+    """
+    Creates the process-wide agent pool and warms the default tool set.
+    Warming the pool also creates or loads the Vector Database.
+    """
+    from agent_pool import AgentPool
+
+    print("Initializing Vector Database (ChromaDB) and agent pool...")
+    pool = AgentPool(PDF_PATH, persist_directory=PERSIST_DIRECTORY, max_size=AGENT_POOL_SIZE, agent_kwargs={"answer_cache": ANSWER_CACHE_ENABLED})
+    pool.get(default_tools())
+    print("Agent pool warmed successfully.")
+    return pool
+
+async def warm_up(app: FastAPI):
+    """
+    Background start-up task: imports the agent stack, opens the vector store and
+    builds the default agent off the event loop, then flips readiness.
+    """
+    started = asyncio.get_running_loop().time()
+    try:
+        pool = await asyncio.to_thread(build_agent_pool)
+        app.state.collections = build_collection_registry(pool)
+        app.state.agent_pool = pool
+        app.state.ready = True
+        elapsed = asyncio.get_running_loop().time() - started
+        print(f"Service ready after {elapsed:.1f}s warm-up.")
+    except Exception as e:
+        app.state.warmup_error = str(e)
+        print(f"Failed to warm agent pool: {e}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup logic
-    initialize_vector_db()
+    # Startup logic: serve immediately, warm up in the background.
+    app.state.agent_pool = None
+    app.state.collections = None
+    app.state.ready = False
+    app.state.warmup_error = None
+    app.state.ingest_error = PREPARE_ERROR
+    app.state.admission = AdmissionController()
+    app.state.jobs = JobStore()
+    app.state.leads = LeadsStore()
+    # Long audits and ingests run in separate worker processes, away from interactive queries.
+    app.state.job_manager = JobManager()
+    await asyncio.to_thread(app.state.job_manager.start)
+    app.state.warmup_task = asyncio.create_task(warm_up(app))
     yield
-    # Shutdown logic (if any)
+    # Shutdown logic
+    app.state.warmup_task.cancel()
+    await asyncio.to_thread(app.state.job_manager.stop)
+    app.state.agent_pool = None
+    app.state.collections = None
+
+def get_agent_pool(request: Request):
+    pool = getattr(request.app.state, "agent_pool", None)
+    if pool is None:
+        if getattr(request.app.state, "warmup_error", None):
+            raise HTTPException(status_code=503, detail=f"Agent pool failed to initialize: {request.app.state.warmup_error}")
+        raise HTTPException(status_code=503, detail="Service is warming up.", headers={"Retry-After": "5"})
+    return pool
+
+def get_collections(request: Request, pool=Depends(get_agent_pool)):
+    registry = getattr(request.app.state, "collections", None)
+    if registry is None:
+        # Pools installed directly (e.g. by the offline benchmarks) get a registry on first use.
+        registry = request.app.state.collections = build_collection_registry(pool)
+    return registry
+
+async def acquire_collection(registry, collection: str):
+    """
+    Leases a collection's agent pool; pair with release_collection.
+    """
+    try:
+        validate_collection_name(collection)
+        return await asyncio.to_thread(registry.acquire, collection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UnknownCollectionError:
+        raise HTTPException(status_code=404, detail=f"Unknown collection '{collection}'.")
+
+async def release_collection(registry, lease):
+    await asyncio.to_thread(registry.release, lease)
+
+async def pooled_agent(pool):
+    """
+    Leases the shared agent for the default tool set, building it off the event loop.
+    Pair with pool.release(agent).
+    """
+    try:
+        agent = await asyncio.to_thread(pool.acquire, default_tools())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if agent.agent_executor is None:
+        pool.release(agent)
+        raise HTTPException(status_code=503, detail="Agent not initialized successfully (check PDF path or API keys).")
+    return agent
+
+@asynccontextmanager
+async def collection_agent(registry, collection: str):
+    lease = await acquire_collection(registry, collection)
+    try:
+        agent = await pooled_agent(lease[1])
+        try:
+            yield agent
+        finally:
+            # Releasing may close an agent the pool dropped meanwhile; keep that off the loop.
+            await asyncio.to_thread(lease[1].release, agent)
+    finally:
+        await release_collection(registry, lease)
+
+def get_admission(request: Request):
+    admission = getattr(request.app.state, "admission", None)
+    if admission is None:
+        admission = request.app.state.admission = AdmissionController()
+    return admission
+
+async def admit(admission, current_user: str, cost=1):
+    """
+    Takes an execution slot for the user, or fails fast with 429 (user over their rate)
+    or 503 (server at capacity) and a Retry-After header. Pair with admission.release.
+    """
+    try:
+        return await admission.acquire(current_user, cost)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Retry-After": str(e.retry_after)})
+
+@asynccontextmanager
+async def admitted(admission, current_user: str, cost=1):
+    granted = await admit(admission, current_user, cost)
+    try:
+        yield
+    finally:
+        admission.release(granted)
 
 app = FastAPI(title="RAG Agent API", lifespan=lifespan)
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """
+    Records request latency per route template (so path parameters do not explode label
+    cardinality). Streaming responses are timed until their headers are sent.
+    """
+    started = time.perf_counter()
+    status_code = 500
+    try:
+        response = await call_next(request)
+        status_code = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            method=request.method, route=getattr(route, "path", "unmatched"), status=status_code,
+        )
+
 # Security / Auth
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -109,6 +268,14 @@ SECRET_KEY = "supersecretkey"  # In production, use environment variable
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Auth hot path: bcrypt runs on a small dedicated pool so login bursts never block the
+# event loop, and verified tokens are cached until their own `exp`.
+AUTH_HASH_WORKERS = int(os.environ.get("RAG_AUTH_HASH_WORKERS", "4"))
+TOKEN_CACHE_SIZE = int(os.environ.get("RAG_TOKEN_CACHE_SIZE", "1024"))
+password_executor = ThreadPoolExecutor(max_workers=AUTH_HASH_WORKERS, thread_name_prefix="rag-bcrypt")
+_token_cache = OrderedDict()
+_token_cache_lock = threading.Lock()
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     if expires_delta:
@@ -119,6 +286,41 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def decode_token(token: str) -> str:
+    """
+    Verifies a JWT and returns its subject, using the verified-token cache.
+    Cached entries are only served while the token's own `exp` is in the future.
+    
+    Raises:
+        jwt.PyJWTError: If the token is invalid or expired.
+        ValueError: If the token has no subject.
+    """
+    now = time.time()
+    with _token_cache_lock:
+        entry = _token_cache.get(token)
+        if entry is not None:
+            username, expires_at = entry
+            if expires_at > now:
+                _token_cache.move_to_end(token)
+                return username
+            del _token_cache[token]
+    
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    username = payload.get("sub")
+    if username is None:
+        raise ValueError("Token has no subject")
+    expires_at = payload.get("exp")
+    if expires_at is not None:
+        with _token_cache_lock:
+            _token_cache[token] = (username, float(expires_at))
+            while len(_token_cache) > TOKEN_CACHE_SIZE:
+                _token_cache.popitem(last=False)
+    return username
+
+def clear_token_cache():
+    with _token_cache_lock:
+        _token_cache.clear()
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -126,11 +328,8 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except jwt.PyJWTError:
+        username = decode_token(token)
+    except (jwt.PyJWTError, ValueError):
         raise credentials_exception
     return username
 
@@ -146,20 +345,61 @@ def verify_password(plain_password, hashed_password):
     # Truncate to 72 bytes to avoid bcrypt limitation
     return pwd_context.verify(plain_password[:72], hashed_password)
 
+async def verify_password_async(plain_password, hashed_password):
+    # bcrypt is deliberately slow (~250ms); run it off the event loop on the bounded auth pool.
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, verify_password, plain_password, hashed_password)
+
 def hash_password(password):
     # Truncate to 72 bytes to avoid bcrypt limitation
     return pwd_context.hash(password[:72])
 
 # Mock user database
 # In a real app, this would come from a database
-# Password is "secret"
+# Password is "secret". The bcrypt hash is precomputed so importing this module
+# does not spend ~250ms hashing on every cold start.
+ADMIN_PASSWORD_HASH = os.environ.get(
+    "ADMIN_PASSWORD_HASH", "$2b$12$EixZaYVK1fsbw1ZfbX3OXePaWxn96p36WQoeG6Lruj3vjPGga31lW"
+)
 fake_users_db = {
     "admin": {
         "username": "admin",
-        "hashed_password": hash_password("secret"),
+        "hashed_password": ADMIN_PASSWORD_HASH,
     }
 }
 
+@app.get("/healthz")
+async def healthz():
+    """
+    Liveness probe: the process is up and serving requests.
+    """
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz(request: Request):
+    """
+    Readiness probe: 200 once the vector store and default agent are warm, 503 before.
+    A failed ingest before the workers started is reported as "ingest_error"; the workers
+    then serve the store as it was last ingested.
+    """
+    ready = getattr(request.app.state, "ready", False)
+    error = getattr(request.app.state, "warmup_error", None)
+    if ready:
+        body = {"status": "ready"}
+    else:
+        body = {"status": "failed", "error": error} if error else {"status": "warming_up"}
+    ingest_error = getattr(request.app.state, "ingest_error", None)
+    if ingest_error:
+        body["ingest_error"] = ingest_error
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus scrape endpoint: request, per-stage, LLM token, tool call and cache metrics.
+    """
+    return Response(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.post("/token")
 async def login(user: UserLogin):
     if user.username not in fake_users_db:
@@ -168,7 +408,7 @@ async def login(user: UserLogin):
     user_in_db = fake_users_db[user.username]
     hashed_password = user_in_db["hashed_password"]
     
-    if not verify_password(user.password, hashed_password):
+    if not await verify_password_async(user.password, hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect username or password")
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -177,44 +417,383 @@ async def login(user: UserLogin):
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
+def get_leads_store(request: Request):
+    store = getattr(request.app.state, "leads", None)
+    if store is None:
+        store = request.app.state.leads = LeadsStore()
+    return store
+
 @app.get("/admin/leads")
-async def get_leads(current_user: str = Depends(get_current_user)):
-    """
-    Protected endpoint to retrieve leads data.
-    Requires a valid JWT token.
-    """
-    return {
-        "leads": [
-            {"name": "Alice Smith", "email": "alice@example.com"},
-            {"name": "Bob Jones", "email": "bob@example.com"},
-            {"name": "Charlie Brown", "email": "charlie@example.com"}
-        ],
-        "user": current_user
+async def get_leads(
+    request: Request,
+    cursor: int | None = None,
+    limit: int = LEADS_PAGE_SIZE,
+    fields: str | None = None,
+    status: str | None = None,
+    source: str | None = None,
+    company: str | None = None,
+    created_after: float | None = None,
+    created_before: float | None = None,
+    current_user: str = Depends(get_current_user),
+    store=Depends(get_leads_store),
+):
+    """
+    Protected endpoint to retrieve leads data, one page at a time.
+    Requires a valid JWT token. Pass the returned next_cursor as `cursor` for the next
+    page, `fields` (comma-separated) to project columns, and status/source/company or a
+    created_at range to filter. Responses carry ETag and Last-Modified; a conditional
+    request for unchanged data gets 304 Not Modified after a single version lookup.
+    """
+    query = {
+        "user": current_user, "cursor": cursor, "limit": limit, "fields": fields, "status": status,
+        "source": source, "company": company, "created_after": created_after, "created_before": created_before,
     }
+    version, modified_at = await asyncio.to_thread(store.version)
+    headers = {"ETag": leads_etag(version, query), "Last-Modified": http_date(modified_at), "Cache-Control": "private, no-cache"}
+    if not_modified(request.headers.get("if-none-match"), request.headers.get("if-modified-since"), headers["ETag"], modified_at):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        page = await asyncio.to_thread(
+            store.page, cursor=cursor, limit=limit,
+            fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None,
+            filters={"status": status, "source": source, "company": company},
+            created_after=created_after, created_before=created_before,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # The page may have been read after a concurrent write; tag it with the version it reflects.
+    headers["ETag"] = leads_etag(page["version"], query)
+    headers["Last-Modified"] = http_date(page["modified_at"])
+    return JSONResponse(
+        {"leads": page["leads"], "next_cursor": page["next_cursor"], "user": current_user}, headers=headers
+    )
 
 class QueryRequest(BaseModel):
     query: str
+    collection: str = DEFAULT_COLLECTION
+    include_timings: bool = False
+
+def without_timings(metadata, include_timings):
+    # Per-stage timings are always recorded in /metrics; responses carry them only on request.
+    if not include_timings and metadata:
+        metadata.pop("timings", None)
+    return metadata
 
 @app.post("/rag-query")
-async def rag_query(request: QueryRequest):
+async def rag_query(request: QueryRequest, current_user: str = Depends(get_current_user), registry=Depends(get_collections), admission=Depends(get_admission)):
     """
     Endpoint to query the RAG agent.
-    Instantiates the agent for each request as per instructions.
+    Requires a valid JWT token. Routes to the warm, pooled agent of the requested
+    collection instead of constructing one per request.
     """
-    pdf_path = "sample.pdf"
-    
-    if not os.path.exists(pdf_path):
-        raise HTTPException(status_code=500, detail="sample.pdf not found on server.")
+    async with admitted(admission, current_user), collection_agent(registry, request.collection) as agent:
+        try:
+            response, metadata = await agent.arun_query_with_metadata(request.query)
+            return {"answer": response, "metadata": without_timings(metadata, request.include_timings)}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+class BatchQueryRequest(BaseModel):
+    queries: list[str]
+    collection: str = DEFAULT_COLLECTION
+    max_concurrency: int = 4
+    include_timings: bool = False
+
+@app.post("/rag-query/batch")
+async def rag_query_batch(request: BatchQueryRequest, current_user: str = Depends(get_current_user), registry=Depends(get_collections), admission=Depends(get_admission)):
+    """
+    Answers many queries in one call.
+    Duplicates are answered once and each item reports its own answer or error,
+    so one failing query does not fail the batch. A batch takes one execution slot
+    but costs the user one rate-limit token per distinct query (up to their burst).
+    """
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="At least one query is required.")
+    if len(request.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUERIES} queries per batch.")
     
+    max_concurrency = max(1, min(request.max_concurrency, BATCH_MAX_CONCURRENCY))
+    cost = len(set(request.queries))
+    async with admitted(admission, current_user, cost), collection_agent(registry, request.collection) as agent:
+        try:
+            results = await agent.arun_batch(request.queries, max_concurrency=max_concurrency)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    for item in results:
+        without_timings(item["metadata"], request.include_timings)
+    return {"results": results}
+
+def format_sse(event: dict) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+class ReleasingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that calls an async release callback however the response ends,
+    including when the client disconnects before the body is ever iterated.
+    """
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.release()
+
+@app.post("/rag-query/stream")
+async def rag_query_stream(request: QueryRequest, http_request: Request, current_user: str = Depends(get_current_user), registry=Depends(get_collections), admission=Depends(get_admission)):
+    """
+    Streaming variant of /rag-query using Server-Sent Events.
+    Emits tool and retrieval events while the agent works, then the answer tokens,
+    then a final event with the complete answer. If the client disconnects the
+    agent run is cancelled.
+    """
+    # The execution slot and the collection and agent leases are held until the stream ends, not just
+    # until the handler returns. release is idempotent: both the body generator and the
+    # response call it, since either may be cut short by a disconnect.
+    granted = await admit(admission, current_user)
+    try:
+        lease = await acquire_collection(registry, request.collection)
+    except HTTPException:
+        admission.release(granted)
+        raise
+    try:
+        agent = await pooled_agent(lease[1])
+    except HTTPException:
+        await release_collection(registry, lease)
+        admission.release(granted)
+        raise
+
+    released = False
+
+    async def release():
+        nonlocal released
+        if released:
+            return
+        released = True
+        admission.release(granted)
+        # Shielded so a cancelled response still returns the leases.
+        await asyncio.shield(return_leases())
+
+    async def return_leases():
+        await asyncio.to_thread(lease[1].release, agent)
+        await release_collection(registry, lease)
+
+    async def event_source():
+        events = agent.astream_query(request.query)
+        try:
+            async for event in events:
+                if await http_request.is_disconnected():
+                    print("Client disconnected; cancelling agent run.")
+                    break
+                if event["event"] == "final":
+                    without_timings(event.get("metadata"), request.include_timings)
+                yield format_sse(event)
+        except Exception as e:
+            yield format_sse({"event": "error", "detail": str(e)})
+        finally:
+            # Also runs when the response task is cancelled on disconnect.
+            try:
+                await events.aclose()
+            finally:
+                await release()
+
+    return ReleasingStreamingResponse(
+        event_source(),
+        release,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+class JobRequest(BaseModel):
+    kind: str
+    collection: str = DEFAULT_COLLECTION
+    query: str | None = None
+    queries: list[str] | None = None
+    max_concurrency: int = 4
+    priority: int = 0
+    # Seconds; out-of-range values are rejected with 422 before anything is queued.
+    timeout: float | None = Field(default=None, gt=0, le=JOB_MAX_TIMEOUT)
+
+def get_job_store(request: Request):
+    store = getattr(request.app.state, "jobs", None)
+    if store is None:
+        store = request.app.state.jobs = JobStore()
+    return store
+
+def _owned_job(store, job_id: str, current_user: str):
+    job = store.get(job_id)
+    # Other users' jobs are reported as missing rather than forbidden.
+    if job is None or job["owner"] != current_user:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    return job
+
+@app.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(request: JobRequest, current_user: str = Depends(get_current_user), registry=Depends(get_collections), store=Depends(get_job_store)):
+    """
+    Protected endpoint queueing a long-running job ("query", "batch", "audit" or "ingest")
+    for the job workers. Poll /jobs/{job_id} and fetch /jobs/{job_id}/result when finished.
+    """
+    if request.kind not in JOB_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(JOB_KINDS)}.")
+    if request.kind == "ingest":
+        _check_writable()
+    if request.kind == "query" and not request.query:
+        raise HTTPException(status_code=400, detail="query jobs require 'query'.")
+    if request.kind == "batch" and not request.queries:
+        raise HTTPException(status_code=400, detail="batch jobs require 'queries'.")
+    if request.queries and len(request.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUERIES} queries per batch.")
+    try:
+        validate_collection_name(request.collection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not registry.exists(request.collection):
+        raise HTTPException(status_code=404, detail=f"Unknown collection '{request.collection}'.")
+
+    params = {
+        "collection": request.collection,
+        "pdf_path": registry.source_path(request.collection),
+        "persist_directory": registry.persist_directory(request.collection),
+        "query": request.query,
+        "queries": request.queries,
+        "max_concurrency": max(1, min(request.max_concurrency, BATCH_MAX_CONCURRENCY)),
+    }
+    job_id = await asyncio.to_thread(
+        store.submit, request.kind, params, priority=request.priority, timeout=request.timeout, owner=current_user
+    )
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, current_user: str = Depends(get_current_user), store=Depends(get_job_store)):
+    """
+    Protected endpoint returning a job's status and timing.
+    """
+    job = await asyncio.to_thread(_owned_job, store, job_id, current_user)
+    return {key: job[key] for key in (
+        "id", "kind", "status", "priority", "attempts", "created_at", "started_at", "finished_at", "error",
+    )}
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, current_user: str = Depends(get_current_user), store=Depends(get_job_store)):
+    """
+    Protected endpoint returning a finished job's result or error; 202 while it is queued or running.
+    """
+    job = await asyncio.to_thread(_owned_job, store, job_id, current_user)
+    if job["status"] not in FINISHED_STATUSES:
+        return JSONResponse(status_code=202, content={"id": job_id, "status": job["status"]})
+    return {"id": job_id, "status": job["status"], "result": job["result"], "error": job["error"]}
+
+@app.get("/admin/circuit-breakers")
+async def get_circuit_breakers(current_user: str = Depends(get_current_user)):
+    """
+    Protected endpoint exposing the state of each backend circuit breaker.
+    """
+    return {"breakers": breaker_states(), "user": current_user}
+
+@app.get("/collections")
+async def list_collections(current_user: str = Depends(get_current_user), registry=Depends(get_collections)):
+    """
+    Protected endpoint listing document collections, their documents and whether they are open.
+    """
+    collections = await asyncio.to_thread(lambda: [registry.describe(name) for name in registry.names()])
+    return {"collections": collections, "user": current_user}
+
+def _checked_collection(name: str):
+    try:
+        validate_collection_name(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if name == DEFAULT_COLLECTION:
+        raise HTTPException(status_code=400, detail="The default collection is managed through RAG_DOCUMENTS_PATH.")
+    return name
+
+def _check_writable():
+    # Every worker keeps its own Chroma client, which never sees another process's writes, so
+    # with several workers the stores are only written by prepare_workers before they start.
+    # prepare_workers marks the stores read-only however the worker count was set.
+    if API_WORKERS > 1 or os.environ.get("RAG_READ_ONLY") == "1":
+        raise HTTPException(status_code=409, detail="Documents cannot be changed while the vector stores are "
+                            "read-only (RAG_WORKERS > 1); change them with a single worker.")
+
+def _save_upload(upload, path):
+    # Written beside the target and renamed, so ingestion never sees a partial PDF.
+    partial = f"{path}.part"
+    with open(partial, "wb") as out:
+        shutil.copyfileobj(upload.file, out)
+    os.replace(partial, path)
+
+@app.post("/collections/{name}/documents")
+async def upload_documents(name: str, files: list[UploadFile] = File(...), current_user: str = Depends(get_current_user), registry=Depends(get_collections)):
+    """
+    Protected endpoint adding or replacing PDFs in a collection (created on first upload)
+    and ingesting them incrementally.
+    """
+    _checked_collection(name)
+    _check_writable()
+    filenames = [os.path.basename(f.filename or "") for f in files]
+    if not filenames or any(not n.lower().endswith(".pdf") for n in filenames):
+        raise HTTPException(status_code=400, detail="Only .pdf files can be uploaded.")
+    if registry.is_deleting(name):
+        raise HTTPException(status_code=409, detail=f"Collection '{name}' is being deleted.")
+
+    documents_directory = registry.documents_directory(name)
+    os.makedirs(documents_directory, exist_ok=True)
+    for upload, filename in zip(files, filenames):
+        await asyncio.to_thread(_save_upload, upload, os.path.join(documents_directory, filename))
     try:
-        # Instantiate the agent with tools
-        # Note: In production, this should be a global singleton
-        tools = [read_google_sheet_data, read_financial_data]
-        agent = RAGAgent(pdf_path, tools=tools)
-        response = agent.run_query(request.query)
-        return {"answer": response}
+        stats = await asyncio.to_thread(registry.ingest, name)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail=f"Ingestion failed: {e}")
+    return {"collection": name, "uploaded": filenames, "ingestion": stats, "user": current_user}
+
+@app.delete("/collections/{name}/documents/{filename}")
+async def delete_document(name: str, filename: str, current_user: str = Depends(get_current_user), registry=Depends(get_collections)):
+    """
+    Protected endpoint removing one PDF from a collection and pruning its chunks.
+    """
+    _checked_collection(name)
+    _check_writable()
+    path = os.path.join(registry.documents_directory(name), os.path.basename(filename))
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"Document '{filename}' not found in collection '{name}'.")
+    os.remove(path)
+    try:
+        stats = await asyncio.to_thread(registry.ingest, name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ingestion failed: {e}")
+    return {"collection": name, "deleted": os.path.basename(filename), "ingestion": stats, "user": current_user}
+
+@app.delete("/collections/{name}")
+async def delete_collection(name: str, current_user: str = Depends(get_current_user), registry=Depends(get_collections)):
+    """
+    Protected endpoint closing a collection and deleting its documents and vector store.
+    """
+    _checked_collection(name)
+    _check_writable()
+    try:
+        await asyncio.to_thread(registry.delete, name)
+    except UnknownCollectionError:
+        raise HTTPException(status_code=404, detail=f"Unknown collection '{name}'.")
+    return {"status": "deleted", "collection": name, "user": current_user}
+
+@app.post("/admin/reload-agents")
+async def reload_agents(current_user: str = Depends(get_current_user), registry=Depends(get_collections)):
+    """
+    Protected endpoint that drops pooled agents so they are rebuilt against the current vector stores.
+    Changes to the stores on disk are also picked up automatically.
+    """
+    registry.reload()
+    return {"status": "reloaded", "user": current_user}
 
 if __name__ == "__main__":
+    if API_WORKERS > 1:
+        # uvicorn's own workers are spawned without a preloaded parent, so prepare_workers
+        # would not run before them; several workers are served by gunicorn instead.
+        here = os.path.dirname(os.path.abspath(__file__))
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (here, os.environ.get("PYTHONPATH")))))
+        os.execvpe("gunicorn", ["gunicorn", "-c", os.path.join(here, "gunicorn.conf.py"), "rag_api_service:app"], env)
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,202 @@
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# Calls with a timeout run on this pool so the caller can stop waiting. A timed-out call
+# keeps its thread until the backend returns, so the pool is bounded to cap that cost.
+RESILIENCE_WORKERS = int(os.environ.get("RAG_RESILIENCE_WORKERS", "16"))
+_timeout_executor = None
+_timeout_executor_lock = threading.Lock()
+
+
+def _get_timeout_executor():
+    global _timeout_executor
+    with _timeout_executor_lock:
+        if _timeout_executor is None:
+            _timeout_executor = ThreadPoolExecutor(max_workers=RESILIENCE_WORKERS, thread_name_prefix="rag-resilience")
+        return _timeout_executor
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        """
+        Classic three-state circuit breaker.
+
+        After failure_threshold consecutive failures the circuit opens and calls fail fast.
+        Once reset_timeout seconds have passed a single probe call is let through
+        (half-open); its success closes the circuit, its failure re-opens it.
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.total_calls = 0
+        self.total_failures = 0
+        self.total_rejections = 0
+        self.last_error = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.total_rejections += 1
+            return False
+
+    def retry_in(self):
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.total_calls += 1
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+            if self.state != self.CLOSED:
+                print(f"Circuit '{self.name}' closed.")
+            self.state = self.CLOSED
+
+    def record_failure(self, error):
+        with self._lock:
+            self.total_calls += 1
+            self.total_failures += 1
+            self.consecutive_failures += 1
+            self.last_error = str(error)
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"Circuit '{self.name}' opened after {self.consecutive_failures} failures: {error}")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "retry_in_seconds": round(self.retry_in(), 1),
+                "total_calls": self.total_calls,
+                "total_failures": self.total_failures,
+                "total_rejections": self.total_rejections,
+                "last_error": self.last_error,
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name, **kwargs):
+    """
+    Returns the process-wide breaker for a backend, creating it on first use.
+    """
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, **kwargs)
+        return _breakers[name]
+
+
+def breaker_states():
+    """
+    Returns a monitoring snapshot of every circuit breaker.
+    """
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.snapshot() for b in breakers}
+
+
+class ResiliencePolicy:
+    def __init__(self, name, max_attempts=3, base_delay=0.5, max_delay=8.0, timeout=10.0,
+                 failure_threshold=5, reset_timeout=30.0, is_transient=None):
+        """
+        Retry, timeout and circuit breaker policy for calls to one backend.
+
+        Args:
+            name (str): Backend name; policies with the same name share a circuit breaker.
+            max_attempts (int, optional): Total attempts per call, including the first.
+            base_delay (float, optional): Initial backoff; doubles per retry, with full jitter.
+            max_delay (float, optional): Upper bound for a single backoff.
+            timeout (float, optional): Per-attempt timeout in seconds; None disables it.
+            failure_threshold (int, optional): Consecutive failures that open the circuit.
+            reset_timeout (float, optional): Seconds the circuit stays open before a probe.
+            is_transient (callable, optional): Returns False for errors that should not be
+                retried or counted against the backend (e.g. a bad range). Defaults to all errors.
+        """
+        self.name = name
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.is_transient = is_transient or (lambda error: True)
+        self.breaker = get_breaker(name, failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+
+    def _attempt(self, fn, args, kwargs):
+        if self.timeout is None:
+            return fn(*args, **kwargs)
+        future = _get_timeout_executor().submit(fn, *args, **kwargs)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f"{self.name} call timed out after {self.timeout}s")
+
+    def call(self, fn, *args, fallback=None, **kwargs):
+        """
+        Calls fn with retries, per-attempt timeouts and the circuit breaker.
+
+        Args:
+            fn (callable): The backend call.
+            fallback (optional): Returned when all attempts fail or the circuit is open.
+                If callable it is called with the final error. If None the error is raised.
+
+        Returns:
+            The result of fn, or the fallback.
+        """
+        error = None
+        for attempt in range(1, self.max_attempts + 1):
+            if not self.breaker.allow():
+                error = CircuitOpenError(
+                    f"{self.name} is temporarily offline (circuit open, retry in {self.breaker.retry_in():.0f}s)"
+                )
+                break
+            try:
+                result = self._attempt(fn, args, kwargs)
+            except Exception as e:
+                error = e
+                if not self.is_transient(e):
+                    # The backend answered; the request itself was bad.
+                    self.breaker.record_success()
+                    break
+                self.breaker.record_failure(e)
+                print(f"{self.name} attempt {attempt}/{self.max_attempts} failed: {e}")
+                if attempt < self.max_attempts:
+                    delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+                    time.sleep(random.uniform(0, delay))
+                continue
+            self.breaker.record_success()
+            return result
+
+        if fallback is None:
+            raise error
+        print(f"{self.name} unavailable; returning fallback response.")
+        return fallback(error) if callable(fallback) else fallback
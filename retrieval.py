@@ -0,0 +1,358 @@
+import os
+import re
+import json
+import math
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from metrics import Histogram, stage_timer
+
+BM25_INDEX_FILENAME = "bm25_index.sqlite3"
+RETRIEVAL_MODE = os.environ.get("RAG_RETRIEVAL_MODE", "hybrid")
+RETRIEVER_K = int(os.environ.get("RAG_RETRIEVER_K", "4"))
+RETRIEVER_FETCH_K = int(os.environ.get("RAG_RETRIEVER_FETCH_K", "20"))
+# Re-ranking: candidates are re-scored locally and k adapts to the score gap, up to RETRIEVER_K.
+RERANK_ENABLED = os.environ.get("RAG_RERANK", "1") == "1"
+RERANK_MIN_K = int(os.environ.get("RAG_RERANK_MIN_K", "1"))
+RERANK_MMR_LAMBDA = float(os.environ.get("RAG_RERANK_MMR_LAMBDA", "0.7"))
+RERANK_MIN_SCORE_RATIO = float(os.environ.get("RAG_RERANK_MIN_SCORE_RATIO", "0.5"))
+RERANK_SCORE_GAP = float(os.environ.get("RAG_RERANK_SCORE_GAP", "0.2"))
+
+RETRIEVED_CHUNKS = Histogram(
+    "rag_retrieved_chunks", "Chunks returned per retrieval after re-ranking.", buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20),
+)
+
+# Keeps figures such as "90,000" or "Q1" and identifiers such as "acct-4410" as single terms.
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.,\-_/][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_PATTERN.findall(text.lower()) if t not in _STOPWORDS]
+
+
+class BM25Index:
+    def __init__(self, path, k1=1.5, b=0.75, read_only=False):
+        """
+        Persistent BM25 inverted index stored in SQLite next to the Chroma collection.
+
+        Uses the same chunk IDs as Chroma, so ingestion adds and deletes chunks in both
+        stores together.
+
+        Args:
+            path (str): Path of the SQLite index file.
+            k1 (float, optional): BM25 term frequency saturation.
+            b (float, optional): BM25 length normalization.
+            read_only (bool, optional): Open an existing index read-only, without schema changes.
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.read_only = read_only
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None and self.read_only:
+            conn = self._local.conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, timeout=30)
+        elif conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                "CREATE TABLE IF NOT EXISTS docs ("
+                "  id TEXT PRIMARY KEY, content TEXT NOT NULL, metadata TEXT NOT NULL, length INTEGER NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS postings ("
+                "  term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, doc_id)"
+                ") WITHOUT ROWID;"
+                "CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings (doc_id);"
+            )
+            self._local.conn = conn
+        return conn
+
+    def add(self, items):
+        """
+        Adds or replaces chunks.
+
+        Args:
+            items (list): (id, text, metadata) tuples.
+        """
+        if not items:
+            return
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                ids = [item[0] for item in items]
+                self._delete_locked(conn, ids)
+                for doc_id, text, metadata in items:
+                    terms = Counter(tokenize(text))
+                    conn.execute(
+                        "INSERT INTO docs (id, content, metadata, length) VALUES (?, ?, ?, ?)",
+                        (doc_id, text, json.dumps(metadata or {}), sum(terms.values())),
+                    )
+                    conn.executemany(
+                        "INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)",
+                        [(term, doc_id, tf) for term, tf in terms.items()],
+                    )
+
+    def _delete_locked(self, conn, ids):
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            conn.execute(f"DELETE FROM postings WHERE doc_id IN ({placeholders})", chunk)
+            conn.execute(f"DELETE FROM docs WHERE id IN ({placeholders})", chunk)
+
+    def delete(self, ids):
+        if not ids:
+            return
+        with self._write_lock:
+            conn = self._conn()
+            with conn:
+                self._delete_locked(conn, list(ids))
+
+    def ids(self):
+        return {row[0] for row in self._conn().execute("SELECT id FROM docs")}
+
+    def count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def search(self, query, k=RETRIEVER_FETCH_K):
+        """
+        Returns the top-k chunks for a query.
+
+        Returns:
+            list: (Document, score) tuples, best first.
+        """
+        # Sorted, like every term iteration feeding a float sum here: set order varies with
+        # PYTHONHASHSEED, and a different summation order can break ties differently.
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+        conn = self._conn()
+        doc_count, total_length = conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+        if not doc_count:
+            return []
+        avg_length = total_length / doc_count or 1.0
+
+        term_freqs = {}
+        idf = {}
+        for term in terms:
+            rows = conn.execute("SELECT doc_id, tf FROM postings WHERE term = ?", (term,)).fetchall()
+            if not rows:
+                continue
+            idf[term] = math.log(1 + (doc_count - len(rows) + 0.5) / (len(rows) + 0.5))
+            for doc_id, tf in rows:
+                term_freqs.setdefault(doc_id, []).append((term, tf))
+        if not term_freqs:
+            return []
+
+        lengths = {}
+        order = {}
+        candidate_ids = list(term_freqs)
+        for i in range(0, len(candidate_ids), 500):
+            chunk = candidate_ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for doc_id, length, rowid in conn.execute(
+                f"SELECT id, length, rowid FROM docs WHERE id IN ({placeholders})", chunk
+            ):
+                lengths[doc_id] = length
+                order[doc_id] = rowid
+
+        scores = {}
+        for doc_id, matches in term_freqs.items():
+            norm = self.k1 * (1 - self.b + self.b * lengths.get(doc_id, avg_length) / avg_length)
+            scores[doc_id] = sum(idf[term] * tf * (self.k1 + 1) / (tf + norm) for term, tf in matches)
+        # Equal scores keep ingestion order: chunk IDs hash the file path, so ordering ties by
+        # ID would rank the same corpus differently depending on where it is stored.
+        top = sorted(scores.items(), key=lambda item: (-item[1], order.get(item[0], 0)))[:k]
+
+        placeholders = ",".join("?" * len(top))
+        rows = conn.execute(
+            f"SELECT id, content, metadata FROM docs WHERE id IN ({placeholders})", [doc_id for doc_id, _ in top]
+        ).fetchall()
+        by_id = {doc_id: (content, json.loads(metadata)) for doc_id, content, metadata in rows}
+        return [
+            (Document(page_content=by_id[doc_id][0], metadata=by_id[doc_id][1], id=doc_id), score)
+            for doc_id, score in top if doc_id in by_id
+        ]
+
+
+def open_bm25_index(persist_directory):
+    return BM25Index(os.path.join(persist_directory, BM25_INDEX_FILENAME))
+
+
+def reconcile_bm25(vectorstore, bm25_index, page_size=1000):
+    """
+    Makes the BM25 index hold exactly the chunks in Chroma. Backfills stores created
+    before the index existed and repairs drift from an interrupted ingest.
+    """
+    stored = set(vectorstore.get(include=[]).get("ids", []))
+    indexed = bm25_index.ids()
+    extra = list(indexed - stored)
+    missing = list(stored - indexed)
+    if extra:
+        bm25_index.delete(extra)
+    for i in range(0, len(missing), page_size):
+        page = vectorstore.get(ids=missing[i:i + page_size], include=["documents", "metadatas"])
+        bm25_index.add(list(zip(page["ids"], page["documents"], page["metadatas"])))
+    if extra or missing:
+        print(f"BM25 index reconciled: {len(missing)} added, {len(extra)} removed.")
+
+
+def document_key(doc):
+    # Chroma results do not always carry IDs, so fusion matches chunks by source and text.
+    return (doc.metadata.get("source"), doc.page_content)
+
+
+def fused_scores(rankings, rrf_k=60):
+    """
+    Fuses several ranked document lists; each list contributes 1 / (rrf_k + rank).
+
+    Returns:
+        list: (Document, fused score) tuples, best first.
+    """
+    scores = {}
+    docs = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = document_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+    return [(docs[key], scores[key]) for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=60):
+    """
+    Returns:
+        list: The top-k documents by fused score (see fused_scores).
+    """
+    return [doc for doc, _ in fused_scores(rankings, rrf_k)[:k]]
+
+
+def rerank_candidates(query, candidates, max_k=RETRIEVER_K, min_k=RERANK_MIN_K, mmr_lambda=RERANK_MMR_LAMBDA,
+                      min_score_ratio=RERANK_MIN_SCORE_RATIO, score_gap=RERANK_SCORE_GAP):
+    """
+    Re-ranks retrieval candidates with a cheap local scorer and picks k adaptively.
+
+    Relevance is the mean of the candidate's fused rank score (relative to the best) and its
+    IDF-weighted coverage of the query terms, with IDF over the candidates themselves, so a
+    term every candidate shares counts for little. Candidates are then chosen by maximal
+    marginal relevance, with token-set Jaccard similarity standing in for embeddings so
+    near-duplicate chunks are not sent twice. Selection stops at max_k, or after min_k once
+    the next candidate's relevance is below min_score_ratio of the best or falls more than
+    score_gap below the previous pick: a clear winner is sent alone, a flat field in full.
+
+    Args:
+        query (str): The search query.
+        candidates (list): (Document, fused score) tuples, best first.
+
+    Returns:
+        list: Selected documents with "rerank_score" in their metadata.
+    """
+    if not candidates:
+        return []
+    query_terms = set(tokenize(query))
+    terms = [set(tokenize(doc.page_content)) for doc, _ in candidates]
+    document_frequency = Counter(t for doc_terms in terms for t in doc_terms & query_terms)
+    weights = {t: math.log(1 + len(candidates) / df) for t, df in document_frequency.items()}
+    total_weight = sum(weights[t] for t in sorted(weights)) or 1.0
+    best_fused = candidates[0][1] or 1.0
+    relevance = [
+        0.5 * fused / best_fused + 0.5 * sum(weights.get(t, 0.0) for t in sorted(doc_terms & query_terms)) / total_weight
+        for (_, fused), doc_terms in zip(candidates, terms)
+    ]
+
+    def similarity(i, j):
+        union = terms[i] | terms[j]
+        return len(terms[i] & terms[j]) / len(union) if union else 0.0
+
+    top = max(relevance)
+    remaining = list(range(len(candidates)))
+    selected = []
+    while remaining and len(selected) < max_k:
+        pick = max(remaining, key=lambda i: mmr_lambda * relevance[i]
+                   - (1 - mmr_lambda) * max((similarity(i, j) for j in selected), default=0.0))
+        if len(selected) >= min_k and (relevance[pick] < min_score_ratio * top
+                                       or relevance[selected[-1]] - relevance[pick] > score_gap * top):
+            break
+        selected.append(pick)
+        remaining.remove(pick)
+    RETRIEVED_CHUNKS.observe(len(selected))
+    return [
+        Document(page_content=candidates[i][0].page_content, id=candidates[i][0].id,
+                 metadata=dict(candidates[i][0].metadata, rerank_score=round(relevance[i], 4)))
+        for i in selected
+    ]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever fusing dense Chroma similarity with BM25 lexical matches via reciprocal
+    rank fusion, so exact figures and identifiers are found alongside paraphrases.
+    """
+
+    vectorstore: Any
+    bm25_index: Any
+    k: int = RETRIEVER_K
+    fetch_k: int = RETRIEVER_FETCH_K
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        with stage_timer("vector_search"):
+            dense = self.vectorstore.similarity_search(query, k=self.fetch_k)
+        with stage_timer("bm25_search"):
+            lexical = [doc for doc, _ in self.bm25_index.search(query, k=self.fetch_k)]
+        return reciprocal_rank_fusion([dense, lexical], k=self.k, rrf_k=self.rrf_k)
+
+
+class RerankingRetriever(BaseRetriever):
+    """
+    Over-fetches dense (and, with a BM25 index, lexical) candidates, fuses them, and
+    returns an adaptive number of them chosen by rerank_candidates().
+    """
+
+    vectorstore: Any
+    bm25_index: Any = None
+    k: int = RETRIEVER_K
+    fetch_k: int = RETRIEVER_FETCH_K
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        with stage_timer("vector_search"):
+            rankings = [self.vectorstore.similarity_search(query, k=self.fetch_k)]
+        if self.bm25_index is not None:
+            with stage_timer("bm25_search"):
+                rankings.append([doc for doc, _ in self.bm25_index.search(query, k=self.fetch_k)])
+        with stage_timer("rerank"):
+            return rerank_candidates(query, fused_scores(rankings, self.rrf_k), max_k=self.k)
+
+
+def build_retriever(vectorstore, persist_directory, mode=RETRIEVAL_MODE, k=RETRIEVER_K, fetch_k=RETRIEVER_FETCH_K,
+                    rerank=RERANK_ENABLED, read_only=False):
+    """
+    Builds the retriever behind the pdf_retriever tool.
+
+    Args:
+        mode (str, optional): "hybrid" (BM25 + dense) or "dense". Hybrid falls back to
+            dense when no BM25 index has been built yet.
+        k (int, optional): Chunks returned; the most returned when re-ranking.
+        rerank (bool, optional): Re-rank fetch_k candidates and adapt k. Defaults to RAG_RERANK.
+        read_only (bool, optional): Open the BM25 index read-only.
+    """
+    bm25_path = os.path.join(persist_directory, BM25_INDEX_FILENAME)
+    bm25_index = BM25Index(bm25_path, read_only=read_only) if mode == "hybrid" and os.path.exists(bm25_path) else None
+    if rerank:
+        return RerankingRetriever(vectorstore=vectorstore, bm25_index=bm25_index, k=k, fetch_k=fetch_k)
+    if bm25_index is not None:
+        return HybridRetriever(vectorstore=vectorstore, bm25_index=bm25_index, k=k, fetch_k=fetch_k)
+    return vectorstore.as_retriever(search_kwargs={"k": k})
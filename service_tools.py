@@ -0,0 +1,90 @@
+from langchain_core.tools import tool
+from sheets_client import get_sheets_client
+from resilience import ResiliencePolicy
+
+# Tools exposed to the agent. This module imports LangChain, so rag_api_service only
+# loads it lazily (during warm-up or on first attribute access).
+
+# Google Sheets access goes through a process-wide client (see sheets_client.py) that
+# resolves credentials once, reuses HTTP connections and caches ranges for a short TTL.
+
+def _is_transient_sheets_error(error):
+    # HttpError exposes the HTTP status on .resp; 4xx other than 429 is a bad request, not an outage.
+    status = getattr(getattr(error, "resp", None), "status", None)
+    return status is None or int(status) == 429 or int(status) >= 500
+
+sheets_policy = ResiliencePolicy("google_sheets", max_attempts=3, timeout=15.0, is_transient=_is_transient_sheets_error)
+
+def _sheets_error(error):
+    return f"Error reading Google Sheet: {str(error)}"
+
+@tool
+def read_google_sheet_data(spreadsheet_id: str, range_name: str, force_refresh: bool = False):
+    """
+    Reads data from a Google Sheet.
+    
+    Args:
+        spreadsheet_id (str): The ID of the spreadsheet.
+        range_name (str): The range to read, e.g., 'Sheet1!A1:B10'.
+        force_refresh (bool): Bypass the cache and fetch fresh values.
+        
+    Returns:
+        list: A list of lists containing the cell values.
+    """
+    return sheets_policy.call(
+        get_sheets_client().get_values, spreadsheet_id, range_name,
+        force_refresh=force_refresh, fallback=_sheets_error,
+    )
+
+@tool
+def read_google_sheet_ranges(spreadsheet_id: str, range_names: list[str], force_refresh: bool = False):
+    """
+    Reads several ranges from one Google Sheet in a single request.
+    Prefer this over repeated read_google_sheet_data calls when more than one range is needed.
+    
+    Args:
+        spreadsheet_id (str): The ID of the spreadsheet.
+        range_names (list[str]): The ranges to read, e.g., ['Sheet1!A1:B10', 'Sheet2!A1:C5'].
+        force_refresh (bool): Bypass the cache and fetch fresh values.
+        
+    Returns:
+        dict: Mapping of each range to a list of lists containing the cell values.
+    """
+    return sheets_policy.call(
+        get_sheets_client().batch_get, spreadsheet_id, range_names,
+        force_refresh=force_refresh, fallback=_sheets_error,
+    )
+
+FINANCIAL_DATA_FALLBACK = "Financial data service is temporarily offline. I will provide the audit based only on policy documents."
+
+financial_data_policy = ResiliencePolicy("financial_data", max_attempts=3, timeout=10.0)
+
+def fetch_financial_data(sheet_id: str, range: str):
+    # Placeholder data for demonstration
+    # In a real scenario, this would be an API call that might fail
+    return [
+        ['Item', 'Value'],
+        ['Revenue', 100000],
+        ['Expenses', 50000],
+        ['Profit', 50000]
+    ]
+
+@tool
+def read_financial_data(sheet_id: str, range: str):
+    """
+    Retrieves financial data from a specified spreadsheet range. 
+    Use this when asked about revenue, expenses, or financial performance.
+    
+    Args:
+        sheet_id (str): The ID of the spreadsheet.
+        range (str): The range to read.
+        
+    Returns:
+        list: A list of lists containing financial data, or a fallback message if unavailable.
+    """
+    # Retries with backoff, then fails fast to the fallback while the circuit is open.
+    return financial_data_policy.call(fetch_financial_data, sheet_id, range, fallback=FINANCIAL_DATA_FALLBACK)
+
+
+def default_tools():
+    return [read_google_sheet_data, read_google_sheet_ranges, read_financial_data]
@@ -1,3 +1,5 @@
+import os
+import random
 from reportlab.pdfgen import canvas
 
 def create_sample_pdf(filename):
@@ -7,5 +9,48 @@ def create_sample_pdf(filename):
     c.save()
     print(f"Created {filename}")
 
+def create_synthetic_corpus(directory, num_docs=10, pages_per_doc=5, facts_per_page=30, seed=0):
+    """
+    Creates a reproducible corpus of financial-report PDFs for benchmarks.
+    Every line is a unique fact, so each generated question has exactly one correct chunk.
+    
+    Args:
+        directory (str): Output directory for the PDFs.
+        num_docs (int, optional): Number of PDF files.
+        pages_per_doc (int, optional): Pages per file.
+        facts_per_page (int, optional): Fact lines per page (at most 35 fit on a page).
+        seed (int, optional): Random seed for the generated figures.
+        
+    Returns:
+        list: Ground truth dicts with "query", "answer", "source" and "page".
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    ground_truth = []
+    unit = 0
+    for doc_index in range(num_docs):
+        filename = os.path.normpath(os.path.join(directory, f"report_{doc_index:04d}.pdf"))
+        c = canvas.Canvas(filename)
+        for page in range(pages_per_doc):
+            c.drawString(100, 780, f"Financial Report {doc_index:04d}, page {page + 1}")
+            for line in range(min(facts_per_page, 35)):
+                unit += 1
+                quarter = rng.randint(1, 4)
+                amount = rng.randint(10, 990) * 1000
+                account = f"ACCT-{rng.randint(1000, 9999)}"
+                c.drawString(100, 750 - 20 * line,
+                             f"Unit {unit:05d} Budget Forecast for Q{quarter} is ${amount:,} on account {account}.")
+                ground_truth.append({
+                    "query": f"What is the Budget Forecast for Q{quarter} of Unit {unit:05d}?",
+                    "answer": f"${amount:,}",
+                    "key": f"Unit {unit:05d}",
+                    "source": filename,
+                    "page": page,
+                })
+            c.showPage()
+        c.save()
+    print(f"Created {num_docs} PDFs with {len(ground_truth)} facts in {directory}")
+    return ground_truth
+
 if __name__ == "__main__":
     create_sample_pdf("sample.pdf")
@@ -0,0 +1,142 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from metrics import record_cache
+
+SHEETS_SCOPES = ["https://www.googleapis.com/auth/spreadsheets.readonly"]
+SHEETS_CACHE_TTL = float(os.environ.get("RAG_SHEETS_CACHE_TTL", "60"))
+SHEETS_CACHE_MAX_ENTRIES = int(os.environ.get("RAG_SHEETS_CACHE_MAX_ENTRIES", "512"))
+
+
+class SheetsClient:
+    def __init__(self, credentials=None, http_factory=None, cache_ttl=SHEETS_CACHE_TTL,
+                 max_cache_entries=SHEETS_CACHE_MAX_ENTRIES):
+        """
+        Process-wide Google Sheets client with a range-level TTL cache.
+
+        Credentials are resolved once per process. The discovery document is parsed and
+        the HTTP connection opened once per thread (httplib2 connections are not thread
+        safe) and then reused for every call.
+
+        Args:
+            credentials (optional): Google credentials; resolved with google.auth.default() if omitted.
+            http_factory (callable, optional): Returns the HTTP object passed to the API client.
+                Tests can return a googleapiclient.http.HttpMockSequence here to stub the Sheets API.
+            cache_ttl (float, optional): Seconds a fetched range stays cached.
+            max_cache_entries (int, optional): Maximum number of cached ranges.
+        """
+        self._credentials = credentials
+        self._http_factory = http_factory
+        self.cache_ttl = cache_ttl
+        self.max_cache_entries = max_cache_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get_credentials(self):
+        with self._lock:
+            if self._credentials is None:
+                import google.auth
+                # Ensure you have set up GOOGLE_APPLICATION_CREDENTIALS or have run `gcloud auth application-default login`
+                self._credentials, _ = google.auth.default(scopes=SHEETS_SCOPES)
+            return self._credentials
+
+    def _service(self):
+        service = getattr(self._local, "service", None)
+        if service is None:
+            from googleapiclient.discovery import build
+            if self._http_factory is not None:
+                http = self._http_factory()
+            else:
+                import httplib2
+                import google_auth_httplib2
+                http = google_auth_httplib2.AuthorizedHttp(self._get_credentials(), http=httplib2.Http())
+            service = build("sheets", "v4", http=http, cache_discovery=False)
+            self._local.service = service
+        return service
+
+    def _cache_get(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            expires, values = entry
+            if time.monotonic() >= expires:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return values
+
+    def _cache_put(self, key, values):
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.cache_ttl, values)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_cache_entries:
+                self._cache.popitem(last=False)
+
+    def get_values(self, spreadsheet_id, range_name, force_refresh=False):
+        """
+        Reads one range, served from cache when fresh.
+
+        Returns:
+            list: A list of lists containing the cell values.
+        """
+        return self.batch_get(spreadsheet_id, [range_name], force_refresh=force_refresh)[range_name]
+
+    def batch_get(self, spreadsheet_id, range_names, force_refresh=False):
+        """
+        Reads several ranges; all uncached ranges are fetched in a single batchGet round-trip.
+
+        Returns:
+            dict: Mapping of each requested range to a list of lists of cell values.
+        """
+        results = {}
+        missing = []
+        for range_name in dict.fromkeys(range_names):
+            values = None if force_refresh else self._cache_get((spreadsheet_id, range_name))
+            if values is None:
+                missing.append(range_name)
+            else:
+                results[range_name] = values
+        self.hits += len(results)
+        self.misses += len(missing)
+        record_cache("sheets", True, len(results))
+        record_cache("sheets", False, len(missing))
+
+        if missing:
+            values_api = self._service().spreadsheets().values()
+            if len(missing) == 1:
+                response = values_api.get(spreadsheetId=spreadsheet_id, range=missing[0]).execute()
+                value_ranges = [response]
+            else:
+                response = values_api.batchGet(spreadsheetId=spreadsheet_id, ranges=missing).execute()
+                value_ranges = response.get("valueRanges", [])
+            # The API echoes normalized A1 ranges, so results are matched by position.
+            for range_name, value_range in zip(missing, value_ranges):
+                values = value_range.get("values", [])
+                self._cache_put((spreadsheet_id, range_name), values)
+                results[range_name] = values
+        return results
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_sheets_client():
+    """
+    Returns the process-wide SheetsClient, creating it on first use.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = SheetsClient()
+        return _client
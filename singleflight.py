@@ -0,0 +1,107 @@
+import asyncio
+import threading
+
+from metrics import Counter
+
+COALESCED_REQUESTS = Counter(
+    "rag_coalesced_requests_total", "Queries answered by joining an identical in-flight execution.", ["mode"]
+)
+
+# Request coalescing: concurrent calls with the same key share one execution and all get
+# its result. Nothing is cached once the execution finishes, so results are never stale.
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        """
+        Thread-based single-flight: the first caller for a key runs the function, callers
+        arriving while it runs block until it finishes and receive the same result or error.
+        """
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """
+        Returns:
+            tuple: (result, coalesced) where coalesced is True for callers that joined.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            COALESCED_REQUESTS.inc(mode="sync")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+
+class _AsyncCall:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    def __init__(self):
+        """
+        Event-loop single-flight. The shared execution runs as its own task, and every caller
+        awaits it through asyncio.shield, so one caller being cancelled (e.g. its client
+        disconnected) does not cancel the run for the others. The run is cancelled only when
+        the last waiting caller has gone, so abandoned work does not keep spending LLM tokens.
+        """
+        self._calls = {}
+
+    async def do(self, key, fn):
+        """
+        Args:
+            key: Hashable identity of the work.
+            fn: Zero-argument coroutine function performing it.
+
+        Returns:
+            tuple: (result, coalesced) where coalesced is True for callers that joined.
+        """
+        # Tasks belong to one loop, so calls are only shared within the caller's loop.
+        key = (id(asyncio.get_running_loop()), key)
+        call = self._calls.get(key)
+        leader = call is None
+        if leader:
+            call = self._calls[key] = _AsyncCall(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+        else:
+            COALESCED_REQUESTS.inc(mode="async")
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), not leader
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Forget first, so a caller arriving now starts a fresh run instead of joining a cancelled one.
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def __len__(self):
+        return len(self._calls)
@@ -0,0 +1,29 @@
+import pytest
+
+
+@pytest.fixture
+def make_pool(tmp_path):
+    """
+    Builds AgentPools over a tiny synthetic corpus with the offline fakes (no API keys or
+    network); every pool is closed when the test ends.
+    """
+    pytest.importorskip("chromadb")
+    pytest.importorskip("langchain_community")
+    from agent_pool import AgentPool
+    from bench_fakes import FakeEmbeddings, StubChatModel
+    from setup_data import create_synthetic_corpus
+
+    corpus = str(tmp_path / "corpus")
+    create_synthetic_corpus(corpus, num_docs=1, pages_per_doc=1, facts_per_page=5)
+    pools = []
+
+    def make(**kwargs):
+        agent_kwargs = {"embeddings": FakeEmbeddings(), "llm": StubChatModel(), "answer_cache": False}
+        agent_kwargs.update(kwargs.pop("agent_kwargs", {}))
+        pool = AgentPool(corpus, persist_directory=str(tmp_path / "chroma_db"), agent_kwargs=agent_kwargs, **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
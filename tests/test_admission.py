@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, TokenBucket
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.take() == 0 and bucket.take() == 0
+    wait = bucket.take()
+    assert 0 < wait <= 0.1
+    bucket.updated -= 0.1
+    assert bucket.take() == 0
+
+
+def test_user_over_rate_gets_429_with_retry_after():
+    async def main():
+        admission = AdmissionController(rate=0.5, burst=2, max_in_flight=10)
+        for _ in range(2):
+            admission.release(await admission.acquire("alice"))
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("alice")
+        # Other users have their own bucket.
+        admission.release(await admission.acquire("bob"))
+        return rejected.value, admission.in_flight
+
+    rejected, in_flight = asyncio.run(main())
+    assert rejected.status_code == 429
+    assert rejected.retry_after >= 1
+    assert in_flight == 0
+
+
+def test_slots_are_handed_to_waiters_in_order():
+    async def main():
+        admission = AdmissionController(rate=100, burst=100, max_in_flight=1, max_queue=5, queue_timeout=5)
+        first = await admission.acquire("a")
+        order = []
+
+        async def wait(name):
+            granted = await admission.acquire(name)
+            order.append(name)
+            return granted
+
+        waiters = [asyncio.create_task(wait(name)) for name in ("b", "c")]
+        await asyncio.sleep(0.01)
+        assert order == [] and admission.in_flight == 1
+        admission.release(first)
+        admission.release(await waiters[0])
+        admission.release(await waiters[1])
+        return order, admission.in_flight
+
+    assert asyncio.run(main()) == (["b", "c"], 0)
+
+
+def test_full_queue_is_rejected_with_503():
+    async def main():
+        admission = AdmissionController(rate=100, burst=100, max_in_flight=1, max_queue=1, queue_timeout=5)
+        held = await admission.acquire("a")
+        queued = asyncio.create_task(admission.acquire("b"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("c")
+        admission.release(held)
+        admission.release(await queued)
+        return rejected.value, admission.in_flight
+
+    rejected, in_flight = asyncio.run(main())
+    assert rejected.status_code == 503 and rejected.retry_after >= 1
+    assert in_flight == 0
+
+
+def test_queue_timeout_rejects_and_frees_the_queue_place():
+    async def main():
+        admission = AdmissionController(rate=100, burst=100, max_in_flight=1, max_queue=1, queue_timeout=0.05)
+        held = await admission.acquire("a")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire("b")
+        queue_after_timeout = len(admission._waiters)
+        admission.release(held)
+        return rejected.value, queue_after_timeout, admission.in_flight
+
+    rejected, queued, in_flight = asyncio.run(main())
+    assert rejected.status_code == 503
+    assert queued == 0 and in_flight == 0
+
+
+def test_cancelled_waiter_leaves_the_queue_without_taking_a_slot():
+    async def main():
+        admission = AdmissionController(rate=100, burst=100, max_in_flight=1, max_queue=5, queue_timeout=5)
+        held = await admission.acquire("a")
+        waiter = asyncio.create_task(admission.acquire("b"))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        queued = len(admission._waiters)
+        admission.release(held)
+        # The slot is free again, not leaked to the cancelled waiter.
+        admission.release(await asyncio.wait_for(admission.acquire("c"), 1))
+        return queued, admission.in_flight
+
+    assert asyncio.run(main()) == (0, 0)
+
+
+def test_slot_handed_over_as_the_wait_is_cancelled_is_passed_on():
+    async def main():
+        admission = AdmissionController(rate=100, burst=100, max_in_flight=1, max_queue=5, queue_timeout=5)
+        held = await admission.acquire("a")
+        waiter = asyncio.create_task(admission.acquire("b"))
+        await asyncio.sleep(0.01)
+        # Hand the slot to the waiter and cancel it before it resumes. Either the wait is
+        # cancelled and the slot passed on, or the waiter got it and releases it as usual.
+        admission.release(held)
+        waiter.cancel()
+        try:
+            admission.release(await waiter)
+        except asyncio.CancelledError:
+            pass
+        return admission.in_flight
+
+    assert asyncio.run(main()) == 0
+
+
+def test_rejections_become_http_errors_with_retry_after():
+    pytest.importorskip("fastapi")
+    pytest.importorskip("jwt")
+    from fastapi import HTTPException
+    from rag_api_service import admit
+
+    async def main():
+        admission = AdmissionController(rate=0.1, burst=1, max_in_flight=10)
+        admission.release(await admit(admission, "alice"))
+        with pytest.raises(HTTPException) as rejected:
+            await admit(admission, "alice")
+        return rejected.value
+
+    rejected = asyncio.run(main())
+    assert rejected.status_code == 429
+    assert int(rejected.headers["Retry-After"]) >= 1
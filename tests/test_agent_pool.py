@@ -0,0 +1,67 @@
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("langchain_community")
+
+from langchain_core.tools import tool
+
+import rag_agent
+
+
+@tool
+def echo(text: str) -> str:
+    """Returns the text unchanged."""
+    return text
+
+
+def open_handles(persist_directory):
+    return rag_agent._open_stores.get(persist_directory, 0)
+
+
+@pytest.fixture
+def pool(make_pool):
+    return make_pool(max_size=1)
+
+
+def test_reload_closes_idle_agents(pool):
+    pool.get()
+    assert open_handles(pool.persist_directory) == 1
+    pool.reload()
+    assert open_handles(pool.persist_directory) == 0
+
+
+def test_leased_agent_is_closed_on_last_release(pool):
+    agent = pool.acquire()
+    pool.reload()
+    assert agent.agent_executor is not None
+    assert open_handles(pool.persist_directory) == 1
+    pool.release(agent)
+    assert agent.agent_executor is None
+    assert open_handles(pool.persist_directory) == 0
+
+
+def test_eviction_and_ingest_release_handles(pool):
+    pool.get()
+    pool.get([echo])
+    assert len(pool) == 1
+    assert open_handles(pool.persist_directory) == 1
+    pool.ingest()
+    assert open_handles(pool.persist_directory) == 0
+
+
+def test_rebuilt_agent_reopens_the_store(pool):
+    old_system = pool.get().vectorstore._client._system
+    pool.reload()
+    assert pool.get().vectorstore._client._system is not old_system
+    assert open_handles(pool.persist_directory) == 1
+
+
+def test_read_only_agents_still_cache_query_embeddings(make_pool, monkeypatch):
+    from bench_fakes import FakeEmbeddings
+
+    monkeypatch.setattr(rag_agent, "OpenAIEmbeddings", FakeEmbeddings)
+    make_pool(agent_kwargs={"embeddings": None}).get()
+    embeddings = make_pool(agent_kwargs={"embeddings": None, "read_only": True}).get().embeddings
+    embeddings.embed_query("Budget Forecast for Q1")
+    embeddings.embed_query("Budget Forecast for Q1")
+    assert (embeddings.misses, embeddings.hits) == (1, 1)
@@ -0,0 +1,67 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+pytest.importorskip("jwt")
+
+from fastapi.testclient import TestClient
+
+import rag_api_service
+from rag_api_service import app
+
+
+def test_failed_ingest_before_fork_is_reported_not_raised(tmp_path, monkeypatch):
+    pytest.importorskip("langchain_community")
+    broken = tmp_path / "broken.pdf"
+    broken.write_bytes(b"not a pdf")
+    # The ingest runs in a spawned child, which reads its paths from the environment.
+    monkeypatch.setenv("RAG_DOCUMENTS_PATH", str(broken))
+    monkeypatch.setenv("RAG_PERSIST_DIRECTORY", str(tmp_path / "chroma_db"))
+    monkeypatch.setenv("RAG_READ_ONLY", "0")
+    monkeypatch.setattr(rag_api_service, "PDF_PATH", str(broken))
+    monkeypatch.setattr(rag_api_service, "PREPARE_ERROR", None)
+
+    rag_api_service.prepare_workers()
+    assert "Ingestion before starting workers failed" in rag_api_service.PREPARE_ERROR
+
+
+def test_readyz_reports_ingest_error(monkeypatch):
+    client = TestClient(app)
+    monkeypatch.setattr(app.state, "ingest_error", "Ingestion before starting workers failed (exit code 1).", raising=False)
+    monkeypatch.setattr(app.state, "warmup_error", None, raising=False)
+    monkeypatch.setattr(app.state, "ready", False, raising=False)
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json() == {"status": "warming_up", "ingest_error": app.state.ingest_error}
+
+    monkeypatch.setattr(app.state, "ready", True)
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ready", "ingest_error": app.state.ingest_error}
+
+
+def test_runtime_writes_are_rejected_with_several_workers(monkeypatch):
+    from rag_api_service import create_access_token, get_collections
+
+    monkeypatch.setattr(rag_api_service, "API_WORKERS", 2)
+    monkeypatch.setitem(app.dependency_overrides, get_collections, lambda: None)
+    client = TestClient(app)
+    auth = {"Authorization": f"Bearer {create_access_token({'sub': 'admin'})}"}
+    responses = [
+        client.post("/collections/docs/documents", files={"files": ("a.pdf", b"%PDF-1.4", "application/pdf")}, headers=auth),
+        client.delete("/collections/docs/documents/a.pdf", headers=auth),
+        client.delete("/collections/docs", headers=auth),
+        client.post("/jobs", json={"kind": "ingest", "collection": "docs"}, headers=auth),
+    ]
+    assert [r.status_code for r in responses] == [409] * 4
+    assert "RAG_WORKERS" in responses[0].json()["detail"]
+
+
+def test_ingest_jobs_refuse_a_read_only_store(monkeypatch):
+    pytest.importorskip("langchain_community")
+    import rag_agent
+    from job_queue import _run_ingest
+
+    monkeypatch.setattr(rag_agent, "READ_ONLY_STORE", True)
+    with pytest.raises(RuntimeError, match="read-only"):
+        _run_ingest({"pdf_path": "sample.pdf", "persist_directory": "unused"})
@@ -0,0 +1,100 @@
+import functools
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from job_queue import JOB_DEFAULT_TIMEOUT, JOB_MAX_PRIORITY, JOB_MAX_TIMEOUT, JobManager, JobStore
+
+
+def wait_for(store, job_id, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = store.get(job_id)
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.2)
+    raise AssertionError(f"Job {job_id} still {job['status']} after {timeout}s")
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork to hand the offline fakes to the worker")
+def test_ingest_job_runs_in_a_worker(tmp_path, monkeypatch):
+    pytest.importorskip("chromadb")
+    pytest.importorskip("langchain_community")
+    import rag_agent
+    from bench_fakes import FakeEmbeddings
+    from ingestion import sync_documents
+    from setup_data import create_synthetic_corpus
+
+    corpus = str(tmp_path / "corpus")
+    create_synthetic_corpus(corpus, num_docs=2, pages_per_doc=1, facts_per_page=5)
+    # The worker is forked, so it inherits the fakes; parsing uses a process pool as in production.
+    monkeypatch.setattr(rag_agent, "create_embeddings", lambda persist_directory: FakeEmbeddings())
+    monkeypatch.setattr(rag_agent, "sync_documents", functools.partial(sync_documents, workers=2))
+
+    manager = JobManager(str(tmp_path / "jobs.sqlite3"), workers=1, check_interval=0.2)
+    manager._context = multiprocessing.get_context("fork")
+    assert manager.start()
+    try:
+        job_id = manager.store.submit(
+            "ingest", {"pdf_path": corpus, "persist_directory": str(tmp_path / "chroma_db")}
+        )
+        job = wait_for(manager.store, job_id)
+    finally:
+        manager.stop()
+    assert job["status"] == "succeeded", job["error"]
+    assert job["result"]["ingestion"]
+    assert not multiprocessing.active_children()
+
+
+def test_stop_ends_idle_workers(tmp_path):
+    manager = JobManager(str(tmp_path / "jobs.sqlite3"), workers=1)
+    assert manager.start()
+    process = manager._processes[0]
+    manager.stop()
+    assert not process.is_alive()
+    # The lock is released, so another manager can take over.
+    other = JobManager(str(tmp_path / "jobs.sqlite3"), workers=1)
+    assert other.start()
+    other.stop()
+
+
+def test_submit_clamps_priority_and_defaults_timeout(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job = store.get(store.submit("query", {"query": "q"}, priority=1000))
+    assert job["priority"] == JOB_MAX_PRIORITY and job["status"] == "queued"
+    assert job["timeout"] == JOB_DEFAULT_TIMEOUT
+    with pytest.raises(ValueError):
+        store.submit("unknown", {})
+
+
+@pytest.mark.parametrize("timeout", [0, -5, JOB_MAX_TIMEOUT + 1, float("inf"), float("nan")])
+def test_submit_rejects_out_of_range_timeouts(tmp_path, timeout):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    with pytest.raises(ValueError, match="timeout"):
+        store.submit("query", {"query": "q"}, timeout=timeout)
+    assert store.counts() == {}
+
+
+def test_endpoint_rejects_out_of_range_timeouts_with_422(tmp_path):
+    pytest.importorskip("httpx")
+    pytest.importorskip("jwt")
+    from fastapi.testclient import TestClient
+
+    from rag_api_service import app, create_access_token, get_collections, get_job_store
+
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    app.dependency_overrides[get_job_store] = lambda: store
+    app.dependency_overrides[get_collections] = lambda: None
+    try:
+        client = TestClient(app)
+        auth = {"Authorization": f"Bearer {create_access_token({'sub': 'admin'})}"}
+        for timeout in (0, -1, JOB_MAX_TIMEOUT + 1):
+            response = client.post("/jobs", json={"kind": "ingest", "timeout": timeout}, headers=auth)
+            assert response.status_code == 422, response.text
+            assert response.json()["detail"][0]["loc"] == ["body", "timeout"]
+    finally:
+        app.dependency_overrides.pop(get_job_store, None)
+        app.dependency_overrides.pop(get_collections, None)
+    assert store.counts() == {}
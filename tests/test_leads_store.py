@@ -0,0 +1,144 @@
+import pytest
+
+from leads_store import DEFAULT_LEADS, LEADS_MAX_PAGE_SIZE, LeadsStore, http_date, leads_etag, not_modified
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LeadsStore(str(tmp_path / "leads.sqlite3"))
+
+
+def add_leads(store, count, **fields):
+    store.add([{"name": f"Lead {i}", "email": f"lead{i}@example.com", **fields} for i in range(count)])
+
+
+def test_new_store_starts_with_the_default_leads(store):
+    page = store.page()
+    assert [lead["email"] for lead in page["leads"]] == [lead["email"] for lead in DEFAULT_LEADS]
+    assert page["next_cursor"] is None
+
+
+def test_keyset_cursor_walks_every_lead_once(store):
+    add_leads(store, 10)
+    seen, cursor = [], None
+    while True:
+        page = store.page(cursor=cursor, limit=4)
+        assert len(page["leads"]) <= 4
+        seen.extend(lead["id"] for lead in page["leads"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+        assert cursor == page["leads"][-1]["id"]
+    assert seen == sorted(seen) and len(seen) == len(set(seen)) == store.count() == 13
+
+
+def test_last_full_page_has_no_next_cursor(store):
+    # Exactly `limit` rows left: the extra-row probe must not promise another page.
+    assert store.page(limit=3)["next_cursor"] is None
+
+
+def test_filters_and_created_range(store):
+    add_leads(store, 3, status="won", source="web", created_at=1000.0)
+    add_leads(store, 2, status="won", source="ads", created_at=2000.0)
+    assert len(store.page(filters={"status": "won"})["leads"]) == 5
+    assert len(store.page(filters={"status": "won", "source": "ads"})["leads"]) == 2
+    # None-valued filters are ignored, as the endpoint passes every filter parameter.
+    assert len(store.page(filters={"status": None, "source": "web"})["leads"]) == 3
+    assert len(store.page(created_after=1500.0, created_before=2500.0)["leads"]) == 2
+    assert len(store.page(created_before=1500.0)["leads"]) == 3
+
+
+def test_field_projection_always_includes_id(store):
+    lead = store.page(fields=["email"])["leads"][0]
+    assert set(lead) == {"id", "email"}
+
+
+def test_unknown_fields_and_filters_are_rejected(store):
+    with pytest.raises(ValueError, match="fields"):
+        store.page(fields=["email", "password"])
+    with pytest.raises(ValueError, match="filters"):
+        store.page(filters={"name": "Alice Smith"})
+
+
+def test_limit_is_capped(store, monkeypatch):
+    monkeypatch.setattr("leads_store.LEADS_MAX_PAGE_SIZE", 2)
+    page = store.page(limit=LEADS_MAX_PAGE_SIZE)
+    assert len(page["leads"]) == 2 and page["next_cursor"] == page["leads"][-1]["id"]
+    assert len(store.page(limit=0)["leads"]) == 1
+
+
+def test_write_bumps_version_and_invalidates_cached_pages(store):
+    first = store.page()
+    assert store.page() is first
+    version, _ = store.version()
+    add_leads(store, 1)
+    assert store.version()[0] == version + 1
+    second = store.page()
+    assert second is not first and second["version"] == version + 1
+    assert len(second["leads"]) == len(first["leads"]) + 1
+
+
+def test_versions_are_shared_between_stores_on_one_file(tmp_path):
+    path = str(tmp_path / "leads.sqlite3")
+    reader, writer = LeadsStore(path), LeadsStore(path)
+    before = reader.page()
+    add_leads(writer, 1)
+    assert reader.page()["version"] == before["version"] + 1
+
+
+def test_etag_depends_on_version_and_query():
+    query = {"user": "alice", "limit": 10}
+    etag = leads_etag(3, query)
+    assert etag.startswith('W/"3-')
+    assert leads_etag(3, dict(reversed(query.items()))) == etag
+    assert leads_etag(4, query) != etag
+    assert leads_etag(3, {**query, "limit": 20}) != etag
+
+
+def test_if_none_match():
+    etag = leads_etag(1, {"user": "alice"})
+    assert not_modified(etag, None, etag, 0)
+    # Weak comparison, and a list of tags.
+    assert not_modified(etag.removeprefix("W/"), None, etag, 0)
+    assert not_modified(f'W/"0-old", {etag}', None, etag, 0)
+    assert not_modified("*", None, etag, 0)
+    assert not not_modified(leads_etag(2, {"user": "alice"}), None, etag, 0)
+    # If-None-Match takes precedence over If-Modified-Since.
+    assert not not_modified('W/"0-old"', http_date(1000), etag, 0)
+
+
+def test_if_modified_since():
+    modified_at = 1_700_000_000.25
+    assert not_modified(None, http_date(modified_at), "", modified_at)
+    assert not_modified(None, http_date(modified_at + 60), "", modified_at)
+    assert not not_modified(None, http_date(modified_at - 1), "", modified_at)
+    assert not not_modified(None, "not a date", "", modified_at)
+    assert not not_modified(None, None, "", modified_at)
+
+
+def test_endpoint_answers_conditional_requests_with_304(store):
+    pytest.importorskip("httpx")
+    pytest.importorskip("jwt")
+    from fastapi.testclient import TestClient
+
+    from rag_api_service import app, create_access_token, get_leads_store
+
+    app.dependency_overrides[get_leads_store] = lambda: store
+    try:
+        client = TestClient(app)
+        auth = {"Authorization": f"Bearer {create_access_token({'sub': 'admin'})}"}
+        first = client.get("/admin/leads", params={"limit": 2}, headers=auth)
+        assert first.status_code == 200 and len(first.json()["leads"]) == 2
+        etag = first.headers["etag"]
+
+        again = client.get("/admin/leads", params={"limit": 2}, headers={**auth, "If-None-Match": etag})
+        assert again.status_code == 304 and again.headers["etag"] == etag and not again.content
+        since = client.get("/admin/leads", params={"limit": 2},
+                           headers={**auth, "If-Modified-Since": first.headers["last-modified"]})
+        assert since.status_code == 304
+
+        add_leads(store, 1)
+        changed = client.get("/admin/leads", params={"limit": 2}, headers={**auth, "If-None-Match": etag})
+        assert changed.status_code == 200 and changed.headers["etag"] != etag
+    finally:
+        app.dependency_overrides.pop(get_leads_store, None)
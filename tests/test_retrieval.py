@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+# Scores every term-weighted scorer for a query with many terms of different weights, so a
+# different summation order shows up in the last bits of the floats.
+SCRIPT = r"""
+import json, sys
+from langchain_core.documents import Document
+from context_compression import ContextCompressor
+from retrieval import BM25Index, rerank_candidates
+
+words = [f"term{i:02d}" for i in range(40)]
+texts = [" ".join(words[j] for j in range(len(words)) if (j * 7 + i) % (i + 2)) + ". Other words here."
+         for i in range(12)]
+query = " ".join(words)
+index = BM25Index(sys.argv[1])
+index.add([(str(i), text, {"page": i}) for i, text in enumerate(texts)])
+bm25 = [(doc.metadata["page"], repr(score)) for doc, score in index.search(query, k=12)]
+candidates = [(Document(page_content=t, metadata={"page": i}), 1.0 / (60 + i)) for i, t in enumerate(texts)]
+rerank = [(d.metadata["page"], d.metadata["rerank_score"]) for d in rerank_candidates(query, candidates, max_k=12)]
+compressed = [d.page_content for d in ContextCompressor(token_budget=300).compress(query, [c[0] for c in candidates])]
+print(json.dumps([bm25, rerank, compressed]))
+"""
+
+
+def test_scores_do_not_depend_on_hash_seed(tmp_path):
+    outputs = set()
+    for seed in range(6):
+        env = dict(os.environ, PYTHONHASHSEED=str(seed))
+        result = subprocess.run([sys.executable, "-c", SCRIPT, str(tmp_path / f"bm25-{seed}.sqlite3")],
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                env=env, capture_output=True, text=True, check=True)
+        outputs.add(result.stdout)
+    assert len(outputs) == 1
+
+
+def test_bm25_ties_keep_ingestion_order(tmp_path):
+    from retrieval import BM25Index
+
+    texts = [f"Unit 0001{i} Budget Forecast is $10,000." for i in range(5)]
+    rankings = []
+    for name, ids in (("a", ["e", "d", "c", "b", "a"]), ("b", ["a", "b", "c", "d", "e"])):
+        index = BM25Index(str(tmp_path / f"{name}.sqlite3"))
+        index.add([(doc_id, text, {"page": i}) for i, (doc_id, text) in enumerate(zip(ids, texts))])
+        rankings.append([doc.metadata["page"] for doc, _ in index.search("Budget Forecast", k=5)])
+    assert rankings == [[0, 1, 2, 3, 4]] * 2
@@ -0,0 +1,143 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from singleflight import AsyncSingleFlight, SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "answer"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("q", work)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do("q", work))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert sorted(results, key=lambda r: r[1]) == [("answer", False)] + [("answer", True)] * 3
+
+
+def test_error_reaches_every_caller_and_nothing_is_cached():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("boom")
+
+    errors = []
+
+    def call():
+        try:
+            flight.do("q", fail)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    started.wait(5)
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 2
+    assert flight.do("q", lambda: "fresh") == ("fresh", False)
+
+
+def test_async_calls_share_one_run():
+    async def main():
+        flight = AsyncSingleFlight()
+        runs = []
+
+        async def work():
+            runs.append(1)
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        results = await asyncio.gather(*(flight.do("q", work) for _ in range(4)))
+        return runs, results, len(flight)
+
+    runs, results, pending = asyncio.run(main())
+    assert len(runs) == 1
+    assert sorted(results, key=lambda r: r[1]) == [("answer", False)] + [("answer", True)] * 3
+    assert pending == 0
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_run():
+    async def main():
+        flight = AsyncSingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        leader = asyncio.create_task(flight.do("q", work))
+        follower = asyncio.create_task(flight.do("q", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == ("answer", True)
+
+
+def test_run_is_cancelled_when_every_caller_is_gone():
+    async def main():
+        flight = AsyncSingleFlight()
+        cancelled = asyncio.Event()
+
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        callers = [asyncio.create_task(flight.do("q", work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        # A new caller starts a fresh run rather than joining the cancelled one.
+        return len(flight), await flight.do("q", lambda: asyncio.sleep(0, "fresh"))
+
+    assert asyncio.run(main()) == (0, ("fresh", False))
+
+
+def test_async_error_reaches_every_caller():
+    async def main():
+        flight = AsyncSingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        return await asyncio.gather(*(flight.do("q", fail) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("langchain")
+
+from langchain.tools.retriever import create_retriever_tool
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from context_compression import compress_retriever
+from embedding_pipeline import count_tokens
+from tracing import QueryTrace
+
+CHUNKS = [
+    "Unit 00012 Budget Forecast for Q1 is $10,000 on account ACCT-1000. The office moved in May.",
+    "Unit 00013 Budget Forecast for Q2 is $20,000 on account ACCT-2000. Nothing else changed.",
+]
+QUERY = "Budget Forecast for Q1 of Unit 00012"
+
+
+class FixedRetriever(BaseRetriever):
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return [Document(page_content=text, metadata={"source": "a.pdf", "page": i}) for i, text in enumerate(CHUNKS)]
+
+
+def retriever_tool():
+    # As the agent sees it: the compressing retriever behind the pdf_retriever tool.
+    return create_retriever_tool(compress_retriever(FixedRetriever(), token_budget=800), "pdf_retriever", "Search.")
+
+
+def assert_counted_once(trace, query):
+    sent = compress_retriever(FixedRetriever(), token_budget=800).invoke(query)
+    summary = trace.summary()
+    assert summary["stages"]["retriever"]["count"] == 1
+    assert summary["retrieved_chunks"] == len(sent)
+    assert summary["context_tokens"]["retrieved"] == sum(count_tokens(c) for c in CHUNKS)
+    assert 0 < summary["context_tokens"]["sent"] <= summary["context_tokens"]["retrieved"]
+
+
+def test_compressed_search_is_counted_once():
+    trace = QueryTrace()
+    retriever_tool().invoke({"query": QUERY}, config={"callbacks": [trace]})
+    assert_counted_once(trace, QUERY)
+
+
+def test_async_compressed_search_is_counted_once():
+    trace = QueryTrace()
+    asyncio.run(retriever_tool().ainvoke({"query": QUERY}, config={"callbacks": [trace]}))
+    assert_counted_once(trace, QUERY)
+
+
+def test_one_retrieval_event_per_search():
+    async def events():
+        collected = []
+        async for event in retriever_tool().astream_events({"query": QUERY}, version="v2"):
+            collected.append(event)
+        return collected
+
+    collected = asyncio.run(events())
+    retriever_runs = {e["run_id"] for e in collected if e["event"] == "on_retriever_start"}
+    outer = [e for e in collected if e["event"] == "on_retriever_end"
+             and not retriever_runs.intersection(e.get("parent_ids") or ())]
+    assert len(outer) == 1
+
+
+def test_stream_emits_one_retrieval_event_per_search(make_pool):
+    agent = make_pool().get()
+
+    async def run():
+        return [event async for event in agent.astream_query(QUERY)]
+
+    events = asyncio.run(run())
+    searches = [e for e in events if e["event"] == "tool_start" and e["tool"] == "pdf_retriever"]
+    retrievals = [e for e in events if e["event"] == "retrieval"]
+    timings = events[-1]["metadata"]["timings"]
+    assert searches and len(retrievals) == len(searches)
+    assert timings["stages"]["retriever"]["count"] == len(searches)
+    assert timings["retrieved_chunks"] == sum(len(e["documents"]) for e in retrievals)
@@ -0,0 +1,145 @@
+import time
+import threading
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from embedding_pipeline import count_tokens
+from metrics import CURRENT_TRACE, STAGE_SECONDS, LLM_CALLS, LLM_TOKENS, TOOL_CALLS
+
+
+class QueryTrace(BaseCallbackHandler):
+    """
+    Per-request trace: a LangChain callback handler recording LLM, tool and retriever
+    timings and token counts, plus any stage_timer blocks run while it is current.
+    """
+
+    # Called on the run's own thread/loop so start and end timestamps are not skewed.
+    run_inline = True
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.llm_calls = 0
+        self.tool_calls = 0
+        self.context_tokens_retrieved = 0
+        self.context_tokens_sent = 0
+        self.retrieved_chunks = 0
+        self._open = {}
+        # Open retriever runs. A retriever that wraps another (context compression) runs the
+        # inner one as a child; only the outermost run is what the agent actually receives.
+        self._retriever_runs = set()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._token = CURRENT_TRACE.set(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        CURRENT_TRACE.reset(self._token)
+
+    def add_stage(self, stage, seconds):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"count": 0, "seconds": 0.0})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+
+    def _start(self, run_id, stage):
+        with self._lock:
+            self._open[run_id] = (stage, time.perf_counter())
+
+    def _end(self, run_id):
+        with self._lock:
+            opened = self._open.pop(run_id, None)
+        if opened is None:
+            return None
+        stage, started = opened
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        self.add_stage(stage, elapsed)
+        return stage
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, "llm")
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, "llm")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._end(run_id)
+        LLM_CALLS.inc()
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt, completion = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+        if not usage:
+            for generations in response.generations:
+                for generation in generations:
+                    metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                    prompt += metadata.get("input_tokens", 0)
+                    completion += metadata.get("output_tokens", 0)
+        with self._lock:
+            self.llm_calls += 1
+            self.prompt_tokens += prompt
+            self.completion_tokens += completion
+        LLM_TOKENS.inc(prompt, kind="prompt")
+        LLM_TOKENS.inc(completion, kind="completion")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+        self._start(run_id, f"tool:{name}")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        stage = self._end(run_id)
+        if stage:
+            with self._lock:
+                self.tool_calls += 1
+            TOOL_CALLS.inc(tool=stage[len("tool:"):], status="ok")
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        stage = self._end(run_id)
+        if stage:
+            with self._lock:
+                self.tool_calls += 1
+            TOOL_CALLS.inc(tool=stage[len("tool:"):], status="error")
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        with self._lock:
+            nested = parent_run_id in self._retriever_runs
+            self._retriever_runs.add(run_id)
+        if not nested:
+            self._start(run_id, "retriever")
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        with self._lock:
+            self._retriever_runs.discard(run_id)
+        if self._end(run_id) is None:
+            return
+        # Compressed documents carry their size before and after compression; others count as-is.
+        sizes = [d.metadata["tokens"] if "tokens" in d.metadata else count_tokens(d.page_content) for d in documents]
+        sent = sum(sizes)
+        retrieved = sum(d.metadata.get("source_tokens", size) for d, size in zip(documents, sizes))
+        with self._lock:
+            self.context_tokens_sent += sent
+            self.context_tokens_retrieved += retrieved
+            self.retrieved_chunks += len(documents)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._retriever_runs.discard(run_id)
+        self._end(run_id)
+
+    def summary(self):
+        with self._lock:
+            return {
+                "total_seconds": round(time.perf_counter() - self.started, 4),
+                "stages": {k: {"count": v["count"], "seconds": round(v["seconds"], 4)} for k, v in self.stages.items()},
+                "llm_calls": self.llm_calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "tool_calls": self.tool_calls,
+                "context_tokens": {"retrieved": self.context_tokens_retrieved, "sent": self.context_tokens_sent},
+                "retrieved_chunks": self.retrieved_chunks,
+            }